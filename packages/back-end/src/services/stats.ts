@@ -20,8 +20,10 @@ import { hoursBetween } from "shared/dates";
 import chunk from "lodash/chunk";
 import {
   BanditResult,
+  DimensionShrinkage,
   ExperimentMetricAnalysis,
   MultipleExperimentMetricAnalysis,
+  PValueCorrection,
 } from "back-end/types/stats";
 import {
   ExperimentAggregateUnitsQueryResponseRows,
@@ -67,6 +69,9 @@ export interface AnalysisSettingsForStatsEngine {
   alpha: number;
   max_dimensions: number;
   traffic_percentage: number;
+  p_value_correction?: PValueCorrection;
+  dimension_shrinkage?: DimensionShrinkage;
+  all_baselines?: boolean;
 }
 
 export interface BanditSettingsForStatsEngine {
@@ -178,6 +183,9 @@ export function getAnalysisSettingsForStatsEngine(
         ? 9999
         : MAX_DIMENSIONS,
     traffic_percentage: coverage,
+    p_value_correction: settings.pValueCorrection ?? null,
+    dimension_shrinkage: settings.dimensionShrinkage ?? null,
+    all_baselines: settings.allBaselines ?? false,
   };
   return analysisData;
 }
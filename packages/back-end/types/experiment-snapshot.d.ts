@@ -111,8 +111,11 @@ export interface ExperimentSnapshotAnalysisSettings {
   sequentialTestingTuningParameter?: number;
   differenceType: DifferenceType;
   pValueCorrection?: null | "holm-bonferroni" | "benjamini-hochberg";
+  dimensionShrinkage?: null | "method-of-moments" | "reml";
   pValueThreshold?: number;
   baselineVariationIndex?: number;
+  // Also compute results with every variation as the baseline
+  allBaselines?: boolean;
 }
 
 export type SnapshotType = "standard" | "exploratory" | "report";
@@ -4,6 +4,8 @@ import type { MetricStats } from "./metric";
 
 export type PValueCorrection = null | "benjamini-hochberg" | "holm-bonferroni";
 
+export type DimensionShrinkage = null | "method-of-moments" | "reml";
+
 export type DifferenceType = "relative" | "absolute" | "scaled";
 
 export type RiskType = "relative" | "absolute";
@@ -22,6 +24,9 @@ interface BaseVariationResponse {
   };
   ci?: [number, number];
   errorMessage?: string;
+  // set when the analysis requests dimension shrinkage
+  expectedShrunk?: number;
+  ciShrunk?: [number, number];
 }
 
 interface BayesianVariationResponse extends BaseVariationResponse {
@@ -32,6 +37,14 @@ interface BayesianVariationResponse extends BaseVariationResponse {
 
 interface FrequentistVariationResponse extends BaseVariationResponse {
   pValue?: number;
+  // degrees of freedom of the t interval; null for sequential intervals
+  dof?: number | null;
+  pValueAdjusted?: number;
+  // null endpoints mean the adjusted interval is unbounded on that side
+  ciAdjusted?: [number | null, number | null];
+  // set by sequential trajectories; true when the running intersection of
+  // intervals was empty and ci is the last non-empty intersection
+  ciIntersectionEmpty?: boolean;
 }
 
 interface BaseDimensionResponse {
@@ -41,6 +54,9 @@ interface BaseDimensionResponse {
 
 interface BayesianDimensionResponse extends BaseDimensionResponse {
   variations: BayesianVariationResponse[];
+  // in the order of variations; null where a variation's analysis failed
+  probabilityBest?: (number | null)[];
+  expectedLoss?: (number | null)[];
 }
 
 interface FrequentistVariationResponse extends BaseDimensionResponse {
@@ -58,6 +74,9 @@ export type ExperimentMetricAnalysis = {
     unknownVariations: string[];
     multipleExposures: number;
     dimensions: StatsEngineDimensionResponse[];
+    // Set when allBaselines is requested: entry b holds the dimensions with
+    // variation b as the baseline
+    dimensionsByBaseline?: StatsEngineDimensionResponse[][] | null;
   }[];
 }[];
 
@@ -77,6 +96,10 @@ export type BanditResult = {
   updateMessage?: string;
   error?: string;
   reweight?: boolean;
+  // Thompson sampling draws; a fixed 10000 unless the stats engine is
+  // configured to stop early at a weight tolerance
+  samplesUsed?: number | null;
+  weightStandardError?: number | null;
 };
 
 export type MultipleExperimentMetricAnalysis = {
@@ -0,0 +1,554 @@
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from pydantic.dataclasses import dataclass
+
+from gbstats.gbstats import ROW_COLS, process_single_metric
+from gbstats.models.results import ExperimentMetricAnalysis
+from gbstats.models.settings import (
+    AnalysisSettingsForStatsEngine,
+    ExperimentMetricQueryResponseRows,
+    MetricSettingsForStatsEngine,
+)
+from gbstats.utils import quantile_bound_values, quantile_nstar
+
+INTEGER_COLS = ["users", "count", "quantile_n", "quantile_nstar"]
+
+
+# Per-unit contributions to each SUM_COLS column; mirrors the warehouse SQL,
+# including COALESCE-ing missing values to 0
+def unit_sum_columns(
+    numerator: np.ndarray,
+    denominator: Optional[np.ndarray] = None,
+    covariate: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    main = np.nan_to_num(np.asarray(numerator, dtype=float))
+    columns = {
+        "users": np.ones(main.shape),
+        "count": np.ones(main.shape),
+        "main_sum": main,
+        "main_sum_squares": main * main,
+    }
+    if denominator is not None:
+        denom = np.nan_to_num(np.asarray(denominator, dtype=float))
+        columns["denominator_sum"] = denom
+        columns["denominator_sum_squares"] = denom * denom
+        columns["main_denominator_sum_product"] = main * denom
+    if covariate is not None:
+        cov = np.nan_to_num(np.asarray(covariate, dtype=float))
+        columns["covariate_sum"] = cov
+        columns["covariate_sum_squares"] = cov * cov
+        columns["main_covariate_sum_product"] = main * cov
+    return columns
+
+
+# Map (dimension, variation) pairs to dense group codes, dimension-major
+def group_codes(
+    variation: np.ndarray, dimension: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    var_values, var_codes = np.unique(np.asarray(variation), return_inverse=True)
+    if dimension is None:
+        dim_values = np.array([""])
+        dim_codes = np.zeros(var_codes.shape, dtype=np.int64)
+    else:
+        dim_values, dim_codes = np.unique(np.asarray(dimension), return_inverse=True)
+    codes = dim_codes.astype(np.int64) * len(var_values) + var_codes
+    return codes, dim_values, var_values
+
+
+def grouped_sums(
+    codes: np.ndarray, n_groups: int, columns: Dict[str, np.ndarray]
+) -> Dict[str, np.ndarray]:
+    return {
+        col: np.bincount(codes, weights=values, minlength=n_groups)
+        for col, values in columns.items()
+    }
+
+
+# Emit one query row per non-empty (dimension, variation) group
+def rows_from_grouped_sums(
+    sums: Dict[str, np.ndarray], dim_values: np.ndarray, var_values: np.ndarray
+) -> ExperimentMetricQueryResponseRows:
+    num_variations = len(var_values)
+    rows: ExperimentMetricQueryResponseRows = []
+    for group in np.flatnonzero(sums["users"] > 0):
+        row: Dict = {
+            "dimension": str(dim_values[group // num_variations]),
+            "variation": str(var_values[group % num_variations]),
+        }
+        for col in ROW_COLS:
+            if col in sums:
+                value = sums[col][group]
+                row[col] = int(value) if col in INTEGER_COLS else float(value)
+        rows.append(row)
+    return rows
+
+
+def aggregate_units(
+    variation: np.ndarray,
+    numerator: np.ndarray,
+    denominator: Optional[np.ndarray] = None,
+    covariate: Optional[np.ndarray] = None,
+    dimension: Optional[np.ndarray] = None,
+) -> ExperimentMetricQueryResponseRows:
+    """Build the sufficient statistics the warehouse query would return from
+    per-unit arrays, so exported data can be reanalyzed locally.
+
+    Every (dimension, variation) group is summed in one vectorized pass with
+    np.bincount. Denominator and covariate columns are only emitted when the
+    corresponding arrays are passed, as in the SQL for ratio and CUPED metrics.
+
+    Args:
+        variation (np.ndarray): variation id of each unit
+        numerator (np.ndarray): aggregated metric value of each unit
+        denominator (np.ndarray, optional): denominator value for ratio metrics
+        covariate (np.ndarray, optional): pre-exposure value for CUPED metrics
+        dimension (np.ndarray, optional): dimension value of each unit;
+            defaults to the overall "" dimension
+
+    Returns:
+        ExperimentMetricQueryResponseRows - rows ready for
+            `process_single_metric`
+    """
+    codes, dim_values, var_values = group_codes(variation, dimension)
+    sums = grouped_sums(
+        codes,
+        len(dim_values) * len(var_values),
+        unit_sum_columns(numerator, denominator, covariate),
+    )
+    return rows_from_grouped_sums(sums, dim_values, var_values)
+
+
+# Grouping set key: () is the overall slice, ("country",) a single dimension
+# and ("country", "browser") a pair of dimensions
+GroupingSet = Tuple[str, ...]
+
+
+def aggregate_grouping_sets(
+    variation: np.ndarray,
+    numerator: np.ndarray,
+    dimensions: Dict[str, np.ndarray],
+    denominator: Optional[np.ndarray] = None,
+    covariate: Optional[np.ndarray] = None,
+    pairs: bool = False,
+) -> Dict[GroupingSet, ExperimentMetricQueryResponseRows]:
+    """Compute the overall slice and every single-dimension slice (plus every
+    pair of dimensions if `pairs`) from one pass over unit-level data.
+
+    Units are summed once into the finest (cell, variation) grid, where a
+    cell is a distinct combination of all dimension values; every grouping
+    set is then rolled up from the cell sums, whose size is bounded by the
+    number of units but is usually far smaller. Only additive SUM_COLS
+    columns are supported, so quantile metrics need their own pass.
+
+    Returns:
+        Dict[GroupingSet, ExperimentMetricQueryResponseRows] - query rows per
+            grouping set; pair slices use "value_a, value_b" as the dimension
+    """
+    names = list(dimensions.keys())
+    dim_values: Dict[str, np.ndarray] = {}
+    dim_codes: Dict[str, np.ndarray] = {}
+    for name in names:
+        dim_values[name], dim_codes[name] = np.unique(
+            np.asarray(dimensions[name]), return_inverse=True
+        )
+
+    # dense code for each combination of dimension values
+    var_values, var_codes = np.unique(np.asarray(variation), return_inverse=True)
+    num_variations = len(var_values)
+    cell = np.zeros(var_codes.shape, dtype=np.int64)
+    for name in names:
+        cardinality = len(dim_values[name])
+        if cell.size and (int(cell.max()) + 1) * cardinality >= 2**62:
+            cell = np.unique(cell, return_inverse=True)[1].astype(np.int64)
+        cell = cell * cardinality + dim_codes[name]
+    _, first, cell_codes = np.unique(cell, return_index=True, return_inverse=True)
+    n_cells = len(first)
+
+    # the only pass over unit-level data
+    cell_sums = grouped_sums(
+        cell_codes * num_variations + var_codes,
+        n_cells * num_variations,
+        unit_sum_columns(numerator, denominator, covariate),
+    )
+    cell_var_codes = np.tile(np.arange(num_variations), n_cells)
+    cell_dim_codes = {
+        name: np.repeat(dim_codes[name][first], num_variations) for name in names
+    }
+
+    grouping_sets: List[GroupingSet] = [()] + [(name,) for name in names]
+    if pairs:
+        grouping_sets += [(a, b) for i, a in enumerate(names) for b in names[i + 1 :]]
+    slices: Dict[GroupingSet, ExperimentMetricQueryResponseRows] = {}
+    for grouping_set in grouping_sets:
+        slice_codes = np.zeros(cell_var_codes.shape, dtype=np.int64)
+        labels = np.array([""], dtype=object)
+        for i, name in enumerate(grouping_set):
+            slice_codes = slice_codes * len(dim_values[name]) + cell_dim_codes[name]
+            values = dim_values[name].astype(str).astype(object)
+            labels = values if i == 0 else np.add.outer(labels, ", " + values).ravel()
+        sums = grouped_sums(
+            slice_codes * num_variations + cell_var_codes,
+            len(labels) * num_variations,
+            cell_sums,
+        )
+        slices[grouping_set] = rows_from_grouped_sums(sums, labels, var_values)
+    return slices
+
+
+def analyze_grouping_sets(
+    slices: Dict[GroupingSet, ExperimentMetricQueryResponseRows],
+    metric: MetricSettingsForStatsEngine,
+    analyses: List[AnalysisSettingsForStatsEngine],
+) -> Dict[GroupingSet, ExperimentMetricAnalysis]:
+    return {
+        grouping_set: process_single_metric(rows, metric, analyses)
+        for grouping_set, rows in slices.items()
+    }
+
+
+# Group order by counting sort: numpy sorts keys of 16 bits or fewer with a
+# radix sort; group g is order[offsets[g] : offsets[g + 1]]
+def group_order(codes: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=n_groups))))
+    keys = codes.astype(np.min_scalar_type(max(n_groups - 1, 0)))
+    return np.argsort(keys, kind="stable"), offsets
+
+
+# Sample quantiles (linear interpolation, as np.quantile) of every group at
+# group-specific levels; values are only partially selected within each group
+def grouped_quantiles(
+    values: np.ndarray, codes: np.ndarray, levels: np.ndarray
+) -> np.ndarray:
+    n_groups = levels.shape[0]
+    quantiles = np.zeros(levels.shape)
+    order, offsets = group_order(codes, n_groups)
+    grouped = values[order]
+    for group in np.flatnonzero(np.diff(offsets)):
+        group_values = grouped[offsets[group] : offsets[group + 1]]
+        h = (len(group_values) - 1) * levels[group]
+        lower, upper = np.floor(h).astype(int), np.ceil(h).astype(int)
+        # in place on the group's slice of the grouped copy
+        group_values.partition(np.unique(np.concatenate((lower, upper))))
+        quantiles[group] = group_values[lower] + (h - lower) * (
+            group_values[upper] - group_values[lower]
+        )
+    return quantiles
+
+
+def grouped_quantile_columns(
+    values: np.ndarray, codes: np.ndarray, n_groups: int, nu: float, alpha: float
+) -> Dict[str, np.ndarray]:
+    quantile_n = np.bincount(codes, minlength=n_groups)
+    nstar = np.array([quantile_nstar(n) for n in quantile_n])
+    levels = np.array(
+        [[nu] + quantile_bound_values(nu, alpha, n) for n in nstar]
+    ).reshape((n_groups, 3))
+    quantiles = grouped_quantiles(values, codes, levels)
+    return {
+        "quantile_n": quantile_n,
+        "quantile_nstar": nstar,
+        "quantile": quantiles[:, 0],
+        "quantile_lower": quantiles[:, 1],
+        "quantile_upper": quantiles[:, 2],
+    }
+
+
+def aggregate_quantile_units(
+    variation: np.ndarray,
+    values: np.ndarray,
+    nu: float,
+    dimension: Optional[np.ndarray] = None,
+    alpha: float = 0.05,
+) -> ExperimentMetricQueryResponseRows:
+    """Build `quantile_unit` query rows from one value per unit.
+
+    The quantile and its order statistic CI follow the warehouse SQL: the
+    bounds are the sample quantiles at nu -/+ z * sqrt(nu * (1 - nu) / nstar),
+    with nstar the largest grid size below the group's sample size. Missing
+    values are ignored, as APPROX_PERCENTILE and COUNT ignore NULLs.
+    """
+    values = np.asarray(values, dtype=float)
+    codes, dim_values, var_values = group_codes(variation, dimension)
+    n_groups = len(dim_values) * len(var_values)
+    sums = grouped_sums(codes, n_groups, unit_sum_columns(values))
+    observed = ~np.isnan(values)
+    sums.update(
+        grouped_quantile_columns(values[observed], codes[observed], n_groups, nu, alpha)
+    )
+    return rows_from_grouped_sums(sums, dim_values, var_values)
+
+
+def aggregate_quantile_events(
+    variation: np.ndarray,
+    unit: np.ndarray,
+    values: np.ndarray,
+    nu: float,
+    dimension: Optional[np.ndarray] = None,
+    alpha: float = 0.05,
+) -> ExperimentMetricQueryResponseRows:
+    """Build `quantile_event` query rows from one value per event.
+
+    Besides the quantile columns (see `aggregate_quantile_units`), the
+    cluster sums used by `QuantileClusteredStatistic` are computed per unit:
+    the numerator is the unit's number of events at or below its group's
+    quantile and the denominator is its number of events.
+
+    Args:
+        variation (np.ndarray): variation id of each event's unit
+        unit (np.ndarray): unit id of each event
+        values (np.ndarray): event values
+        nu (float): quantile level of interest
+        dimension (np.ndarray, optional): dimension value of each event
+        alpha (float): significance level for the quantile bounds
+    """
+    values = np.asarray(values, dtype=float)
+    observed = ~np.isnan(values)
+    codes, dim_values, var_values = group_codes(variation, dimension)
+    n_groups = len(dim_values) * len(var_values)
+    quantile_columns = grouped_quantile_columns(
+        values[observed], codes[observed], n_groups, nu, alpha
+    )
+
+    # collapse events into (group, unit) clusters
+    units, unit_codes = np.unique(np.asarray(unit), return_inverse=True)
+    clusters, cluster_codes = np.unique(
+        codes * len(units) + unit_codes, return_inverse=True
+    )
+    cluster_groups = clusters // len(units)
+    below = observed & (values <= quantile_columns["quantile"][codes])
+    n_events = np.bincount(
+        cluster_codes, weights=observed.astype(float), minlength=len(clusters)
+    )
+    n_below = np.bincount(cluster_codes, weights=below, minlength=len(clusters))
+
+    sums = grouped_sums(
+        cluster_groups, n_groups, unit_sum_columns(n_below, denominator=n_events)
+    )
+    sums.update(quantile_columns)
+    return rows_from_grouped_sums(sums, dim_values, var_values)
+
+
+# Prefix metric columns so rows can be used as a query result in
+# `process_experiment_results`
+def prefix_metric_rows(
+    rows: ExperimentMetricQueryResponseRows, metric_index: int = 0
+) -> ExperimentMetricQueryResponseRows:
+    prefix = f"m{metric_index}_"
+    shared = ["dimension", "variation", "users"]
+    return [
+        {(k if k in shared else prefix + k): v for k, v in row.items()} for row in rows
+    ]
+
+
+@dataclass
+class ChunkReport:
+    chunk: int
+    rows: int
+    seconds: float
+    rows_per_second: float
+    groups: int
+    # estimated from array sizes (chunk data plus the running and chunk sums),
+    # not measured
+    estimated_chunk_bytes: int
+    max_estimated_chunk_bytes: int
+    # peak traced allocations while reading and aggregating the chunk; only
+    # set when `aggregate_delimited_file` is called with `measure_memory`
+    peak_chunk_bytes: Optional[int] = None
+
+
+class ChunkedAggregator:
+    def __init__(self, denominator: bool = False, covariate: bool = False):
+        """Out-of-core version of `aggregate_units`. Running sums are kept per
+        (dimension, variation) group in compact arrays, so memory is bounded by
+        the number of groups and the chunk size rather than the number of
+        units in the export.
+
+        Each row must be one unit, as the squared sums are taken per row.
+        Pass unit ids to `update` to reject units that appear on more than
+        one row; the ids seen so far are then kept, so memory also grows
+        with the number of units.
+
+        Args:
+            denominator (bool): whether chunks include a ratio denominator
+            covariate (bool): whether chunks include a CUPED covariate
+        """
+        self.denominator = denominator
+        self.covariate = covariate
+        self.columns = list(
+            unit_sum_columns(
+                np.zeros(0),
+                np.zeros(0) if denominator else None,
+                np.zeros(0) if covariate else None,
+            ).keys()
+        )
+        self.group_index: Dict[Tuple[str, str], int] = {}
+        self.sums = np.zeros((len(self.columns), 0))
+        self.reports: List[ChunkReport] = []
+        self.max_estimated_chunk_bytes = 0
+        self.seen_units: Set = set()
+
+    @property
+    def num_groups(self) -> int:
+        return len(self.group_index)
+
+    def update(
+        self,
+        variation: np.ndarray,
+        numerator: np.ndarray,
+        denominator: Optional[np.ndarray] = None,
+        covariate: Optional[np.ndarray] = None,
+        dimension: Optional[np.ndarray] = None,
+        chunk_bytes: int = 0,
+        unit: Optional[np.ndarray] = None,
+    ) -> ChunkReport:
+        start = time.perf_counter()
+        if self.denominator != (denominator is not None) or self.covariate != (
+            covariate is not None
+        ):
+            raise ValueError("Chunk columns do not match the aggregator settings.")
+        if unit is not None:
+            num_seen = len(self.seen_units)
+            self.seen_units.update(np.asarray(unit).tolist())
+            if len(self.seen_units) - num_seen != len(unit):
+                raise ValueError(
+                    "Units must appear on a single row; aggregate events to "
+                    "units before streaming them."
+                )
+        codes, dim_values, var_values = group_codes(variation, dimension)
+        n_local = len(dim_values) * len(var_values)
+        local = grouped_sums(
+            codes, n_local, unit_sum_columns(numerator, denominator, covariate)
+        )
+        local_sums = np.vstack([local[col] for col in self.columns])
+        present = np.flatnonzero(local_sums[0] > 0)
+
+        # map this chunk's groups onto the running group index
+        num_variations = len(var_values)
+        global_index = np.empty(len(present), dtype=np.int64)
+        for i, group in enumerate(present):
+            key = (
+                str(dim_values[group // num_variations]),
+                str(var_values[group % num_variations]),
+            )
+            global_index[i] = self.group_index.setdefault(key, len(self.group_index))
+        if self.num_groups > self.sums.shape[1]:
+            grown = np.zeros(
+                (len(self.columns), max(self.num_groups, 2 * self.sums.shape[1]))
+            )
+            grown[:, : self.sums.shape[1]] = self.sums
+            self.sums = grown
+        self.sums[:, global_index] += local_sums[:, present]
+
+        seconds = time.perf_counter() - start
+        n_rows = len(codes)
+        estimated_bytes = int(chunk_bytes + self.sums.nbytes + local_sums.nbytes)
+        report = ChunkReport(
+            chunk=len(self.reports),
+            rows=n_rows,
+            seconds=seconds,
+            rows_per_second=n_rows / seconds if seconds > 0 else float("inf"),
+            groups=self.num_groups,
+            estimated_chunk_bytes=estimated_bytes,
+            max_estimated_chunk_bytes=max(
+                estimated_bytes, self.max_estimated_chunk_bytes
+            ),
+        )
+        self.max_estimated_chunk_bytes = report.max_estimated_chunk_bytes
+        self.reports.append(report)
+        return report
+
+    def rows(self) -> ExperimentMetricQueryResponseRows:
+        rows: ExperimentMetricQueryResponseRows = []
+        for (dim, var), i in sorted(self.group_index.items()):
+            row: Dict = {"dimension": dim, "variation": var}
+            for j, col in enumerate(self.columns):
+                value = self.sums[j, i]
+                row[col] = int(value) if col in INTEGER_COLS else float(value)
+            rows.append(row)
+        return rows
+
+    def query_rows(self, metric_index: int = 0) -> ExperimentMetricQueryResponseRows:
+        return prefix_metric_rows(self.rows(), metric_index)
+
+
+def aggregate_delimited_file(
+    path: str,
+    variation_column: str,
+    numerator_column: str,
+    denominator_column: Optional[str] = None,
+    covariate_column: Optional[str] = None,
+    dimension_column: Optional[str] = None,
+    chunk_size: int = 1_000_000,
+    sep: str = ",",
+    on_chunk: Optional[Callable[[ChunkReport], None]] = None,
+    unit_column: Optional[str] = None,
+    measure_memory: bool = False,
+) -> ChunkedAggregator:
+    """Stream a delimited export of per-unit values through a
+    `ChunkedAggregator`, reading `chunk_size` lines at a time.
+
+    The file must have one row per unit; event-level exports give wrong
+    counts and variances. With `unit_column`, files where a unit appears on
+    more than one row are rejected with a ValueError.
+
+    Args:
+        unit_column (str, optional): unit id column, checked for duplicates
+        measure_memory (bool): trace allocations with tracemalloc and set
+            `peak_chunk_bytes` on each report; slows the aggregation down
+
+    Returns:
+        ChunkedAggregator - call `.query_rows()` for rows ready for
+            `process_experiment_results` and read `.reports` for per-chunk
+            throughput and memory
+    """
+    if measure_memory and tracemalloc.is_tracing():
+        raise ValueError("tracemalloc is already tracing allocations.")
+    optional = [denominator_column, covariate_column, dimension_column, unit_column]
+    columns = [variation_column, numerator_column] + [c for c in optional if c]
+    aggregator = ChunkedAggregator(
+        denominator=denominator_column is not None,
+        covariate=covariate_column is not None,
+    )
+    reader = pd.read_csv(
+        path,
+        sep=sep,
+        usecols=columns,
+        chunksize=chunk_size,
+        dtype={c: str for c in [variation_column, dimension_column, unit_column] if c},
+    )
+    chunks = iter(reader)
+    while True:
+        # restarted per chunk so the peak covers reading it and aggregating
+        if measure_memory:
+            tracemalloc.start()
+        try:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            report = aggregator.update(
+                variation=chunk[variation_column].fillna("").to_numpy(),
+                numerator=chunk[numerator_column].to_numpy(dtype=float),
+                denominator=chunk[denominator_column].to_numpy(dtype=float)
+                if denominator_column
+                else None,
+                covariate=chunk[covariate_column].to_numpy(dtype=float)
+                if covariate_column
+                else None,
+                dimension=chunk[dimension_column].fillna("").to_numpy()
+                if dimension_column
+                else None,
+                chunk_bytes=int(chunk.memory_usage(deep=True).sum()),
+                unit=chunk[unit_column].to_numpy() if unit_column else None,
+            )
+            if measure_memory:
+                report.peak_chunk_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            if measure_memory:
+                tracemalloc.stop()
+        if on_chunk:
+            on_chunk(report)
+    return aggregator
@@ -1,12 +1,14 @@
+import dataclasses
 from abc import abstractmethod, ABC
 from dataclasses import field
-from typing import List, Optional
+from functools import cached_property
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import random
 from pydantic.dataclasses import dataclass
-from scipy.stats import chi2  # type: ignore
 
+from gbstats.kernels import chi2_cdf
 from gbstats.models.results import BanditResult, SingleVariationResult
 from gbstats.models.statistics import (
     SampleMeanStatistic,
@@ -14,12 +16,17 @@ from gbstats.models.statistics import (
     RegressionAdjustedStatistic,
 )
 from gbstats.utils import (
-    variance_of_ratios,
+    ratio_variance,
     gaussian_credible_interval,
 )
+from gbstats.bayesian.best_arm import rank_probabilities
 from gbstats.bayesian.tests import BayesianConfig, GaussianPrior
 from gbstats.models.settings import BanditWeightsSinglePeriod
 
+# Thompson sampling draws are made in chunks of this many rows, so memory
+# does not grow with the number of samples
+SAMPLE_CHUNK_SIZE = 1000
+
 
 @dataclass
 class BanditConfig(BayesianConfig):
@@ -28,6 +35,13 @@ class BanditConfig(BayesianConfig):
     prior_distribution: GaussianPrior = field(default_factory=GaussianPrior)
     min_variation_weight: float = 0.01
     weight_by_period: bool = True
+    # best-arm and top-two probabilities by quadrature instead of sampling
+    exact: bool = False
+    # Thompson sampling draws max_samples samples, the fixed budget used
+    # before sampling was chunked; with a weight_tolerance it stops early
+    # once the Monte Carlo standard error of every weight is below it
+    weight_tolerance: Optional[float] = None
+    max_samples: int = 10000
 
 
 @dataclass
@@ -40,6 +54,32 @@ class BanditResponse:
     seed: int
     bandit_update_message: str
     enough_units: Optional[bool]
+    samples_used: Optional[int] = None
+    weight_standard_error: Optional[float] = None
+
+
+# Per-arm arrays of a bandit, computed once from its statistics. Plain frozen
+# dataclass with read-only arrays, since pydantic does not validate arrays
+@dataclasses.dataclass(frozen=True)
+class BanditPosterior:
+    variation_counts: np.ndarray
+    variation_means: np.ndarray
+    variation_variances: np.ndarray
+    prior_mean: np.ndarray
+    prior_precision: np.ndarray
+    data_precision: np.ndarray
+    posterior_precision: np.ndarray
+    posterior_mean: np.ndarray
+    posterior_variance: np.ndarray
+    posterior_mean_unadjusted: np.ndarray
+    posterior_variance_unadjusted: np.ndarray
+    addback: float
+
+    def __post_init__(self):
+        for f in dataclasses.fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
 
 
 def get_error_bandit_result(
@@ -102,40 +142,72 @@ class Bandits(ABC):
     def current_sample_size(self):
         return sum(self.variation_counts)
 
-    @property
-    def historical_weights_array(self) -> np.ndarray:
-        weights_list = []
-        for period in range(self.num_periods_historical):
-            weights_list.append(self.historical_periods[period].weights)
-        return np.array(weights_list).reshape(
-            (self.num_periods_historical, self.num_variations)
+    # arrays derived from the statistics, built on first access; the
+    # statistics must not change afterwards
+    @cached_property
+    def posterior(self) -> BanditPosterior:
+        return self.compute_posterior()
+
+    def compute_posterior(self) -> BanditPosterior:
+        counts = np.array([stat.n for stat in self.stats])
+        means = self.compute_variation_means(counts)
+        variances = self.compute_variation_variances(counts)
+        prior = self.config.prior_distribution
+        prior_mean = np.full((self.num_variations,), prior.mean)
+        prior_precision = np.full(
+            (self.num_variations,), int(prior.proper) / prior.variance
+        )
+        positive_variance = variances > 0
+        data_precision = np.where(
+            positive_variance,
+            counts / np.where(positive_variance, variances, 1),
+            0,
+        ).astype(float)
+        posterior_precision = prior_precision + data_precision
+        posterior_variance = 1 / posterior_precision
+        posterior_mean = posterior_variance * (
+            prior_precision * prior_mean + data_precision * means
+        )
+        mean_unadjusted, variance_unadjusted = self.compute_unadjusted_moments(
+            counts, posterior_mean, posterior_variance
+        )
+        return BanditPosterior(
+            variation_counts=counts,
+            variation_means=means,
+            variation_variances=variances,
+            prior_mean=prior_mean,
+            prior_precision=prior_precision,
+            data_precision=data_precision,
+            posterior_precision=posterior_precision,
+            posterior_mean=posterior_mean,
+            posterior_variance=posterior_variance,
+            posterior_mean_unadjusted=mean_unadjusted,
+            posterior_variance_unadjusted=variance_unadjusted,
+            addback=self.compute_addback(counts),
         )
 
-    @property
+    # weights of each historical period, shape (periods, variations)
+    @cached_property
+    def historical_weights_array(self) -> np.ndarray:
+        return np.array(
+            [period.weights for period in self.historical_periods], dtype=float
+        ).reshape((self.num_periods_historical, self.num_variations))
+
+    @cached_property
     def period_counts(self) -> np.ndarray:
-        cumulative_counts_historical = [
-            bandit_period.total_users for bandit_period in self.historical_periods
-        ]
-        cumulative_counts = cumulative_counts_historical + [self.current_sample_size]
+        cumulative_counts = np.array(
+            [bandit_period.total_users for bandit_period in self.historical_periods]
+            + [self.current_sample_size]
+        )
+        period_counts = np.diff(cumulative_counts)
         # the total user counts collected at the end of the 1st period correspond to weights for 0th period
-        period_counts = [cumulative_counts[1]]
-        if self.num_periods_historical > 1:
-            for period in range(1, self.num_periods_historical):
-                period_counts.append(
-                    cumulative_counts[period + 1] - cumulative_counts[period]
-                )
-        return np.array(period_counts)
+        if self.num_periods_historical:
+            period_counts[0] = cumulative_counts[1]
+        return period_counts
 
     @property
     def counts_expected(self) -> np.ndarray:
-        counts_expected_by_period = np.empty(
-            (self.num_periods_historical, self.num_variations)
-        )
-        for period in range(self.num_periods_historical):
-            counts_expected_by_period[period] = (
-                self.period_counts[period] * self.historical_weights_array[period, :]
-            )
-        return np.sum(counts_expected_by_period, axis=0)
+        return self.period_counts @ self.historical_weights_array
 
     @property
     def enough_samples_for_srm(self):
@@ -148,97 +220,93 @@ class Bandits(ABC):
 
     def compute_srm(self) -> float:
         if self.enough_samples_for_srm:
-            resid = self.variation_counts - self.counts_expected
+            counts_expected = self.counts_expected
+            resid = self.variation_counts - counts_expected
             resid_squared = resid**2
-            positive_expected = self.counts_expected > 0
+            positive_expected = counts_expected > 0
             test_stat = np.sum(
-                resid_squared[positive_expected]
-                / self.counts_expected[positive_expected]
+                resid_squared[positive_expected] / counts_expected[positive_expected]
             )
             df = self.num_variations - 1
-            return float(1 - chi2.cdf(test_stat, df=df))
+            return float(1 - chi2_cdf(test_stat, df))
         else:
             return 1
 
     # sample sizes by variation
     @property
     def variation_counts(self) -> np.ndarray:
-        return np.array([stat.n for stat in self.stats])
+        return self.posterior.variation_counts
+
+    @property
+    def variation_means(self) -> np.ndarray:
+        return self.posterior.variation_means
+
+    @property
+    def variation_variances(self) -> np.ndarray:
+        return self.posterior.variation_variances
 
     @property
     def prior_precision(self) -> np.ndarray:
-        return np.full(
-            (self.num_variations,),
-            int(self.config.prior_distribution.proper)
-            / self.config.prior_distribution.variance,
-        )
+        return self.posterior.prior_precision
 
     @property
     def data_precision(self) -> np.ndarray:
-        return np.array(
-            [
-                float(n) / v if v > 0 else 0
-                for n, v in zip(self.variation_counts, self.variation_variances)
-            ]
-        )
+        return self.posterior.data_precision
 
     @property
     def posterior_precision(self) -> np.ndarray:
-        return self.prior_precision + self.data_precision
+        return self.posterior.posterior_precision
 
     @property
     def posterior_variance(self) -> np.ndarray:
-        return 1 / self.posterior_precision
+        return self.posterior.posterior_variance
 
     @property
     def prior_mean(self) -> np.ndarray:
-        return np.full((self.num_variations,), self.config.prior_distribution.mean)
+        return self.posterior.prior_mean
 
     @property
     def posterior_mean(self) -> np.ndarray:
-        return self.posterior_variance * (
-            self.prior_precision * self.prior_mean
-            + self.data_precision * self.variation_means
-        )
+        return self.posterior.posterior_mean
 
     @property
     def posterior_mean_unadjusted(self) -> np.ndarray:
-        return self.posterior_mean
+        return self.posterior.posterior_mean_unadjusted
 
     @property
     def posterior_variance_unadjusted(self) -> np.ndarray:
-        return self.posterior_variance
-
-    # number of Monte Carlo samples to perform when sampling to estimate weights for the SDK
-    @property
-    def n_samples(self) -> int:
-        return int(1e4)
+        return self.posterior.posterior_variance_unadjusted
 
     # scalar to add to the mean for leaderboard plots.  For non-cuped metrics, is 0.
     @property
     def addback(self) -> float:
+        return self.posterior.addback
+
+    def compute_addback(self, counts: np.ndarray) -> float:
         return 0
 
+    def compute_unadjusted_moments(
+        self,
+        counts: np.ndarray,
+        posterior_mean: np.ndarray,
+        posterior_variance: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return posterior_mean, posterior_variance
+
     # function that computes thompson sampling variation weights
     def compute_result(self) -> BanditResponse:
-        seed = (
-            self.bandit_weights_seed
-            if self.bandit_weights_seed
-            else random.randint(0, 1000000)
-        )
-        rng = np.random.default_rng(seed=seed)
-        y = rng.multivariate_normal(
-            mean=self.posterior_mean,
-            cov=np.diag(self.posterior_variance),
-            size=self.n_samples,
-        )
-        if self.inverse:
-            best_rows = np.min(y, axis=1)
-        else:
-            best_rows = np.max(y, axis=1)
-        best_arm_probabilities = np.mean((y == best_rows[:, np.newaxis]), axis=0)
+        return compute_bandit_results([self])[0]
+
+    def response(
+        self,
+        seed: int,
+        best_arm_probabilities: np.ndarray,
+        top_two_probabilities: np.ndarray,
+        samples_used: Optional[int] = None,
+        weight_standard_error: Optional[float] = None,
+    ) -> BanditResponse:
         if self.config.top_two:
-            p = self.top_two_weights(y, self.inverse)
+            p = top_two_probabilities
         else:
             p = best_arm_probabilities.copy()
         update_message = "successfully updated"
@@ -260,45 +328,75 @@ class Bandits(ABC):
             if enough_units
             else "total sample size must be at least 100 per variation",
             enough_units=enough_units,
+            samples_used=samples_used,
+            weight_standard_error=weight_standard_error,
+        )
+
+    # Thompson sampling counts of how often each arm is best and in the top
+    # two; see `sample_bandit_counts`
+    def sample_counts(self, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        return sample_bandit_counts([self], [rng])[0]
+
+    # Monte Carlo standard errors of the weights, which are the best-arm
+    # frequencies or half the top-two frequencies. Frequencies are estimated
+    # as (count + 1) / (n + 2), so arms never yet drawn as best do not look
+    # exact after a few draws
+    def weight_standard_errors(
+        self, best_counts: np.ndarray, top_two_counts: np.ndarray
+    ) -> np.ndarray:
+        n = best_counts.sum()
+        counts = top_two_counts if self.config.top_two else best_counts
+        frequency = (counts + 1) / (n + 2)
+        scale = 0.5 if self.config.top_two else 1
+        return scale * np.sqrt(frequency * (1 - frequency) / n)
+
+    # number of rows in which each column holds the largest (or smallest)
+    # value; leading axes, such as stacked bandits, are counted separately
+    @staticmethod
+    def best_arm_counts(y: np.ndarray, inverse=False) -> np.ndarray:
+        best = np.argmin(y, axis=-1) if inverse else np.argmax(y, axis=-1)
+        return Bandits.column_counts(best, y.shape[-1])
+
+    # occurrences of each column index in the last axis of `index`
+    @staticmethod
+    def column_counts(index: np.ndarray, n_columns: int) -> np.ndarray:
+        rows = index.reshape(-1, index.shape[-1])
+        offsets = n_columns * np.arange(rows.shape[0])[:, None]
+        counts = np.bincount(
+            (rows + offsets).ravel(), minlength=rows.shape[0] * n_columns
         )
+        return counts.reshape(index.shape[:-1] + (n_columns,)).astype(float)
 
     # function that takes weights for largest realization and turns into top two weights
     @staticmethod
     def top_two_weights(y: np.ndarray, inverse=False) -> np.ndarray:
-        """Calculates the proportion of times each column contains the largest or second largest element in a row.
+        counts = Bandits.top_two_counts(y, inverse)
+        return counts / sum(counts)
+
+    @staticmethod
+    def top_two_counts(y: np.ndarray, inverse=False) -> np.ndarray:
+        """Calculates the number of times each column contains the largest or second largest element in a row.
         Args:
-        arr: A 2D NumPy array.
+        y: A NumPy array of rows in its last two axes.
+        inverse: Whether to count the smallest and second smallest elements instead.
         Returns:
-        A NumPy array of proportions, one for each column.
+        A NumPy array of counts, one for each column.
         """
-        # g indices of sorted elements in each row
-        sorted_indices = np.argsort(y, axis=1)
-        if inverse:
-            # counts for number of times each variation was the smallest
-            unique_0, counts_0 = np.unique(
-                sorted_indices[:, 1][:, np.newaxis], return_counts=True
-            )
-            # counts for number of times each variation was the second smallest
-            unique_1, counts_1 = np.unique(
-                sorted_indices[:, 2][:, np.newaxis], return_counts=True
-            )
-        else:
-            # counts for number of times each variation was the largest
-            unique_0, counts_0 = np.unique(
-                sorted_indices[:, -1][:, np.newaxis], return_counts=True
-            )
-            # counts for number of times each variation was the second largest
-            unique_1, counts_1 = np.unique(
-                sorted_indices[:, -2][:, np.newaxis], return_counts=True
-            )
-        # put inside dicts and loop over count to ensure arms that are never the biggest are included
-        dict_0 = dict(zip(unique_0, counts_0))
-        dict_1 = dict(zip(unique_1, counts_1))
-        n_variations = y.shape[1]
-        final_counts = np.zeros((n_variations,))
-        for i in range(n_variations):
-            final_counts[i] = dict_0.get(i, 0) + dict_1.get(i, 0)
-        return final_counts / sum(final_counts)
+        n_variations = y.shape[-1]
+        if n_variations < 2:
+            return np.full(y.shape[:-2] + (n_variations,), float(y.shape[-2]))
+        # two passes of argmax (or argmin), masking the best arm of each row
+        # before the second, take O(n_variations) per row; a row-wise
+        # argpartition is asymptotically the same but slower in practice
+        best = np.argmin(y, axis=-1) if inverse else np.argmax(y, axis=-1)
+        masked = y.astype(float)
+        np.put_along_axis(
+            masked, best[..., None], np.inf if inverse else -np.inf, axis=-1
+        )
+        second = np.argmin(masked, axis=-1) if inverse else np.argmax(masked, axis=-1)
+        return Bandits.column_counts(best, n_variations) + Bandits.column_counts(
+            second, n_variations
+        )
 
     @staticmethod
     def sum_from_moments(n, mn) -> float:
@@ -312,17 +410,155 @@ class Bandits(ABC):
     def cross_product_from_moments(n, mn_x, mn_y, cov_x_y) -> float:
         return (n - 1) * cov_x_y + n * mn_x * mn_y
 
-    @property
     @abstractmethod
-    def variation_means(self) -> np.ndarray:
+    def compute_variation_means(self, counts: np.ndarray) -> np.ndarray:
         raise NotImplementedError
 
-    @property
     @abstractmethod
-    def variation_variances(self) -> np.ndarray:
+    def compute_variation_variances(self, counts: np.ndarray) -> np.ndarray:
         raise NotImplementedError
 
 
+# Per-bandit random number stream; bandits sampled together keep the draws
+# they would get alone
+def bandit_rng(seed: int) -> np.random.Generator:
+    return np.random.default_rng(np.random.SeedSequence(seed))
+
+
+# per-bandit arrays padded with `fill` to shape (bandits, max arms)
+def stack_arms(arrays: List[np.ndarray], fill: float) -> np.ndarray:
+    stacked = np.full((len(arrays), max(len(a) for a in arrays)), float(fill))
+    for i, a in enumerate(arrays):
+        stacked[i, : len(a)] = a
+    return stacked
+
+
+def sample_bandit_counts(
+    bandits: Sequence[Bandits], rngs: Sequence[np.random.Generator]
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Thompson sampling counts of how often each arm of each bandit is best
+    and in the top two.
+
+    The posteriors are independent, so each chunk of draws is
+    mean + sd * standard normal, and only running counts are kept. Chunks are
+    drawn until a bandit has `max_samples` draws or, if it sets a
+    `weight_tolerance`, until every weight is within it, so clearly
+    separated arms stop early and close arms get more draws. The draws of
+    all bandits still sampling are stacked into one array padded to the
+    largest number of arms, with inverse bandits negated so that larger is
+    always better, and ranked together. Each bandit draws its standard
+    normals from its own stream in the order it would alone, so its counts
+    do not depend on the other bandits.
+
+    Args:
+        bandits (Sequence[Bandits]): bandits to sample
+        rngs (Sequence[np.random.Generator]): one stream per bandit
+    Returns:
+        List[Tuple[np.ndarray, np.ndarray]]: best-arm and top-two counts
+    """
+    if not bandits:
+        return []
+    num_arms = np.array([b.num_variations for b in bandits])
+    # negating both moments negates the draws exactly; padding arms are
+    # drawn as -inf + 0 * z and never rank
+    sign = [-1 if b.inverse else 1 for b in bandits]
+    mean = stack_arms([c * b.posterior_mean for c, b in zip(sign, bandits)], -np.inf)
+    sd = stack_arms(
+        [c * np.sqrt(b.posterior_variance) for c, b in zip(sign, bandits)], 0
+    )
+    top_two = np.array([b.config.top_two for b in bandits])
+    max_samples = np.array([b.config.max_samples for b in bandits])
+    best_counts = np.zeros(mean.shape)
+    top_two_counts = np.zeros(mean.shape)
+    n = np.zeros(len(bandits), dtype=np.int64)
+    active = n < max_samples
+    while np.any(active):
+        sizes = np.minimum(SAMPLE_CHUNK_SIZE, max_samples - n)
+        for size in np.unique(sizes[active]):
+            group = np.flatnonzero(active & (sizes == size))
+            z = np.zeros((len(group), size, mean.shape[1]))
+            for j, i in enumerate(group):
+                z[j, :, : num_arms[i]] = rngs[i].standard_normal((size, num_arms[i]))
+            y = mean[group, None, :] + sd[group, None, :] * z
+            best = Bandits.best_arm_counts(y)
+            # a single arm is its own top two, as in `top_two_counts`
+            two = np.where(num_arms[group, None] > 1, Bandits.top_two_counts(y), best)
+            best_counts[group] += best
+            top_two_counts[group] += np.where(top_two[group, None], two, 0)
+            n[group] += size
+        for i in np.flatnonzero(active):
+            tolerance = bandits[i].config.weight_tolerance
+            if n[i] >= max_samples[i]:
+                active[i] = False
+            elif tolerance is not None:
+                errors = bandits[i].weight_standard_errors(
+                    best_counts[i, : num_arms[i]], top_two_counts[i, : num_arms[i]]
+                )
+                active[i] = np.max(errors) >= tolerance
+    return [(best_counts[i, :k], top_two_counts[i, :k]) for i, k in enumerate(num_arms)]
+
+
+def compute_bandit_results(bandits: Sequence[Bandits]) -> List[BanditResponse]:
+    """Thompson sampling weights for many bandits in one call.
+
+    Sampled bandits are drawn together by `sample_bandit_counts` and exact
+    bandits are integrated together by `rank_probabilities` over padded
+    arrays. Each bandit draws from the stream of its `bandit_weights_seed`,
+    or of a random seed if it has none, so every response is identical to
+    `compute_result` of the bandit alone. This is a convenience rather than
+    a speedup: the normal draws and rankings dominate and are the same work
+    either way.
+
+    Args:
+        bandits (Sequence[Bandits]): bandits to update
+    Returns:
+        List[BanditResponse]: one response per bandit
+    """
+    seeds = [
+        b.bandit_weights_seed if b.bandit_weights_seed else random.randint(0, 1000000)
+        for b in bandits
+    ]
+    sampled = [i for i, b in enumerate(bandits) if not b.config.exact]
+    exact = [i for i, b in enumerate(bandits) if b.config.exact]
+    responses: Dict[int, BanditResponse] = {}
+
+    counts = sample_bandit_counts(
+        [bandits[i] for i in sampled], [bandit_rng(seeds[i]) for i in sampled]
+    )
+    for i, (best_counts, top_two_counts) in zip(sampled, counts):
+        samples_used = int(best_counts.sum())
+        responses[i] = bandits[i].response(
+            seeds[i],
+            best_counts / samples_used,
+            top_two_counts / (2 * samples_used),
+            samples_used,
+            float(
+                np.max(bandits[i].weight_standard_errors(best_counts, top_two_counts))
+            ),
+        )
+
+    if exact:
+        means = [
+            -bandits[i].posterior_mean
+            if bandits[i].inverse
+            else bandits[i].posterior_mean
+            for i in exact
+        ]
+        sds = [np.sqrt(bandits[i].posterior_variance) for i in exact]
+        valid = stack_arms([np.ones(len(m)) for m in means], 0).astype(bool)
+        best, second = rank_probabilities(
+            stack_arms(means, 0), stack_arms(sds, 1), valid=valid
+        )
+        for j, i in enumerate(exact):
+            k = bandits[i].num_variations
+            responses[i] = bandits[i].response(
+                seeds[i],
+                best[j, :k] / np.sum(best[j, :k]),
+                (best[j, :k] + second[j, :k]) / np.sum(best[j, :k] + second[j, :k]),
+            )
+    return [responses[i] for i in range(len(bandits))]
+
+
 class BanditsSimple(Bandits):
     def __init__(
         self,
@@ -337,12 +573,10 @@ class BanditsSimple(Bandits):
         self.config = config
         self.inverse = self.config.inverse
 
-    @property
-    def variation_means(self) -> np.ndarray:
+    def compute_variation_means(self, counts: np.ndarray) -> np.ndarray:
         return np.array([stat.mean for stat in self.stats])
 
-    @property
-    def variation_variances(self) -> np.ndarray:
+    def compute_variation_variances(self, counts: np.ndarray) -> np.ndarray:
         return np.array([stat.variance for stat in self.stats])
 
 
@@ -368,8 +602,7 @@ class BanditsRatio(Bandits):
     def denominator_means(self) -> np.ndarray:
         return np.array([stat.d_statistic.mean for stat in self.stats])
 
-    @property
-    def variation_means(self) -> np.ndarray:
+    def compute_variation_means(self, counts: np.ndarray) -> np.ndarray:
         return self.construct_mean(self.numerator_means, self.denominator_means)
 
     @property
@@ -384,21 +617,14 @@ class BanditsRatio(Bandits):
     def covariances(self) -> np.ndarray:
         return np.array([stat.covariance for stat in self.stats])
 
-    @property
-    def variation_variances(self) -> np.ndarray:
-        return np.array(
-            [
-                variance_of_ratios(
-                    self.numerator_means[variation],
-                    self.numerator_variances[variation],
-                    self.denominator_means[variation],
-                    self.denominator_variances[variation],
-                    self.covariances[variation],
-                )
-                if self.variation_counts[variation] > 0
-                else 0
-                for variation in range(self.num_variations)
-            ]
+    def compute_variation_variances(self, counts: np.ndarray) -> np.ndarray:
+        return ratio_variance(
+            self.numerator_means,
+            self.numerator_variances,
+            self.denominator_means,
+            self.denominator_variances,
+            self.covariances,
+            n=counts,
         )
 
 
@@ -442,41 +668,34 @@ class BanditsCuped(Bandits):
         return self.stats[0].theta if self.stats[0].theta else 0
 
     # for cuped, when producing intervals for the leaderboard, add back in the pooled baseline mean
-    @property
-    def addback(self) -> float:
-        if self.current_sample_size:
+    def compute_addback(self, counts: np.ndarray) -> float:
+        sample_size = sum(counts)
+        if sample_size:
             return float(
-                self.theta
-                * np.sum(self.variation_counts * self.variation_means_pre)
-                / self.current_sample_size
+                self.theta * np.sum(counts * self.variation_means_pre) / sample_size
             )
         else:
             return 0
 
-    @property
-    def variation_means(self) -> np.ndarray:
+    def compute_variation_means(self, counts: np.ndarray) -> np.ndarray:
         return (
             self.variation_means_post
             - self.theta * self.variation_means_pre
-            + self.addback
+            + self.compute_addback(counts)
         )
 
-    @property
-    def posterior_mean_unadjusted(self) -> np.ndarray:
-        return self.variation_means_post
-
-    @property
-    def posterior_variance_unadjusted(self) -> np.ndarray:
+    def compute_unadjusted_moments(
+        self,
+        counts: np.ndarray,
+        posterior_mean: np.ndarray,
+        posterior_variance: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
         v = np.zeros((self.num_variations,))
-        positive_n = self.variation_counts > 0
-        v[positive_n] = (
-            self.variation_variances_post[positive_n]
-            / self.variation_counts[positive_n]
-        )
-        return v
+        positive_n = counts > 0
+        v[positive_n] = self.variation_variances_post[positive_n] / counts[positive_n]
+        return self.variation_means_post, v
 
-    @property
-    def variation_variances(self) -> np.ndarray:
+    def compute_variation_variances(self, counts: np.ndarray) -> np.ndarray:
         return (
             self.variation_variances_post
             + self.theta**2 * self.variation_variances_pre
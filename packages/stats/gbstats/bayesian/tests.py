@@ -1,18 +1,27 @@
+import dataclasses
 from abc import abstractmethod
 from dataclasses import field
-from typing import List, Literal, Optional
+from typing import List, Literal, Optional, Tuple
 
 import numpy as np
 from pydantic.dataclasses import dataclass
-from scipy.stats import norm
 
 from gbstats.messages import (
     BASELINE_VARIATION_ZERO_MESSAGE,
     ZERO_NEGATIVE_VARIANCE_MESSAGE,
     ZERO_SCALED_VARIATION_MESSAGE,
     NO_UNITS_IN_VARIATION_MESSAGE,
+    BAYESIAN_SCALED_IMPACT_STATISTIC_MESSAGE,
+)
+from gbstats.kernels import norm_ppf, norm_sf
+from gbstats.models.tests import (
+    BaseABTest,
+    BaseConfig,
+    ComparisonMoments,
+    ScaledImpactInputs,
+    TestResult,
+    Uplift,
 )
-from gbstats.models.tests import BaseABTest, BaseConfig, TestResult, Uplift
 from gbstats.models.statistics import (
     TestStatistic,
     ProportionStatistic,
@@ -24,8 +33,9 @@ from gbstats.frequentist.tests import (
     frequentist_variance,
 )
 from gbstats.utils import (
-    truncated_normal_mean,
+    normal_risk,
     gaussian_credible_interval,
+    relative_effect_variance,
 )
 
 
@@ -101,9 +111,9 @@ class BayesianABTest(BaseABTest):
 
     def chance_to_win(self, mean_diff: float, std_diff: float) -> float:
         if self.inverse:
-            return 1 - norm.sf(0, mean_diff, std_diff)  # type: ignore
+            return 1 - norm_sf(0, mean_diff, std_diff)
         else:
-            return norm.sf(0, mean_diff, std_diff)  # type: ignore
+            return norm_sf(0, mean_diff, std_diff)
 
     def scale_result(self, result: BayesianTestResult) -> BayesianTestResult:
         if result.uplift.dist != "normal":
@@ -133,8 +143,7 @@ class BayesianABTest(BaseABTest):
             else:
                 return self._default_output(NO_UNITS_IN_VARIATION_MESSAGE)
         else:
-            error_str = "For scaled impact the statistic must be of type ProportionStatistic, SampleMeanStatistic, or RegressionAdjustedStatistic"
-            return self._default_output(error_str)
+            return self._default_output(BAYESIAN_SCALED_IMPACT_STATISTIC_MESSAGE)
 
 
 class EffectBayesianABTest(BayesianABTest):
@@ -228,11 +237,198 @@ class EffectBayesianABTest(BayesianABTest):
             result = self.scale_result(result)
         return result
 
+    # Correlation of the effect estimate with the noise of the baseline mean,
+    # which every effect against this baseline shares; the posterior is taken
+    # to keep the correlation of the data estimate
+    @property
+    def baseline_correlation(self) -> float:
+        data_variance = frequentist_variance(
+            self.stat_a.variance,
+            self.stat_a.unadjusted_mean,
+            self.stat_a.n,
+            self.stat_b.variance,
+            self.stat_b.unadjusted_mean,
+            self.stat_b.n,
+            self.relative,
+        )
+        # loading of the effect on the baseline mean: 1 for absolute effects
+        # and m_b / m_a^2 for relative ones
+        loading = (
+            self.stat_b.unadjusted_mean / pow(self.stat_a.unadjusted_mean, 2)
+            if self.relative
+            else 1
+        )
+        baseline_stddev = np.sqrt(self.stat_a.variance / self.stat_a.n)
+        return float(loading * baseline_stddev / np.sqrt(data_variance))
+
     @staticmethod
     def get_risk(mu, sigma) -> List[float]:
-        prob_ctrl_is_better = norm.cdf(0.0, loc=mu, scale=sigma)
-        mn_neg = truncated_normal_mean(mu=mu, sigma=sigma, a=-np.inf, b=0.0)
-        mn_pos = truncated_normal_mean(mu=mu, sigma=sigma, a=0, b=np.inf)
-        risk_ctrl = float((1.0 - prob_ctrl_is_better) * mn_pos)
-        risk_trt = -float(prob_ctrl_is_better * mn_neg)
-        return [risk_ctrl, risk_trt]
+        risk_ctrl, risk_trt = normal_risk(mu, sigma)
+        return [float(risk_ctrl), float(risk_trt)]
+
+
+# Batched results; plain dataclass since pydantic does not validate arrays
+@dataclasses.dataclass
+class BatchedBayesianTestResult:
+    chance_to_win: np.ndarray
+    expected: np.ndarray
+    ci_lower: np.ndarray
+    ci_upper: np.ndarray
+    stddev: np.ndarray
+    # one row of [control, treatment] risk per comparison
+    risk: np.ndarray
+    risk_type: RiskType
+    error_message: List[Optional[str]]
+
+    def to_results(self) -> List[BayesianTestResult]:
+        return [
+            BayesianTestResult(
+                chance_to_win=float(self.chance_to_win[i]),
+                expected=float(self.expected[i]),
+                ci=[float(self.ci_lower[i]), float(self.ci_upper[i])],
+                uplift=Uplift(
+                    dist="normal",
+                    mean=float(self.expected[i]),
+                    stddev=float(self.stddev[i]),
+                ),
+                risk=[float(self.risk[i, 0]), float(self.risk[i, 1])],
+                risk_type=self.risk_type,
+                error_message=self.error_message[i],
+            )
+            for i in range(len(self.expected))
+        ]
+
+
+class BatchedEffectBayesianABTest:
+    def __init__(
+        self,
+        moments: ComparisonMoments,
+        config: EffectBayesianConfig = EffectBayesianConfig(),
+        scaled_impact: Optional[ScaledImpactInputs] = None,
+    ):
+        """Array version of `EffectBayesianABTest` that analyzes many
+        baseline/variation pairs at once, e.g. every variation of every
+        dimension of a metric. Results match the scalar test; cells that the
+        scalar test would reject are masked and returned with the same
+        default output and error message.
+
+        Args:
+            moments (ComparisonMoments): moments of every comparison
+            config (EffectBayesianConfig): shared config for all comparisons
+            scaled_impact (ScaledImpactInputs): scaling inputs of every
+                comparison; required for scaled impact
+        """
+        if config.difference_type == "scaled" and scaled_impact is None:
+            raise ValueError("Scaled impact requires scaled impact inputs.")
+        self.moments = moments
+        self.config = config
+        self.alpha = config.alpha
+        self.inverse = config.inverse
+        self.relative = config.difference_type == "relative"
+        self.scaled = config.difference_type == "scaled"
+        self.scaled_impact = scaled_impact
+
+    @property
+    def prior(self) -> Tuple[np.ndarray, np.ndarray]:
+        # prior mean and variance on the scale of the effect, as rescaled in
+        # `EffectBayesianABTest.compute_result`
+        prior = self.config.prior_effect
+        mean = np.full(self.moments.size, float(prior.mean))
+        variance = np.full(self.moments.size, float(prior.variance))
+        if not self.relative and self.config.prior_type == "relative":
+            baseline = self.moments.unadjusted_mean_a
+            mean = prior.mean * np.abs(baseline)
+            variance = prior.variance * np.power(baseline, 2)
+        return mean, variance
+
+    @property
+    def data_variance(self) -> np.ndarray:
+        m = self.moments
+        if self.relative:
+            return np.asarray(
+                relative_effect_variance(
+                    m.unadjusted_mean_a,
+                    m.variance_a,
+                    m.n_a,
+                    m.unadjusted_mean_b,
+                    m.variance_b,
+                    m.n_b,
+                )
+            )
+        return m.variance_b / m.n_b + m.variance_a / m.n_a
+
+    @property
+    def data_mean(self) -> np.ndarray:
+        m = self.moments
+        if self.relative:
+            denominator = np.where(
+                m.unadjusted_mean_a != 0, m.unadjusted_mean_a, m.mean_a
+            )
+            return (m.mean_b - m.mean_a) / denominator
+        return m.mean_b - m.mean_a
+
+    @property
+    def error_message(self) -> List[Optional[str]]:
+        m = self.moments
+        # same precedence as `EffectBayesianABTest.compute_result`, set in
+        # reverse so earlier checks overwrite later ones
+        messages = np.full(m.size, None, dtype=object)
+        proper = self.config.prior_effect.proper
+        if proper and not self.relative and self.config.prior_type == "relative":
+            messages[m.unadjusted_mean_a == 0] = BASELINE_VARIATION_ZERO_MESSAGE
+        messages[m.zero_variance_a | m.zero_variance_b] = ZERO_NEGATIVE_VARIANCE_MESSAGE
+        messages[(m.n_a == 0) | (m.n_b == 0)] = NO_UNITS_IN_VARIATION_MESSAGE
+        if self.relative:
+            messages[
+                (m.mean_a == 0) | (m.unadjusted_mean_a == 0)
+            ] = BASELINE_VARIATION_ZERO_MESSAGE
+        if self.scaled and self.scaled_impact is not None:
+            return self.scaled_impact.error_message(
+                messages.tolist(), BAYESIAN_SCALED_IMPACT_STATISTIC_MESSAGE
+            )
+        return messages.tolist()
+
+    def compute_result(self) -> BatchedBayesianTestResult:
+        error_message = self.error_message
+        valid = np.array([e is None for e in error_message], dtype=bool)
+        proper = self.config.prior_effect.proper
+        with np.errstate(divide="ignore", invalid="ignore"):
+            data_variance = self.data_variance
+            data_mean = self.data_mean
+            prior_mean, prior_variance = self.prior
+            post_prec = 1 / data_variance + (1 / prior_variance if proper else 0)
+            mean_diff = (
+                (data_mean / data_variance + prior_mean / prior_variance) / post_prec
+                if proper
+                else data_mean
+            )
+            std_diff = np.sqrt(1 / post_prec)
+
+            chance_to_win = norm_sf(0, mean_diff, std_diff)
+            if self.inverse:
+                chance_to_win = 1 - chance_to_win
+            ci_lower = norm_ppf(self.alpha / 2, mean_diff, std_diff)
+            ci_upper = norm_ppf(1 - self.alpha / 2, mean_diff, std_diff)
+            risk_ctrl, risk_trt = normal_risk(mean_diff, std_diff)
+            risk = np.stack(
+                [risk_trt, risk_ctrl] if self.inverse else [risk_ctrl, risk_trt],
+                axis=-1,
+            )
+            if self.scaled and self.scaled_impact is not None:
+                # scaled impact is the absolute effect in daily traffic units
+                adjustment = self.scaled_impact.adjustment
+                mean_diff = mean_diff * adjustment
+                ci_lower = ci_lower * adjustment
+                ci_upper = ci_upper * adjustment
+                std_diff = std_diff * adjustment
+
+        return BatchedBayesianTestResult(
+            chance_to_win=np.where(valid, chance_to_win, 0.5),
+            expected=np.where(valid, mean_diff, 0),
+            ci_lower=np.where(valid, ci_lower, 0),
+            ci_upper=np.where(valid, ci_upper, 0),
+            stddev=np.where(valid, std_diff, 0),
+            risk=np.where(valid[:, None], risk, 0),
+            risk_type="relative" if self.relative else "absolute",
+            error_message=error_message,
+        )
@@ -0,0 +1,276 @@
+import timeit
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from scipy.stats import chi2, norm, t
+
+from gbstats import kernels
+from gbstats.aggregate import grouped_quantiles
+from gbstats.bayesian.bandits import (
+    BanditConfig,
+    BanditsSimple,
+    compute_bandit_results,
+)
+from gbstats.bayesian.best_arm import probability_best, rank_probabilities
+from gbstats.models.statistics import SampleMeanStatistic
+from gbstats.utils import normal_risk, truncated_normal_mean
+
+##############################################
+# this file is used for internal testing only.
+# no methods from this file should be exported.
+###############################################
+
+
+# (scipy.stats call, gbstats.kernels call) pairs evaluated with scalar arguments
+KERNEL_CASES: Dict[str, Tuple[Callable, Callable]] = {
+    "norm.cdf": (
+        lambda: norm.cdf(0.0, loc=0.3, scale=1.2),
+        lambda: kernels.norm_cdf(0.0, loc=0.3, scale=1.2),
+    ),
+    "norm.sf": (
+        lambda: norm.sf(0.0, 0.3, 1.2),
+        lambda: kernels.norm_sf(0.0, 0.3, 1.2),
+    ),
+    "norm.ppf": (
+        lambda: norm.ppf(0.975),
+        lambda: kernels.norm_ppf(0.975),
+    ),
+    "t.cdf": (
+        lambda: t.cdf(1.7, 120.5),
+        lambda: kernels.t_cdf(1.7, 120.5),
+    ),
+    "t.ppf": (
+        lambda: t.ppf(0.975, 120.5),
+        lambda: kernels.t_ppf(0.975, 120.5),
+    ),
+    "chi2.sf": (
+        lambda: chi2.sf(3.2, 3),
+        lambda: kernels.chi2_sf(3.2, 3),
+    ),
+    "chi2.cdf": (
+        lambda: chi2.cdf(3.2, 3),
+        lambda: kernels.chi2_cdf(3.2, 3),
+    ),
+    # Bayesian risk from truncated normal means vs partial expectations
+    "risk": (
+        lambda: (
+            (1 - norm.cdf(0.0, 0.1, 0.05))
+            * truncated_normal_mean(0.1, 0.05, 0, float("inf")),
+            norm.cdf(0.0, 0.1, 0.05)
+            * truncated_normal_mean(0.1, 0.05, float("-inf"), 0.0),
+        ),
+        lambda: normal_risk(0.1, 0.05),
+    ),
+}
+
+
+def benchmark_kernels(number: int = 10000) -> Dict[str, Dict[str, float]]:
+    """Microseconds per scalar call for scipy.stats and gbstats.kernels."""
+    results = {}
+    for name, (scipy_call, kernel_call) in KERNEL_CASES.items():
+        scipy_us = timeit.timeit(scipy_call, number=number) / number * 1e6
+        kernel_us = timeit.timeit(kernel_call, number=number) / number * 1e6
+        results[name] = {
+            "scipy_us": scipy_us,
+            "kernel_us": kernel_us,
+            "speedup": scipy_us / kernel_us,
+        }
+    return results
+
+
+# Monte Carlo estimate of the probability of being best and expected loss,
+# as computed offline before `probability_best`
+def probability_best_monte_carlo(
+    mean: np.ndarray,
+    stddev: np.ndarray,
+    samples: int,
+    seed: int = 0,
+    correlation: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    rho = np.zeros(mean.shape) if correlation is None else correlation
+    prob = np.zeros((mean.shape[0], mean.shape[1] + 1))
+    loss = np.zeros(prob.shape)
+    for d in range(mean.shape[0]):
+        # effects share one baseline draw per sample
+        shared = rng.standard_normal((samples, 1))
+        noise = rng.standard_normal((samples, mean.shape[1]))
+        draws = mean[d] + stddev[d] * (
+            rho[d] * shared + np.sqrt(1 - rho[d] ** 2) * noise
+        )
+        draws = np.concatenate([np.zeros((samples, 1)), draws], axis=1)
+        prob[d] = np.bincount(draws.argmax(axis=1), minlength=prob.shape[1])
+        loss[d] = np.mean(draws.max(axis=1, keepdims=True) - draws, axis=0)
+    return prob / samples, loss
+
+
+def benchmark_probability_best(
+    dimensions: int = 20,
+    variations: int = 4,
+    samples: int = 100000,
+    number: int = 3,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """Runtime of quadrature and Monte Carlo probability of being best, and
+    the largest absolute difference between them."""
+    rng = np.random.default_rng(seed)
+    mean = rng.normal(0, 0.05, (dimensions, variations))
+    stddev = rng.uniform(0.01, 0.05, (dimensions, variations))
+    prob, loss = probability_best(mean, stddev)
+    mc_prob, mc_loss = probability_best_monte_carlo(mean, stddev, samples, seed)
+    quadrature_ms = (
+        timeit.timeit(lambda: probability_best(mean, stddev), number=number)
+        / number
+        * 1e3
+    )
+    monte_carlo_ms = (
+        timeit.timeit(
+            lambda: probability_best_monte_carlo(mean, stddev, samples, seed),
+            number=number,
+        )
+        / number
+        * 1e3
+    )
+    return {
+        "quadrature_ms": quadrature_ms,
+        "monte_carlo_ms": monte_carlo_ms,
+        "speedup": monte_carlo_ms / quadrature_ms,
+        "max_prob_error": float(np.max(np.abs(prob - mc_prob))),
+        "max_loss_error": float(np.max(np.abs(loss - mc_loss))),
+    }
+
+
+def benchmark_bandit_probabilities(
+    arms: int = 20, number: int = 5, seed: int = 0
+) -> Dict[str, float]:
+    """Runtime of bandit weights by Thompson sampling and by quadrature, and
+    the largest absolute error of the sampled best-arm and top-two
+    probabilities."""
+    rng = np.random.default_rng(seed)
+    stats = [
+        SampleMeanStatistic(n=1000, sum=1000 * mean, sum_squares=1000 * (mean**2 + 4))
+        for mean in rng.normal(1, 0.05, arms)
+    ]
+    bandits = [
+        BanditsSimple(
+            stats,
+            [],
+            [1 / arms] * arms,
+            BanditConfig(bandit_weights_seed=seed + 1, exact=exact),
+        )
+        for exact in [False, True]
+    ]
+    sampling_ms, quadrature_ms = [
+        timeit.timeit(bandit.compute_result, number=number) / number * 1e3
+        for bandit in bandits
+    ]
+    best_counts, top_two_counts = bandits[0].sample_counts(np.random.default_rng(seed))
+    best, second = rank_probabilities(
+        bandits[1].posterior_mean, np.sqrt(bandits[1].posterior_variance)
+    )
+    n_samples = best_counts.sum()
+    return {
+        "sampling_ms": sampling_ms,
+        "quadrature_ms": quadrature_ms,
+        "speedup": sampling_ms / quadrature_ms,
+        "max_best_arm_error": float(np.max(np.abs(best_counts / n_samples - best[0]))),
+        "max_top_two_error": float(
+            np.max(np.abs(top_two_counts / (2 * n_samples) - (best[0] + second[0]) / 2))
+        ),
+    }
+
+
+def benchmark_bandit_batch(
+    bandits: int = 200, number: int = 3, seed: int = 0
+) -> Dict[str, float]:
+    """Runtime of updating many bandits one at a time and in one
+    `compute_bandit_results` call. The batch is a convenience; both do the
+    same draws and rankings, so the runtimes should stay close."""
+    rng = np.random.default_rng(seed)
+    batch = []
+    for i in range(bandits):
+        arms = int(rng.integers(2, 6))
+        stats = [
+            SampleMeanStatistic(n=n, sum=n * m, sum_squares=n * (m**2 + 4))
+            for n, m in zip(rng.integers(200, 5000, arms), rng.normal(1, 0.05, arms))
+        ]
+        config = BanditConfig(bandit_weights_seed=i + 1)
+        batch.append(BanditsSimple(stats, [], [1 / arms] * arms, config))
+    single_ms = (
+        timeit.timeit(lambda: [b.compute_result() for b in batch], number=number)
+        / number
+        * 1e3
+    )
+    batch_ms = (
+        timeit.timeit(lambda: compute_bandit_results(batch), number=number)
+        / number
+        * 1e3
+    )
+    return {
+        "single_ms": single_ms,
+        "batch_ms": batch_ms,
+        "ratio": single_ms / batch_ms,
+    }
+
+
+def benchmark_grouped_quantiles(
+    rows: int = 2000000, groups: int = 12, number: int = 3, seed: int = 0
+) -> Dict[str, float]:
+    """Runtime of grouped quantiles by partial selection, and of only the full
+    sort by group and value that they replace."""
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, groups, rows)
+    values = rng.exponential(size=rows)
+    levels = rng.uniform(size=(groups, 3))
+    partition_ms = (
+        timeit.timeit(lambda: grouped_quantiles(values, codes, levels), number=number)
+        / number
+        * 1e3
+    )
+    sort_ms = (
+        timeit.timeit(lambda: values[np.lexsort((values, codes))], number=number)
+        / number
+        * 1e3
+    )
+    return {
+        "partition_ms": partition_ms,
+        "sort_ms": sort_ms,
+        "speedup": sort_ms / partition_ms,
+    }
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_kernels().items():
+        print(
+            f"{name:10s} scipy.stats {result['scipy_us']:8.2f}us"
+            f"  kernels {result['kernel_us']:6.2f}us"
+            f"  speedup {result['speedup']:5.1f}x"
+        )
+    result = benchmark_probability_best()
+    print(
+        f"probability best quadrature {result['quadrature_ms']:.2f}ms"
+        f"  monte carlo {result['monte_carlo_ms']:.2f}ms"
+        f"  speedup {result['speedup']:.1f}x"
+        f"  max error {result['max_prob_error']:.4f}"
+        f" (loss {result['max_loss_error']:.5f})"
+    )
+    result = benchmark_bandit_probabilities()
+    print(
+        f"bandit weights quadrature {result['quadrature_ms']:.2f}ms"
+        f"  sampling {result['sampling_ms']:.2f}ms"
+        f"  speedup {result['speedup']:.1f}x"
+        f"  max error {result['max_best_arm_error']:.4f}"
+        f" (top two {result['max_top_two_error']:.4f})"
+    )
+    result = benchmark_bandit_batch()
+    print(
+        f"bandit batch {result['batch_ms']:.1f}ms"
+        f"  one at a time {result['single_ms']:.1f}ms"
+        f"  ratio {result['ratio']:.2f}"
+    )
+    result = benchmark_grouped_quantiles()
+    print(
+        f"grouped quantiles {result['partition_ms']:.1f}ms"
+        f"  full sort {result['sort_ms']:.1f}ms"
+        f"  speedup {result['speedup']:.1f}x"
+    )
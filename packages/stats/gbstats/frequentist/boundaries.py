@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from typing import Dict, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic.dataclasses import dataclass
+from scipy.optimize import brentq
+
+from gbstats.kernels import norm_cdf, norm_ppf, two_sided_z
+
+SpendingFunction = Literal["obrien-fleming", "pocock"]
+
+# Number of grid points used to integrate the density of the test
+# statistic over the continuation region; odd for Simpson's rule
+GRID_SIZE = 401
+
+# Critical values above this are treated as never crossed
+MAX_CRITICAL_VALUE = 40
+
+# Boundary tables are only cached on disk when a directory is configured
+BOUNDARY_CACHE_DIR: Optional[str] = os.environ.get("GBSTATS_CACHE_DIR")
+
+_TABLE_VERSION = 1
+
+
+@dataclass
+class BoundaryTable:
+    alpha: float
+    spending_function: SpendingFunction
+    information_fractions: List[float]
+    # two-sided critical values on the z scale, one per look
+    critical_values: List[float]
+    # alpha spent through each look
+    cumulative_alpha: List[float]
+
+    @property
+    def nominal_alpha(self) -> List[float]:
+        return [
+            float(2 * norm_cdf(-c)) if c < MAX_CRITICAL_VALUE else 0.0
+            for c in self.critical_values
+        ]
+
+
+# Lan-DeMets spending functions approximating the O'Brien-Fleming and
+# Pocock boundaries; both spend exactly alpha at information fraction 1.
+# O'Brien-Fleming spends alpha / 2 per side for symmetric boundaries
+def alpha_spent(
+    information_fractions: np.ndarray, alpha: float, spending_function: SpendingFunction
+) -> np.ndarray:
+    t = np.asarray(information_fractions, dtype=float)
+    if spending_function == "obrien-fleming":
+        return 4 * norm_cdf(-two_sided_z(alpha / 2) / np.sqrt(t))
+    if spending_function == "pocock":
+        return alpha * np.log(1 + (np.e - 1) * t)
+    raise ValueError(f"Unknown spending function: {spending_function}")
+
+
+def _simpson_weights(n: int, step: float) -> np.ndarray:
+    weights = np.ones(n)
+    weights[1:-1:2] = 4
+    weights[2:-1:2] = 2
+    return weights * step / 3
+
+
+# Grid and density of S at the first look within the continuation region
+def _first_look_density(
+    t: float, critical_value: float, grid_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    bound = critical_value * np.sqrt(t)
+    grid = np.linspace(-bound, bound, grid_size)
+    return grid, np.exp(-(grid**2) / (2 * t)) / np.sqrt(2 * np.pi * t)
+
+
+# Probability that a path still in the continuation region (grid and
+# Simpson-weighted density mass) ends up beyond +/- b after an increment
+# with standard deviation sd
+def _crossing_probability(
+    grid: np.ndarray, mass: np.ndarray, sd: float, b: float
+) -> float:
+    return float(
+        np.sum(mass * (norm_cdf((-b - grid) / sd) + norm_cdf((grid - b) / sd)))
+    )
+
+
+# Density of S at the next look within its continuation region
+def _carry_density(
+    grid: np.ndarray, mass: np.ndarray, sd: float, bound: float, grid_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    new_grid = np.linspace(-bound, bound, grid_size)
+    z = (new_grid[:, None] - grid[None, :]) / sd
+    return new_grid, (np.exp(-(z**2) / 2) / (np.sqrt(2 * np.pi) * sd)) @ mass
+
+
+def compute_boundary_table(
+    alpha: float,
+    spending_function: SpendingFunction,
+    information_fractions: Sequence[float],
+    grid_size: int = GRID_SIZE,
+) -> BoundaryTable:
+    """Two-sided group-sequential boundaries for an alpha-spending function.
+
+    The z statistic at look k is S_k / sqrt(t_k), where S is a Brownian
+    motion observed at the information fractions t_k. The density of S among
+    paths that have not crossed a boundary is carried from look to look on a
+    grid and integrated with Simpson's rule, and each critical value is found
+    by root finding so that the probability of first crossing at that look
+    equals the alpha spent since the previous look.
+
+    Args:
+        alpha (float): overall two-sided type I error
+        spending_function (SpendingFunction): alpha-spending function
+        information_fractions (Sequence[float]): increasing look schedule
+            ending at 1
+        grid_size (int): integration grid size; rounded up to odd
+    Returns:
+        BoundaryTable: critical values and alpha spent per look
+    """
+    t = np.asarray(information_fractions, dtype=float)
+    if t.size == 0 or np.any(np.diff(t) <= 0) or t[0] <= 0 or t[-1] != 1:
+        raise ValueError(
+            "Information fractions must be increasing, positive and end at 1."
+        )
+    grid_size += 1 - grid_size % 2
+    cumulative_alpha = alpha_spent(t, alpha, spending_function)
+    spend = np.diff(cumulative_alpha, prepend=0)
+
+    critical_values = [min(float(-norm_ppf(spend[0] / 2)), MAX_CRITICAL_VALUE)]
+    grid, density = _first_look_density(t[0], critical_values[0], grid_size)
+    for k in range(1, t.size):
+        sd = float(np.sqrt(t[k] - t[k - 1]))
+        mass = density * _simpson_weights(grid_size, grid[1] - grid[0])
+
+        def crossing(c: float) -> float:
+            return _crossing_probability(grid, mass, sd, c * np.sqrt(t[k]))
+
+        if spend[k] <= 0 or crossing(MAX_CRITICAL_VALUE) >= spend[k]:
+            critical_values.append(MAX_CRITICAL_VALUE)
+        else:
+            root = brentq(lambda c: crossing(c) - spend[k], 0, MAX_CRITICAL_VALUE)
+            critical_values.append(float(root))  # type: ignore
+
+        grid, density = _carry_density(
+            grid, mass, sd, critical_values[k] * np.sqrt(t[k]), grid_size
+        )
+
+    return BoundaryTable(
+        alpha=alpha,
+        spending_function=spending_function,
+        information_fractions=t.tolist(),
+        critical_values=critical_values,
+        cumulative_alpha=cumulative_alpha.tolist(),
+    )
+
+
+def stagewise_p_value(
+    table: BoundaryTable, look_index: int, z: float, grid_size: int = GRID_SIZE
+) -> float:
+    """Two-sided p-value under the stage-wise ordering for a design stopped
+    at `look_index` with z statistic `z`.
+
+    Outcomes are ordered by the look at which a boundary is first crossed,
+    and within a look by |z|. The p-value is the null probability of
+    crossing a boundary at an earlier look, plus that of reaching this look
+    and observing a statistic at least as large as |z|. It is below the
+    alpha spent through the look exactly when |z| is beyond the look's
+    critical value.
+
+    Args:
+        table (BoundaryTable): boundaries of the design
+        look_index (int): index of the look at which the design stopped
+        z (float): z statistic at that look
+        grid_size (int): integration grid size; rounded up to odd
+    Returns:
+        float: the stage-wise p-value
+    """
+    t = table.information_fractions
+    critical_values = table.critical_values
+    z = abs(z)
+    if look_index == 0:
+        return float(2 * norm_cdf(-z))
+    grid_size += 1 - grid_size % 2
+    # probability of crossing at the first look
+    p_value = float(2 * norm_cdf(-critical_values[0]))
+    grid, density = _first_look_density(t[0], critical_values[0], grid_size)
+    for k in range(1, look_index + 1):
+        sd = float(np.sqrt(t[k] - t[k - 1]))
+        mass = density * _simpson_weights(grid_size, grid[1] - grid[0])
+        if k == look_index:
+            p_value += _crossing_probability(grid, mass, sd, z * np.sqrt(t[k]))
+            break
+        b = critical_values[k] * np.sqrt(t[k])
+        p_value += _crossing_probability(grid, mass, sd, b)
+        grid, density = _carry_density(grid, mass, sd, b, grid_size)
+    return float(min(p_value, 1))
+
+
+_BOUNDARY_TABLES: Dict[Tuple[float, str, Tuple[float, ...]], BoundaryTable] = {}
+
+
+def _cache_path(cache_dir: str, key: Tuple[float, str, Tuple[float, ...]]) -> str:
+    digest = hashlib.sha256(
+        json.dumps([_TABLE_VERSION, GRID_SIZE, *key]).encode()
+    ).hexdigest()
+    return os.path.join(cache_dir, f"boundaries-{digest[:32]}.json")
+
+
+def get_boundary_table(
+    alpha: float,
+    spending_function: SpendingFunction,
+    information_fractions: Sequence[float],
+    cache_dir: Optional[str] = BOUNDARY_CACHE_DIR,
+) -> BoundaryTable:
+    """Boundary table for a design, computed at most once per process and,
+    when a `cache_dir` is given (by default from the GBSTATS_CACHE_DIR
+    environment variable), once per machine. Unreadable or unwritable cache
+    directories fall back to computing the table."""
+    key = (
+        float(alpha),
+        spending_function,
+        tuple(float(f) for f in information_fractions),
+    )
+    if key in _BOUNDARY_TABLES:
+        return _BOUNDARY_TABLES[key]
+
+    table = None
+    path = _cache_path(cache_dir, key) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                table = BoundaryTable(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            table = None
+    if table is None:
+        table = compute_boundary_table(*key)
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    json.dump(asdict(table), f)
+            except OSError:
+                pass
+    _BOUNDARY_TABLES[key] = table
+    return table
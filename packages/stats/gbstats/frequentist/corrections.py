@@ -0,0 +1,96 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from gbstats.kernels import t_ppf
+from gbstats.models.settings import PValueCorrection
+
+# adjusted p-values this close to 1 give an unbounded adjusted interval
+UNBOUNDED_P_VALUE = 0.999999
+
+
+# Holm step-down adjustment; p-values are sorted once and the running
+# maximum keeps the adjusted values monotone in the raw p-values
+def adjust_p_values_holm_bonferroni(p_values: np.ndarray) -> np.ndarray:
+    p_values = np.asarray(p_values, dtype=float)
+    m = p_values.size
+    order = np.argsort(p_values, kind="stable")
+    adjusted = np.minimum(p_values[order] * (m - np.arange(m)), 1)
+    result = np.empty(m)
+    result[order] = np.maximum.accumulate(adjusted)
+    return result
+
+
+# Benjamini-Hochberg step-up adjustment; p-values are sorted once from
+# largest to smallest and the running minimum keeps them monotone
+def adjust_p_values_benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    p_values = np.asarray(p_values, dtype=float)
+    m = p_values.size
+    order = np.argsort(-p_values, kind="stable")
+    adjusted = np.minimum(p_values[order] * m / (m - np.arange(m)), 1)
+    result = np.empty(m)
+    result[order] = np.minimum.accumulate(adjusted)
+    return result
+
+
+def adjust_p_values(
+    p_values: np.ndarray, correction: PValueCorrection
+) -> Optional[np.ndarray]:
+    if correction == "holm-bonferroni":
+        return adjust_p_values_holm_bonferroni(p_values)
+    if correction == "benjamini-hochberg":
+        return adjust_p_values_benjamini_hochberg(p_values)
+    return None
+
+
+def adjusted_cis(
+    expected: np.ndarray,
+    ci_lower: np.ndarray,
+    ci_upper: np.ndarray,
+    p_values: np.ndarray,
+    p_values_adjusted: np.ndarray,
+    dof: np.ndarray,
+    alpha: float = 0.05,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Confidence intervals consistent with adjusted p-values.
+
+    Each raw t interval is widened to the per-comparison level
+    alpha * p / p_adjusted, at which the raw p-value is significant exactly
+    when the adjusted one is significant at `alpha`. The critical values are
+    the test's own, t quantiles with its degrees of freedom, on the same
+    sides as the raw interval (infinite bounds stay infinite). Where the
+    adjusted p-value is (nearly) 1 the interval is unbounded and returned as
+    -inf and inf.
+
+    Args:
+        expected (np.ndarray): point estimates
+        ci_lower (np.ndarray): raw lower bounds
+        ci_upper (np.ndarray): raw upper bounds
+        p_values (np.ndarray): raw p-values
+        p_values_adjusted (np.ndarray): adjusted p-values
+        dof (np.ndarray): degrees of freedom of the raw intervals
+        alpha (float): level of the raw intervals
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: adjusted lower and upper bounds
+    """
+    expected = np.asarray(expected, dtype=float)
+    ci_lower = np.asarray(ci_lower, dtype=float)
+    ci_upper = np.asarray(ci_upper, dtype=float)
+    p_values = np.asarray(p_values, dtype=float)
+    p_values_adjusted = np.asarray(p_values_adjusted, dtype=float)
+    sides = np.where(np.isfinite(ci_lower) & np.isfinite(ci_upper), 2, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        level = np.where(
+            p_values_adjusted > 0, alpha * p_values / p_values_adjusted, alpha
+        )
+        scale = t_ppf(1 - level / sides, dof) / t_ppf(1 - alpha / sides, dof)
+        lower = np.where(
+            np.isfinite(ci_lower), expected - (expected - ci_lower) * scale, ci_lower
+        )
+        upper = np.where(
+            np.isfinite(ci_upper), expected + (ci_upper - expected) * scale, ci_upper
+        )
+    unbounded = p_values_adjusted > UNBOUNDED_P_VALUE
+    lower = np.where(unbounded, -np.inf, lower)
+    upper = np.where(unbounded, np.inf, upper)
+    return lower, upper
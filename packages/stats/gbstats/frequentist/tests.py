@@ -1,20 +1,36 @@
-from abc import abstractmethod
+import dataclasses
+from abc import ABC, abstractmethod
 from dataclasses import asdict
-from typing import Optional, List
+from functools import lru_cache
+from typing import Optional, List, Tuple
 
 import numpy as np
 from pydantic.dataclasses import dataclass
-from scipy.stats import t
 
 from gbstats.messages import (
     BASELINE_VARIATION_ZERO_MESSAGE,
     ZERO_NEGATIVE_VARIANCE_MESSAGE,
     ZERO_SCALED_VARIATION_MESSAGE,
     NO_UNITS_IN_VARIATION_MESSAGE,
+    SCALED_IMPACT_STATISTIC_MESSAGE,
 )
 from gbstats.models.statistics import TestStatistic, ScaledImpactStatistic
-from gbstats.models.tests import BaseABTest, BaseConfig, TestResult, Uplift
-from gbstats.utils import variance_of_ratios, isinstance_union
+from gbstats.models.tests import (
+    BaseABTest,
+    BaseConfig,
+    ComparisonMoments,
+    ScaledImpactInputs,
+    TestResult,
+    Uplift,
+)
+from gbstats.frequentist.boundaries import (
+    BoundaryTable,
+    SpendingFunction,
+    get_boundary_table,
+    stagewise_p_value,
+)
+from gbstats.kernels import t_cdf, t_ppf
+from gbstats.utils import relative_effect_variance, isinstance_union
 
 
 # Configs
@@ -29,6 +45,13 @@ class SequentialConfig(FrequentistConfig):
     sequential_tuning_parameter: float = 5000
 
 
+@dataclass
+class GroupSequentialConfig(FrequentistConfig):
+    spending_function: SpendingFunction = "obrien-fleming"
+    information_fractions: Tuple[float, ...] = (1.0,)
+    look_index: int = 0
+
+
 # Results
 @dataclass
 class FrequentistTestResult(TestResult):
@@ -47,7 +70,7 @@ def frequentist_diff(mean_a, mean_b, relative, mean_a_unadjusted=None) -> float:
 
 def frequentist_variance(var_a, mean_a, n_a, var_b, mean_b, n_b, relative) -> float:
     if relative:
-        return variance_of_ratios(mean_b, var_b / n_b, mean_a, var_a / n_a, 0)
+        return relative_effect_variance(mean_a, var_a, n_a, mean_b, var_b, n_b)
     else:
         return var_b / n_b + var_a / n_a
 
@@ -114,6 +137,12 @@ class TTest(BaseABTest):
             / (pow(self.stat_a.n, 2) * (self.stat_a.n - 1))
         )
 
+    # degrees of freedom of the interval's t critical value; None where the
+    # interval is not a t interval
+    @property
+    def interval_dof(self) -> Optional[float]:
+        return self.dof
+
     @property
     @abstractmethod
     def p_value(self) -> float:
@@ -193,43 +222,44 @@ class TTest(BaseABTest):
             else:
                 return self._default_output(NO_UNITS_IN_VARIATION_MESSAGE)
         else:
-            error_str = "For scaled impact the statistic must be of type ProportionStatistic, SampleMeanStatistic, or RegressionAdjustedStatistic."
-            return self._default_output(error_str)
+            return self._default_output(SCALED_IMPACT_STATISTIC_MESSAGE)
 
 
 class TwoSidedTTest(TTest):
     @property
     def p_value(self) -> float:
-        return 2 * (1 - t.cdf(abs(self.critical_value), self.dof))  # type: ignore
+        return 2 * (1 - t_cdf(abs(self.critical_value), self.dof))
 
     @property
     def confidence_interval(self) -> List[float]:
-        width: float = t.ppf(1 - self.alpha / 2, self.dof) * np.sqrt(self.variance)
+        width: float = t_ppf(1 - self.alpha / 2, self.dof) * np.sqrt(self.variance)
         return [self.point_estimate - width, self.point_estimate + width]
 
 
 class OneSidedTreatmentGreaterTTest(TTest):
     @property
     def p_value(self) -> float:
-        return 1 - t.cdf(self.critical_value, self.dof)  # type: ignore
+        return 1 - t_cdf(self.critical_value, self.dof)
 
     @property
     def confidence_interval(self) -> List[float]:
-        width: float = t.ppf(1 - self.alpha, self.dof) * np.sqrt(self.variance)
+        width: float = t_ppf(1 - self.alpha, self.dof) * np.sqrt(self.variance)
         return [self.point_estimate - width, np.inf]
 
 
 class OneSidedTreatmentLesserTTest(TTest):
     @property
     def p_value(self) -> float:
-        return t.cdf(self.critical_value, self.dof)  # type: ignore
+        return t_cdf(self.critical_value, self.dof)
 
     @property
     def confidence_interval(self) -> List[float]:
-        width: float = t.ppf(1 - self.alpha, self.dof) * np.sqrt(self.variance)
+        width: float = t_ppf(1 - self.alpha, self.dof) * np.sqrt(self.variance)
         return [-np.inf, self.point_estimate - width]
 
 
+# cached since every sequential test of an analysis shares its inputs
+@lru_cache(maxsize=None)
 def sequential_rho(alpha, sequential_tuning_parameter) -> float:
     # eq 161 in https://arxiv.org/pdf/2103.06476v7.pdf
     return np.sqrt(
@@ -275,6 +305,10 @@ class SequentialTwoSidedTTest(TTest):
         # eq 161 in https://arxiv.org/pdf/2103.06476v7.pdf
         return sequential_rho(self.alpha, self.sequential_tuning_parameter)
 
+    @property
+    def interval_dof(self) -> Optional[float]:
+        return None
+
     @property
     def p_value(self) -> float:
         # eq 155 in https://arxiv.org/pdf/2103.06476v7.pdf
@@ -284,3 +318,311 @@ class SequentialTwoSidedTTest(TTest):
         tr2p1 = N * np.power(self.rho, 2) + 1
         evalue = np.exp(np.power(self.rho, 2) * st2 / (2 * tr2p1)) / np.sqrt(tr2p1)
         return min(1 / evalue, 1)
+
+
+class GroupSequentialTwoSidedTTest(TTest):
+    def __init__(
+        self,
+        stat_a: TestStatistic,
+        stat_b: TestStatistic,
+        config: GroupSequentialConfig = GroupSequentialConfig(),
+    ):
+        """Two-sided test at one look of a group-sequential design, with
+        critical values from an alpha-spending boundary table.
+
+        The p-value follows the stage-wise ordering and is only defined once
+        the design stops, at a look whose boundary is crossed or at the last
+        look; at an interim look that continues it is 1. The interval is the
+        repeated confidence interval at the look's critical value.
+
+        This test is not selected by `get_configured_test`: it needs the
+        planned information fractions and the index of the current look,
+        which the analysis settings do not carry. Callers that track a
+        design construct it directly.
+
+        Args:
+            stat_a (Statistic): the "control" or "baseline" statistic
+            stat_b (Statistic): the "treatment" or "variation" statistic
+            config (GroupSequentialConfig): design and the current look
+        """
+        config_dict = asdict(config)
+        self.spending_function = config_dict.pop("spending_function")
+        self.information_fractions = config_dict.pop("information_fractions")
+        self.look_index = config_dict.pop("look_index")
+        super().__init__(stat_a, stat_b, FrequentistConfig(**config_dict))
+
+    @property
+    def interval_dof(self) -> Optional[float]:
+        return None
+
+    @property
+    def boundary_table(self) -> BoundaryTable:
+        return get_boundary_table(
+            self.alpha, self.spending_function, self.information_fractions
+        )
+
+    @property
+    def boundary(self) -> float:
+        return self.boundary_table.critical_values[self.look_index]
+
+    @property
+    def confidence_interval(self) -> List[float]:
+        width: float = self.boundary * np.sqrt(self.variance)
+        return [self.point_estimate - width, self.point_estimate + width]
+
+    @property
+    def p_value(self) -> float:
+        stopped = abs(self.critical_value) >= self.boundary or self.look_index == (
+            len(self.information_fractions) - 1
+        )
+        if not stopped:
+            return 1
+        return stagewise_p_value(
+            self.boundary_table, self.look_index, self.critical_value
+        )
+
+
+# Batched results; plain dataclass since pydantic does not validate arrays
+@dataclasses.dataclass
+class BatchedFrequentistTestResult:
+    expected: np.ndarray
+    ci_lower: np.ndarray
+    ci_upper: np.ndarray
+    stddev: np.ndarray
+    p_value: np.ndarray
+    dof: np.ndarray
+    error_message: List[Optional[str]]
+
+    def to_results(self) -> List[FrequentistTestResult]:
+        return [
+            FrequentistTestResult(
+                expected=float(self.expected[i]),
+                ci=[float(self.ci_lower[i]), float(self.ci_upper[i])],
+                p_value=float(self.p_value[i]),
+                uplift=Uplift(
+                    dist="normal",
+                    mean=float(self.expected[i]),
+                    stddev=float(self.stddev[i]),
+                ),
+                error_message=self.error_message[i],
+            )
+            for i in range(len(self.expected))
+        ]
+
+
+class BatchedTTest(ABC):
+    def __init__(
+        self,
+        moments: ComparisonMoments,
+        config: FrequentistConfig = FrequentistConfig(),
+        scaled_impact: Optional[ScaledImpactInputs] = None,
+    ):
+        """Array version of `TTest` that analyzes many baseline/variation
+        pairs at once, e.g. every variation of every dimension of a metric.
+        Results match the scalar tests; cells that the scalar tests would
+        reject are masked and returned with the same default output and
+        error message.
+
+        Args:
+            moments (ComparisonMoments): moments of every comparison
+            config (FrequentistConfig): shared config for all comparisons
+            scaled_impact (ScaledImpactInputs): scaling inputs of every
+                comparison; required for scaled impact
+        """
+        if config.difference_type == "scaled" and scaled_impact is None:
+            raise ValueError("Scaled impact requires scaled impact inputs.")
+        self.moments = moments
+        self.alpha = config.alpha
+        self.test_value = config.test_value
+        self.relative = config.difference_type == "relative"
+        self.scaled = config.difference_type == "scaled"
+        self.scaled_impact = scaled_impact
+
+    @property
+    def variance(self) -> np.ndarray:
+        m = self.moments
+        if self.relative:
+            return np.asarray(
+                relative_effect_variance(
+                    m.unadjusted_mean_a,
+                    m.variance_a,
+                    m.n_a,
+                    m.unadjusted_mean_b,
+                    m.variance_b,
+                    m.n_b,
+                )
+            )
+        return m.variance_b / m.n_b + m.variance_a / m.n_a
+
+    @property
+    def point_estimate(self) -> np.ndarray:
+        m = self.moments
+        if self.relative:
+            denominator = np.where(
+                m.unadjusted_mean_a != 0, m.unadjusted_mean_a, m.mean_a
+            )
+            return (m.mean_b - m.mean_a) / denominator
+        return m.mean_b - m.mean_a
+
+    @property
+    def critical_value(self) -> np.ndarray:
+        return (self.point_estimate - self.test_value) / np.sqrt(self.variance)
+
+    @property
+    def dof(self) -> np.ndarray:
+        # welch-satterthwaite approx
+        m = self.moments
+        return np.power(m.variance_b / m.n_b + m.variance_a / m.n_a, 2) / (
+            np.power(m.variance_b, 2) / (np.power(m.n_b, 2) * (m.n_b - 1))
+            + np.power(m.variance_a, 2) / (np.power(m.n_a, 2) * (m.n_a - 1))
+        )
+
+    @property
+    @abstractmethod
+    def p_value(self) -> np.ndarray:
+        pass
+
+    @property
+    @abstractmethod
+    def confidence_interval(self) -> List[np.ndarray]:
+        pass
+
+    @property
+    def error_message(self) -> List[Optional[str]]:
+        m = self.moments
+        # same precedence as `TTest.compute_result`
+        messages = np.full(m.size, None, dtype=object)
+        messages[m.zero_variance_a | m.zero_variance_b] = ZERO_NEGATIVE_VARIANCE_MESSAGE
+        messages[
+            (m.mean_a == 0) | (m.unadjusted_mean_a == 0)
+        ] = BASELINE_VARIATION_ZERO_MESSAGE
+        if self.scaled and self.scaled_impact is not None:
+            return self.scaled_impact.error_message(
+                messages.tolist(), SCALED_IMPACT_STATISTIC_MESSAGE
+            )
+        return messages.tolist()
+
+    def compute_result(self) -> BatchedFrequentistTestResult:
+        error_message = self.error_message
+        valid = np.array([e is None for e in error_message], dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = self.point_estimate
+            ci_lower, ci_upper = self.confidence_interval
+            p_value = self.p_value
+            stddev = np.sqrt(self.variance)
+            dof = self.dof
+            if self.scaled and self.scaled_impact is not None:
+                # scaled impact is the absolute effect in daily traffic units
+                adjustment = self.scaled_impact.adjustment
+                expected = expected * adjustment
+                ci_lower = ci_lower * adjustment
+                ci_upper = ci_upper * adjustment
+                stddev = stddev * adjustment
+        return BatchedFrequentistTestResult(
+            expected=np.where(valid, expected, 0),
+            ci_lower=np.where(valid, ci_lower, 0),
+            ci_upper=np.where(valid, ci_upper, 0),
+            stddev=np.where(valid, stddev, 0),
+            p_value=np.where(valid, p_value, 1),
+            dof=dof,
+            error_message=error_message,
+        )
+
+
+class BatchedTwoSidedTTest(BatchedTTest):
+    @property
+    def p_value(self) -> np.ndarray:
+        return 2 * (1 - t_cdf(np.abs(self.critical_value), self.dof))
+
+    @property
+    def confidence_interval(self) -> List[np.ndarray]:
+        width = t_ppf(1 - self.alpha / 2, self.dof) * np.sqrt(self.variance)
+        return [self.point_estimate - width, self.point_estimate + width]
+
+
+class BatchedOneSidedTreatmentGreaterTTest(BatchedTTest):
+    @property
+    def p_value(self) -> np.ndarray:
+        return 1 - t_cdf(self.critical_value, self.dof)
+
+    @property
+    def confidence_interval(self) -> List[np.ndarray]:
+        width = t_ppf(1 - self.alpha, self.dof) * np.sqrt(self.variance)
+        return [self.point_estimate - width, np.full(self.moments.size, np.inf)]
+
+
+class BatchedOneSidedTreatmentLesserTTest(BatchedTTest):
+    @property
+    def p_value(self) -> np.ndarray:
+        return t_cdf(self.critical_value, self.dof)
+
+    @property
+    def confidence_interval(self) -> List[np.ndarray]:
+        width = t_ppf(1 - self.alpha, self.dof) * np.sqrt(self.variance)
+        return [np.full(self.moments.size, -np.inf), self.point_estimate - width]
+
+
+class BatchedSequentialTwoSidedTTest(BatchedTTest):
+    def __init__(
+        self,
+        moments: ComparisonMoments,
+        config: SequentialConfig = SequentialConfig(),
+        scaled_impact: Optional[ScaledImpactInputs] = None,
+    ):
+        config_dict = asdict(config)
+        self.sequential_tuning_parameter = config_dict.pop(
+            "sequential_tuning_parameter"
+        )
+        super().__init__(moments, FrequentistConfig(**config_dict), scaled_impact)
+
+    @property
+    def rho(self) -> float:
+        return sequential_rho(self.alpha, self.sequential_tuning_parameter)
+
+    @property
+    def confidence_interval(self) -> List[np.ndarray]:
+        N = self.moments.n_a + self.moments.n_b
+        s2 = self.variance * N
+        halfwidth = sequential_interval_halfwidth(s2, N, self.rho, self.alpha)
+        return [self.point_estimate - halfwidth, self.point_estimate + halfwidth]
+
+    @property
+    def p_value(self) -> np.ndarray:
+        N = self.moments.n_a + self.moments.n_b
+        st2 = np.power(self.point_estimate - self.test_value, 2) * N / self.variance
+        tr2p1 = N * np.power(self.rho, 2) + 1
+        evalue = np.exp(np.power(self.rho, 2) * st2 / (2 * tr2p1)) / np.sqrt(tr2p1)
+        return np.minimum(1 / evalue, 1)
+
+
+def always_valid_trajectory(
+    p_value: np.ndarray,
+    ci_lower: np.ndarray,
+    ci_upper: np.ndarray,
+    valid: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Turn per-look sequential results into always-valid trajectories.
+
+    Rows are looks (e.g. dates) in time order and columns are comparisons.
+    Since each look's p-value and interval are valid at any stopping time,
+    so are the running minimum p-value and the running intersection of the
+    intervals. Invalid cells neither contribute nor change their output.
+
+    The intersection can become empty (with probability at most alpha under
+    the model). From then on the last non-empty intersection is returned
+    and the look is flagged.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] - p-values,
+            interval bounds and whether the intersection was empty
+    """
+    p_value = np.minimum.accumulate(np.where(valid, p_value, 1), axis=0)
+    ci_lower = np.maximum.accumulate(np.where(valid, ci_lower, -np.inf), axis=0)
+    ci_upper = np.minimum.accumulate(np.where(valid, ci_upper, np.inf), axis=0)
+    empty = ci_lower > ci_upper
+    # intersections only shrink, so the non-empty ones come first
+    last = np.maximum(np.sum(~empty, axis=0) - 1, 0)
+    columns = np.arange(ci_lower.shape[1])
+    ci_lower = np.where(empty, ci_lower[last, columns], ci_lower)
+    ci_upper = np.where(empty, ci_upper[last, columns], ci_upper)
+    return p_value, ci_lower, ci_upper, empty
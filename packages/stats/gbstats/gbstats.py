@@ -1,31 +1,54 @@
+import dataclasses
 from dataclasses import asdict
 import re
 import traceback
 import copy
-from typing import Any, Dict, Hashable, List, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 
+import numpy as np
 import pandas as pd
 
 from gbstats.bayesian.tests import (
+    BatchedEffectBayesianABTest,
     BayesianTestResult,
     EffectBayesianABTest,
     EffectBayesianConfig,
     GaussianPrior,
 )
 
+from gbstats.bayesian.best_arm import probability_best
 from gbstats.bayesian.bandits import (
+    Bandits,
+    BanditResponse,
     BanditsSimple,
     BanditsRatio,
     BanditsCuped,
     BanditConfig,
+    compute_bandit_results,
     get_error_bandit_result,
 )
+from gbstats.frequentist.corrections import adjust_p_values, adjusted_cis
 from gbstats.frequentist.tests import (
+    BatchedSequentialTwoSidedTTest,
+    BatchedTwoSidedTTest,
     FrequentistConfig,
     FrequentistTestResult,
     SequentialConfig,
     SequentialTwoSidedTTest,
+    TTest,
     TwoSidedTTest,
+    always_valid_trajectory,
 )
 from gbstats.models.results import (
     BaselineResponse,
@@ -50,16 +73,20 @@ from gbstats.models.settings import (
     QueryResultsForStatsEngine,
     VarIdMap,
 )
+from gbstats.models.tests import ComparisonMoments, ScaledImpactInputs
 from gbstats.models.statistics import (
     ProportionStatistic,
     QuantileStatistic,
     QuantileClusteredStatistic,
+    QuantileSketchStatistic,
     RatioStatistic,
     RegressionAdjustedStatistic,
     SampleMeanStatistic,
     TestStatistic,
     BanditStatistic,
 )
+from gbstats.shrinkage import shrink_effects
+from gbstats.sketch import merge_serialized_sketches
 from gbstats.utils import check_srm
 
 
@@ -82,6 +109,7 @@ ROW_COLS = SUM_COLS + [
     "quantile",
     "quantile_lower",
     "quantile_upper",
+    "quantile_sketch",
     "theta",
 ]
 
@@ -184,19 +212,53 @@ def reduce_dimensionality(
                 prefix = f"v{v}" if v > 0 else "baseline"
                 for col in SUM_COLS:
                     current[f"{prefix}_{col}"] += row[f"{prefix}_{col}"]
+                # quantile sketches are mergeable, so quantiles survive the merge
+                sketches = [
+                    quantile_sketch_from_metric_row(r, prefix) for r in [current, row]
+                ]
+                if any(sketches) and not all(sketches):
+                    raise ValueError(
+                        "Cannot merge quantiles of dimensions without sketches."
+                    )
+                if any(sketches):
+                    current[f"{prefix}_quantile_n"] += row[f"{prefix}_quantile_n"]
+                    current[f"{prefix}_quantile_sketch"] = merge_serialized_sketches(
+                        [s for s in sketches if s]
+                    )
 
     return pd.DataFrame(newrows)
 
 
+# every row has a sketch, so that quantiles can be recomputed after merging
+def has_quantile_sketches(rows: pd.DataFrame) -> bool:
+    if "quantile_sketch" not in rows.columns:
+        return False
+    return bool(
+        rows["quantile_sketch"].map(lambda s: isinstance(s, str) and bool(s)).all()
+    )
+
+
+def quantile_sketch_from_metric_row(
+    row: Union[pd.Series, Dict[Hashable, Any]], prefix: str
+) -> Optional[str]:
+    sketch = row.get(f"{prefix}_quantile_sketch")
+    return sketch if isinstance(sketch, str) and sketch else None
+
+
 def get_configured_test(
     row: pd.Series,
     test_index: int,
     analysis: AnalysisSettingsForStatsEngine,
     metric: MetricSettingsForStatsEngine,
+    baseline_test_index: int = 0,
 ) -> Union[EffectBayesianABTest, SequentialTwoSidedTTest, TwoSidedTTest]:
 
-    stat_a = variation_statistic_from_metric_row(row, "baseline", metric)
-    stat_b = variation_statistic_from_metric_row(row, f"v{test_index}", metric)
+    stat_a = variation_statistic_from_metric_row(
+        row, variation_prefix(baseline_test_index), metric
+    )
+    stat_b = variation_statistic_from_metric_row(
+        row, variation_prefix(test_index), metric
+    )
 
     base_config = {
         "total_users": row["total_users"],
@@ -244,19 +306,111 @@ def get_configured_test(
         )
 
 
-# Run A/B test analysis for each variation and dimension
-def analyze_metric_df(
-    df: pd.DataFrame,
-    metric: MetricSettingsForStatsEngine,
+# Analyze many configured tests at once where a batched engine is available
+def compute_test_results(
+    tests: List[Union[EffectBayesianABTest, SequentialTwoSidedTTest, TwoSidedTTest]],
     analysis: AnalysisSettingsForStatsEngine,
-) -> pd.DataFrame:
-    num_variations = df.at[0, "variations"]
+) -> List[Union[BayesianTestResult, FrequentistTestResult]]:
+    if not tests:
+        return []
+    moments = ComparisonMoments.from_tests(tests)
+    scaled_impact = (
+        ScaledImpactInputs.from_tests(tests)
+        if analysis.difference_type == "scaled"
+        else None
+    )
+    if analysis.stats_engine == "frequentist":
+        if analysis.sequential_testing_enabled:
+            batched_test = BatchedSequentialTwoSidedTTest(
+                moments,
+                SequentialConfig(
+                    difference_type=analysis.difference_type,
+                    alpha=analysis.alpha,
+                    sequential_tuning_parameter=analysis.sequential_tuning_parameter,
+                ),
+                scaled_impact,
+            )
+        else:
+            batched_test = BatchedTwoSidedTTest(
+                moments,
+                FrequentistConfig(
+                    difference_type=analysis.difference_type, alpha=analysis.alpha
+                ),
+                scaled_impact,
+            )
+        return list(batched_test.compute_result().to_results())
+    bayesian_tests = [t for t in tests if isinstance(t, EffectBayesianABTest)]
+    if len(bayesian_tests) == len(tests):
+        # tests of one analysis share the metric's prior and settings
+        bayesian_test = BatchedEffectBayesianABTest(
+            moments, bayesian_tests[0].config, scaled_impact
+        )
+        return list(bayesian_test.compute_result().to_results())
+    return [test.compute_result() for test in tests]
+
+
+# Columns of an analyzed row for one test, without the variation prefix;
+# baseline_* fields describe the test's baseline statistic
+def unpack_test_result(
+    test: Union[EffectBayesianABTest, SequentialTwoSidedTTest, TwoSidedTTest],
+    res: Union[BayesianTestResult, FrequentistTestResult],
+) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {
+        "baseline_cr": test.stat_a.unadjusted_mean,
+        "baseline_mean": test.stat_a.unadjusted_mean,
+        "baseline_stddev": test.stat_a.stddev,
+        "cr": test.stat_b.unadjusted_mean,
+        "mean": test.stat_b.unadjusted_mean,
+        "stddev": test.stat_b.stddev,
+    }
+    if isinstance(res, BayesianTestResult):
+        fields["risk"] = res.risk
+        fields["risk_type"] = res.risk_type
+        fields["prob_beat_baseline"] = res.chance_to_win
+        if isinstance(test, EffectBayesianABTest) and res.error_message is None:
+            fields["baseline_correlation"] = test.baseline_correlation
+    elif isinstance(res, FrequentistTestResult):
+        fields["p_value"] = res.p_value
+        if isinstance(test, TTest) and res.error_message is None:
+            fields["dof"] = test.interval_dof
+    if test.stat_a.unadjusted_mean <= 0:
+        # negative or missing control mean
+        fields["expected"] = 0
+    elif res.expected == 0:
+        # if result is not valid, try to return at least the diff
+        fields["expected"] = (
+            test.stat_b.mean - test.stat_a.mean
+        ) / test.stat_a.unadjusted_mean
+    else:
+        # return adjusted/prior-affected guess of expectation
+        fields["expected"] = res.expected
+    fields["ci"] = res.ci
+    fields["uplift"] = asdict(res.uplift)
+    fields["error_message"] = res.error_message
+    return fields
+
+
+def variation_prefix(index: int) -> str:
+    return f"v{index}" if index > 0 else "baseline"
+
 
-    # Add new columns to the dataframe with placeholder values
+# Every ordered (baseline, variation) pair of distinct variations
+def all_variation_pairs(num_variations: int) -> List[Tuple[int, int]]:
+    return [
+        (a, b) for a in range(num_variations) for b in range(num_variations) if a != b
+    ]
+
+
+# Add new columns to the dataframe with placeholder values
+def add_result_columns(
+    df: pd.DataFrame, num_variations: int, analysis: AnalysisSettingsForStatsEngine
+) -> None:
     df["srm_p"] = 0
     df["engine"] = analysis.stats_engine
 
     for i in range(num_variations):
+        df[f"{variation_prefix(i)}_prob_best"] = None
+        df[f"{variation_prefix(i)}_expected_loss"] = None
         if i == 0:
             df["baseline_cr"] = 0
             df["baseline_mean"] = None
@@ -267,51 +421,54 @@ def analyze_metric_df(
             df[f"v{i}_stddev"] = None
             df[f"v{i}_expected"] = 0
             df[f"v{i}_p_value"] = None
+            df[f"v{i}_dof"] = None
             df[f"v{i}_risk"] = None
             df[f"v{i}_prob_beat_baseline"] = None
+            df[f"v{i}_baseline_correlation"] = None
             df[f"v{i}_uplift"] = None
             df[f"v{i}_error_message"] = None
+            df[f"v{i}_expected_shrunk"] = None
+            df[f"v{i}_ci_shrunk"] = None
+
+
+# Run A/B test analysis for each variation and dimension
+def analyze_metric_df(
+    df: pd.DataFrame,
+    metric: MetricSettingsForStatsEngine,
+    analysis: AnalysisSettingsForStatsEngine,
+) -> pd.DataFrame:
+    num_variations = df.at[0, "variations"]
+    add_result_columns(df, num_variations, analysis)
+
+    # Configure baseline vs variation tests for every dimension, then
+    # analyze all of them together
+    tests = {
+        index: [
+            get_configured_test(row=s, test_index=i, analysis=analysis, metric=metric)
+            for i in range(1, num_variations)
+        ]
+        for index, s in df.iterrows()
+    }
+    flat_results = iter(
+        compute_test_results(
+            [test for row_tests in tests.values() for test in row_tests], analysis
+        )
+    )
+    results = {
+        index: [next(flat_results) for _ in row_tests]
+        for index, row_tests in tests.items()
+    }
 
     def analyze_row(s: pd.Series) -> pd.Series:
         s = s.copy()
 
-        # Loop through each non-baseline variation and run an analysis
+        # Loop through each non-baseline variation and unpack its analysis
         for i in range(1, num_variations):
-
-            # Run analysis of baseline vs variation
-            test = get_configured_test(
-                row=s, test_index=i, analysis=analysis, metric=metric
-            )
-            res = test.compute_result()
-            s["baseline_cr"] = test.stat_a.unadjusted_mean
-            s["baseline_mean"] = test.stat_a.unadjusted_mean
-            s["baseline_stddev"] = test.stat_a.stddev
-
-            s[f"v{i}_cr"] = test.stat_b.unadjusted_mean
-            s[f"v{i}_mean"] = test.stat_b.unadjusted_mean
-            s[f"v{i}_stddev"] = test.stat_b.stddev
-
-            # Unpack result in Pandas row
-            if isinstance(res, BayesianTestResult):
-                s.at[f"v{i}_risk"] = res.risk
-                s[f"v{i}_risk_type"] = res.risk_type
-                s[f"v{i}_prob_beat_baseline"] = res.chance_to_win
-            elif isinstance(res, FrequentistTestResult):
-                s[f"v{i}_p_value"] = res.p_value
-            if test.stat_a.unadjusted_mean <= 0:
-                # negative or missing control mean
-                s[f"v{i}_expected"] = 0
-            elif res.expected == 0:
-                # if result is not valid, try to return at least the diff
-                s[f"v{i}_expected"] = (
-                    test.stat_b.mean - test.stat_a.mean
-                ) / test.stat_a.unadjusted_mean
-            else:
-                # return adjusted/prior-affected guess of expectation
-                s[f"v{i}_expected"] = res.expected
-            s.at[f"v{i}_ci"] = res.ci
-            s.at[f"v{i}_uplift"] = asdict(res.uplift)
-            s[f"v{i}_error_message"] = res.error_message
+            fields = unpack_test_result(tests[s.name][i - 1], results[s.name][i - 1])
+            for key in ["cr", "mean", "stddev"]:
+                s.at[f"baseline_{key}"] = fields.pop(f"baseline_{key}")
+            for key, value in fields.items():
+                s.at[f"v{i}_{key}"] = value
 
         # replace count with quantile_n for quantile metrics
         if metric.statistic_type in ["quantile_event", "quantile_unit"]:
@@ -326,7 +483,173 @@ def analyze_metric_df(
         )
         return s
 
-    return df.apply(analyze_row, axis=1)
+    df = cast(pd.DataFrame, df.apply(analyze_row, axis=1))
+    if analysis.stats_engine == "bayesian":
+        add_probability_best(df, metric)
+    return df
+
+
+# Run A/B test analysis for every ordered pair of variations in each
+# dimension, so that results for any baseline can be sliced out afterwards
+# with `slice_pairwise_results` instead of rerunning the analysis
+def analyze_metric_df_all_pairs(
+    df: pd.DataFrame,
+    metric: MetricSettingsForStatsEngine,
+    analysis: AnalysisSettingsForStatsEngine,
+) -> pd.DataFrame:
+    num_variations = df.at[0, "variations"]
+    pairs = all_variation_pairs(num_variations)
+
+    tests = {
+        index: [
+            get_configured_test(
+                row=s,
+                test_index=b,
+                analysis=analysis,
+                metric=metric,
+                baseline_test_index=a,
+            )
+            for a, b in pairs
+        ]
+        for index, s in df.iterrows()
+    }
+    flat_results = iter(
+        compute_test_results(
+            [test for row_tests in tests.values() for test in row_tests], analysis
+        )
+    )
+
+    df = df.copy()
+    df["pairwise"] = [
+        {
+            pair: unpack_test_result(test, next(flat_results))
+            for pair, test in zip(pairs, tests[index])
+        }
+        for index in df.index
+    ]
+    return df
+
+
+# Results of `analyze_metric_df_all_pairs` as `analyze_metric_df` would
+# have returned them with `baseline_index` as the baseline; `analysis` is
+# the one used for all pairs, in the original variation order
+def slice_pairwise_results(
+    df: pd.DataFrame,
+    baseline_index: int,
+    metric: MetricSettingsForStatsEngine,
+    analysis: AnalysisSettingsForStatsEngine,
+) -> pd.DataFrame:
+    num_variations = df.at[0, "variations"]
+    order = [baseline_index] + [i for i in range(num_variations) if i != baseline_index]
+    new_prefix = {variation_prefix(k): variation_prefix(j) for j, k in enumerate(order)}
+
+    # move the per-variation input columns to their new positions
+    sliced = df.drop(columns="pairwise").rename(
+        columns=lambda c: (
+            f"{new_prefix[c.partition('_')[0]]}_{c.partition('_')[2]}"
+            if c.partition("_")[0] in new_prefix
+            else c
+        )
+    )
+    add_result_columns(sliced, num_variations, analysis)
+
+    def slice_row(s: pd.Series) -> pd.Series:
+        s = s.copy()
+        pairwise = df.at[s.name, "pairwise"]
+        for j in range(1, num_variations):
+            fields = dict(pairwise[(baseline_index, order[j])])
+            for key in ["cr", "mean", "stddev"]:
+                s.at[f"baseline_{key}"] = fields.pop(f"baseline_{key}")
+            for key, value in fields.items():
+                s.at[f"v{j}_{key}"] = value
+
+        # replace count with quantile_n for quantile metrics
+        if metric.statistic_type in ["quantile_event", "quantile_unit"]:
+            for i in range(num_variations):
+                prefix = variation_prefix(i)
+                s[f"{prefix}_count"] = s[f"{prefix}_quantile_n"]
+
+        s["srm_p"] = check_srm(
+            [int(s[f"{variation_prefix(i)}_users"]) for i in range(num_variations)],
+            [analysis.weights[k] for k in order],
+        )
+        return s
+
+    # a row-wise apply returning Series gives a DataFrame
+    sliced = cast(pd.DataFrame, sliced.apply(slice_row, axis=1))
+    if analysis.stats_engine == "bayesian":
+        add_probability_best(sliced, metric)
+    if analysis.dimension_shrinkage:
+        add_dimension_shrinkage(sliced, analysis)
+    return sliced
+
+
+# Floats with NaN as None, kept as objects so pandas does not turn None
+# back into NaN, which cannot be serialized for the back end
+def optional_float_column(values: np.ndarray, index: pd.Index) -> pd.Series:
+    return pd.Series(
+        [None if np.isnan(v) else float(v) for v in values], index=index, dtype=object
+    )
+
+
+# Effect estimates and standard errors of the non-baseline variations, with
+# shape (dimensions, variations - 1), and whether their analysis succeeded
+def variation_effects(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    num_variations = df.at[0, "variations"]
+    columns = [f"v{i}" for i in range(1, num_variations)]
+    uplift = [[u or {} for u in df[f"{c}_uplift"]] for c in columns]
+    mean = np.array([[u.get("mean", 0) for u in us] for us in uplift]).T
+    stddev = np.array([[u.get("stddev", 0) for u in us] for us in uplift]).T
+    valid = df[[f"{c}_error_message" for c in columns]].isna().to_numpy()
+    return mean, stddev, valid
+
+
+# Probability of being best and expected loss versus the best arm for every
+# variation, computed for all dimensions at once from the posteriors of the
+# effects versus baseline and their correlation through the shared baseline
+def add_probability_best(
+    df: pd.DataFrame, metric: MetricSettingsForStatsEngine
+) -> None:
+    num_variations = df.at[0, "variations"]
+    if num_variations < 2:
+        return
+    mean, stddev, valid = variation_effects(df)
+    correlation = np.nan_to_num(
+        df[[f"v{i}_baseline_correlation" for i in range(1, num_variations)]]
+        .astype(float)
+        .to_numpy()
+    )
+    prob, loss = probability_best(
+        mean, stddev, metric.inverse, valid, correlation=correlation
+    )
+    for i in range(num_variations):
+        prefix = variation_prefix(i)
+        df[f"{prefix}_prob_best"] = optional_float_column(prob[:, i], df.index)
+        df[f"{prefix}_expected_loss"] = optional_float_column(loss[:, i], df.index)
+
+
+# Empirical-Bayes shrinkage of every variation's effect and interval across
+# dimension slices, all variations at once
+def add_dimension_shrinkage(
+    df: pd.DataFrame, analysis: AnalysisSettingsForStatsEngine
+) -> None:
+    num_variations = df.at[0, "variations"]
+    if num_variations < 2 or len(df.index) < 2:
+        return
+    effects, stddev, valid = variation_effects(df)
+    shrunk, lower, upper = shrink_effects(
+        effects, stddev**2, analysis.dimension_shrinkage, valid, analysis.alpha
+    )
+    for i in range(1, num_variations):
+        df[f"v{i}_expected_shrunk"] = optional_float_column(shrunk[:, i - 1], df.index)
+        df[f"v{i}_ci_shrunk"] = pd.Series(
+            [
+                None if np.isnan(e) else [lo, hi]
+                for e, lo, hi in zip(shrunk[:, i - 1], lower[:, i - 1], upper[:, i - 1])
+            ],
+            index=df.index,
+            dtype=object,
+        )
 
 
 # Convert final experiment results to a structure that can be easily
@@ -347,10 +670,56 @@ def format_results(
         ]
         variation_data.insert(baseline_index, baseline_data)
         dim.variations = variation_data
+        if row["engine"] == "bayesian" and num_variations > 1:
+            for key, column in [
+                ("probabilityBest", "prob_best"),
+                ("expectedLoss", "expected_loss"),
+            ]:
+                values = [row[f"v{v}_{column}"] for v in range(1, num_variations)]
+                values.insert(baseline_index, row[f"baseline_{column}"])
+                setattr(dim, key, values)
         results.append(dim)
     return results
 
 
+# Results of `analyze_metric_df_all_pairs` with each variation as the
+# baseline. Entry b holds the dimensions with variation b as the baseline,
+# and variations are in the experiment's order, as `format_results` returns
+# them for `analysis.baseline_index`
+def format_all_baselines(
+    df: pd.DataFrame,
+    metric: MetricSettingsForStatsEngine,
+    analysis: AnalysisSettingsForStatsEngine,
+) -> List[List[DimensionResponse]]:
+    num_variations = df.at[0, "variations"]
+    # the rows put the analysis baseline first; map back to experiment order
+    experiment_index = [analysis.baseline_index] + [
+        i for i in range(num_variations) if i != analysis.baseline_index
+    ]
+    by_baseline: List[List[DimensionResponse]] = [[] for _ in range(num_variations)]
+    for b in range(num_variations):
+        sliced = slice_pairwise_results(df, b, metric, analysis)
+        order = [experiment_index[k] for k in range(num_variations) if k != b]
+        order.insert(0, experiment_index[b])
+        dimensions = format_results(sliced)
+        for dim in dimensions:
+            dim.variations = reorder(dim.variations, order)
+            if dim.probabilityBest is not None:
+                dim.probabilityBest = reorder(dim.probabilityBest, order)
+            if dim.expectedLoss is not None:
+                dim.expectedLoss = reorder(dim.expectedLoss, order)
+        by_baseline[experiment_index[b]] = dimensions
+    return by_baseline
+
+
+# values[j] moved to position order[j]
+def reorder(values: List[Any], order: List[int]) -> List[Any]:
+    reordered: List[Any] = [None] * len(values)
+    for value, position in zip(values, order):
+        reordered[position] = value
+    return reordered
+
+
 def format_variation_result(
     row: Dict[Hashable, Any], v: int
 ) -> Union[BaselineResponse, BayesianVariationResponse, FrequentistVariationResponse]:
@@ -381,12 +750,18 @@ def format_variation_result(
             "uplift": row[f"{prefix}_uplift"],
             "ci": row[f"{prefix}_ci"],
             "errorMessage": row[f"{prefix}_error_message"],
+            "expectedShrunk": row.get(f"{prefix}_expected_shrunk"),
+            "ciShrunk": row.get(f"{prefix}_ci_shrunk"),
         }
         if frequentist:
+            dof = row.get(f"{prefix}_dof")
             return FrequentistVariationResponse(
                 **metricResult,
                 **testResult,
                 pValue=row[f"{prefix}_p_value"],
+                # missing values come back as NaN from the row-wise apply
+                dof=float(dof) if dof is not None and not np.isnan(dof) else None,
+                ciIntersectionEmpty=row.get(f"{prefix}_ci_intersection_empty"),
             )
         else:
             return BayesianVariationResponse(
@@ -405,12 +780,7 @@ def variation_statistic_from_metric_row(
         if metric.quantile_value is None:
             raise ValueError("quantile_value must be set for quantile_event metric")
         return QuantileClusteredStatistic(
-            n=row[f"{prefix}_quantile_n"],
-            n_star=row[f"{prefix}_quantile_nstar"],
-            nu=metric.quantile_value,
-            quantile_hat=row[f"{prefix}_quantile"],
-            quantile_lower=row[f"{prefix}_quantile_lower"],
-            quantile_upper=row[f"{prefix}_quantile_upper"],
+            **quantile_fields_from_metric_row(row, prefix, metric.quantile_value),
             main_sum=row[f"{prefix}_main_sum"],
             main_sum_squares=row[f"{prefix}_main_sum_squares"],
             denominator_sum=row[f"{prefix}_denominator_sum"],
@@ -422,12 +792,7 @@ def variation_statistic_from_metric_row(
         if metric.quantile_value is None:
             raise ValueError("quantile_value must be set for quantile_unit metric")
         return QuantileStatistic(
-            n=row[f"{prefix}_quantile_n"],
-            n_star=row[f"{prefix}_quantile_nstar"],
-            nu=metric.quantile_value,
-            quantile_hat=row[f"{prefix}_quantile"],
-            quantile_lower=row[f"{prefix}_quantile_lower"],
-            quantile_upper=row[f"{prefix}_quantile_upper"],
+            **quantile_fields_from_metric_row(row, prefix, metric.quantile_value)
         )
     elif metric.statistic_type == "ratio":
         return RatioStatistic(
@@ -468,6 +833,27 @@ def variation_statistic_from_metric_row(
         raise ValueError(f"Unexpected statistic_type: {metric.statistic_type}")
 
 
+def quantile_fields_from_metric_row(
+    row: pd.Series, prefix: str, nu: float
+) -> Dict[str, Any]:
+    # prefer the mergeable sketch when the query returned one
+    sketch = quantile_sketch_from_metric_row(row, prefix)
+    if sketch:
+        return asdict(
+            QuantileSketchStatistic(
+                n=row[f"{prefix}_quantile_n"], nu=nu, sketch=sketch
+            ).quantile_statistic
+        )
+    return {
+        "n": row[f"{prefix}_quantile_n"],
+        "n_star": row[f"{prefix}_quantile_nstar"],
+        "nu": nu,
+        "quantile_hat": row[f"{prefix}_quantile"],
+        "quantile_lower": row[f"{prefix}_quantile_lower"],
+        "quantile_upper": row[f"{prefix}_quantile_upper"],
+    }
+
+
 def base_statistic_from_metric_row(
     row: pd.Series, prefix: str, component: str, metric_type: Optional[MetricType]
 ) -> Union[ProportionStatistic, SampleMeanStatistic]:
@@ -494,6 +880,7 @@ def process_analysis(
     var_id_map: VarIdMap,
     metric: MetricSettingsForStatsEngine,
     analysis: AnalysisSettingsForStatsEngine,
+    all_pairs: bool = False,
 ) -> pd.DataFrame:
     # diff data, convert raw sql into df of dimensions, and get rid of extra dimensions
     var_names = analysis.var_names
@@ -508,9 +895,12 @@ def process_analysis(
 
     # Limit to the top X dimensions with the most users
     # not possible to just re-sum for quantile metrics,
-    # so we throw away "other" dimension
+    # so we throw away "other" dimension unless quantile sketches can be merged
     keep_other = True
-    if metric.statistic_type in ["quantile_event", "quantile_unit"]:
+    if metric.statistic_type in [
+        "quantile_event",
+        "quantile_unit",
+    ] and not has_quantile_sketches(rows):
         keep_other = False
     if metric.keep_theta and metric.statistic_type == "mean_ra":
         keep_other = False
@@ -520,16 +910,66 @@ def process_analysis(
         keep_other=keep_other,
     )
 
-    # Run the analysis for each variation and dimension
-    result = analyze_metric_df(
+    # Run the analysis for each variation and dimension; with all_pairs, for
+    # every pair of variations so any baseline can be sliced out later
+    result = (analyze_metric_df_all_pairs if all_pairs else analyze_metric_df)(
         df=reduced,
         metric=metric,
         analysis=analysis,
     )
 
+    # Shrink the slices together; all-pairs results are shrunk when sliced
+    if analysis.dimension_shrinkage and not all_pairs:
+        add_dimension_shrinkage(result, analysis)
+
     return result
 
 
+# Sequential results for every date of cumulative per-date data, such as
+# a pre:datedaily query before differencing
+def process_sequential_trajectory(
+    rows: ExperimentMetricQueryResponseRows,
+    metric: MetricSettingsForStatsEngine,
+    analysis: AnalysisSettingsForStatsEngine,
+) -> List[DimensionResponse]:
+    sequential_analysis = dataclasses.replace(
+        analysis, stats_engine="frequentist", sequential_testing_enabled=True
+    )
+    if len(rows) == 0:
+        return []
+    pdrows = pd.DataFrame(rows).sort_values("dimension", kind="stable")
+    df = get_metric_df(
+        rows=pdrows,
+        var_id_map=get_var_id_map(analysis.var_ids),
+        var_names=analysis.var_names,
+    )
+    # every date and variation is analyzed in one batched pass
+    result = analyze_metric_df(df=df, metric=metric, analysis=sequential_analysis)
+
+    num_variations = result.at[0, "variations"]
+    columns = [f"v{i}" for i in range(1, num_variations)]
+    valid = result[[f"{c}_error_message" for c in columns]].isna().to_numpy()
+    ci = np.array([list(result[f"{c}_ci"]) for c in columns]).transpose((1, 0, 2))
+    p_value, ci_lower, ci_upper, empty = always_valid_trajectory(
+        result[[f"{c}_p_value" for c in columns]].to_numpy(dtype=float),
+        ci[:, :, 0],
+        ci[:, :, 1],
+        valid,
+    )
+    for j, c in enumerate(columns):
+        result[f"{c}_p_value"] = np.where(
+            valid[:, j], p_value[:, j], result[f"{c}_p_value"]
+        )
+        result[f"{c}_ci"] = [
+            [float(ci_lower[k, j]), float(ci_upper[k, j])]
+            if valid[k, j]
+            else ci[k, j].tolist()
+            for k in range(len(result.index))
+        ]
+        result[f"{c}_ci_intersection_empty"] = (valid[:, j] & empty[:, j]).tolist()
+    return format_results(result, baseline_index=analysis.baseline_index)
+
+
 def get_var_id_map(var_ids: List[str]) -> VarIdMap:
     return {v: i for i, v in enumerate(var_ids)}
 
@@ -559,27 +999,30 @@ def process_single_metric(
     all_var_ids: Set[str] = set([v for a in analyses for v in a.var_ids])
     unknown_var_ids = detect_unknown_variations(rows=pdrows, var_ids=all_var_ids)
 
-    results = [
-        format_results(
-            process_analysis(
-                rows=pdrows,
-                var_id_map=get_var_id_map(a.var_ids),
-                metric=metric,
-                analysis=a,
-            ),
-            baseline_index=a.baseline_index,
+    results = []
+    for a in analyses:
+        result = process_analysis(
+            rows=pdrows,
+            var_id_map=get_var_id_map(a.var_ids),
+            metric=metric,
+            analysis=a,
+            all_pairs=a.all_baselines,
         )
-        for a in analyses
-    ]
+        if a.all_baselines:
+            by_baseline = format_all_baselines(result, metric, a)
+            results.append((by_baseline[a.baseline_index], by_baseline))
+        else:
+            results.append((format_results(result, a.baseline_index), None))
     return ExperimentMetricAnalysis(
         metric=metric.id,
         analyses=[
             ExperimentMetricAnalysisResult(
                 unknownVariations=list(unknown_var_ids),
-                dimensions=r,
+                dimensions=dimensions,
                 multipleExposures=0,
+                dimensionsByBaseline=by_baseline,
             )
-            for r in results
+            for dimensions, by_baseline in results
         ],
     )
 
@@ -648,74 +1091,116 @@ def get_bandit_result(
     settings: AnalysisSettingsForStatsEngine,
     bandit_settings: BanditSettingsForStatsEngine,
 ) -> BanditResult:
-    single_variation_results = None
     b = preprocess_bandits(rows, metric, bandit_settings, settings.alpha, "")
-    if b:
-        if any(value is None for value in b.stats):
+    return get_bandit_results([b], [bandit_settings])[0]
+
+
+def get_bandit_results(
+    bandits: Sequence[Optional[Bandits]],
+    bandit_settings: Sequence[BanditSettingsForStatsEngine],
+) -> List[BanditResult]:
+    """Bandit results for many bandits, with the weights of all of them
+    computed in one `compute_bandit_results` call. Each result is identical
+    to `get_bandit_result` for its bandit alone; bandits without rows are None.
+    """
+    computable = [
+        i
+        for i, b in enumerate(bandits)
+        if b is not None and not any(value is None for value in b.stats)
+    ]
+    responses = dict(
+        zip(
+            computable,
+            compute_bandit_results([bandits[i] for i in computable]),  # type: ignore
+        )
+    )
+    return [
+        format_bandit_result(b, responses.get(i), settings)
+        for i, (b, settings) in enumerate(zip(bandits, bandit_settings))
+    ]
+
+
+def format_bandit_result(
+    b: Optional[Bandits],
+    bandit_result: Optional[BanditResponse],
+    bandit_settings: BanditSettingsForStatsEngine,
+) -> BanditResult:
+    single_variation_results = None
+    if b is None:
+        return get_error_bandit_result(
+            single_variation_results=None,
+            update_message="not updated",
+            error="no rows",
+            srm=1,
+            reweight=bandit_settings.reweight,
+            current_weights=bandit_settings.current_weights,
+        )
+    if bandit_result is None:
+        return get_error_bandit_result(
+            single_variation_results=None,
+            update_message="not updated",
+            srm=1,
+            error="not all statistics are instance of type BanditStatistic",
+            reweight=bandit_settings.reweight,
+            current_weights=bandit_settings.current_weights,
+        )
+    srm_p_value = b.compute_srm()
+    if bandit_result.ci:
+        single_variation_results = [
+            SingleVariationResult(n, mn, ci)
+            for n, mn, ci in zip(
+                b.variation_counts,
+                b.posterior_mean,
+                bandit_result.ci,
+            )
+        ]
+        if not bandit_result.enough_units:
             return get_error_bandit_result(
-                single_variation_results=None,
-                update_message="not updated",
-                srm=1,
-                error="not all statistics are instance of type BanditStatistic",
+                single_variation_results=single_variation_results,
+                update_message=bandit_result.bandit_update_message,
+                srm=srm_p_value,
+                error="",
                 reweight=bandit_settings.reweight,
                 current_weights=bandit_settings.current_weights,
             )
-        srm_p_value = b.compute_srm()
-        bandit_result = b.compute_result()
-        if bandit_result.ci:
-            single_variation_results = [
-                SingleVariationResult(n, mn, ci)
-                for n, mn, ci in zip(
-                    b.variation_counts,
-                    b.posterior_mean,
-                    bandit_result.ci,
-                )
-            ]
-            if not bandit_result.enough_units:
-                return get_error_bandit_result(
-                    single_variation_results=single_variation_results,
-                    update_message=bandit_result.bandit_update_message,
-                    srm=srm_p_value,
-                    error="",
-                    reweight=bandit_settings.reweight,
-                    current_weights=bandit_settings.current_weights,
-                )
-            if (
-                bandit_result.bandit_update_message == "successfully updated"
-                and bandit_result.bandit_weights
-            ):
-                weights_were_updated = (
-                    bandit_settings.current_weights != bandit_result.bandit_weights
-                    and bandit_settings.reweight
-                )
-                return BanditResult(
-                    singleVariationResults=single_variation_results,
-                    currentWeights=bandit_settings.current_weights,
-                    updatedWeights=bandit_result.bandit_weights
-                    if bandit_settings.reweight
-                    else bandit_settings.current_weights,
-                    srm=srm_p_value,
-                    bestArmProbabilities=bandit_result.best_arm_probabilities,
-                    seed=bandit_result.seed,
-                    updateMessage=bandit_result.bandit_update_message,
-                    error="",
-                    reweight=bandit_settings.reweight,
-                    weightsWereUpdated=weights_were_updated,
-                )
-        else:
-            error_message = (
-                bandit_result.bandit_update_message
-                if bandit_result.bandit_update_message
-                else "unknown error in get_bandit_result"
+        if (
+            bandit_result.bandit_update_message == "successfully updated"
+            and bandit_result.bandit_weights
+        ):
+            weights_were_updated = (
+                bandit_settings.current_weights != bandit_result.bandit_weights
+                and bandit_settings.reweight
             )
-            return get_error_bandit_result(
-                single_variation_results=None,
-                update_message="not updated",
-                srm=1,
-                error=error_message,
+            return BanditResult(
+                singleVariationResults=single_variation_results,
+                currentWeights=bandit_settings.current_weights,
+                updatedWeights=bandit_result.bandit_weights
+                if bandit_settings.reweight
+                else bandit_settings.current_weights,
+                srm=srm_p_value,
+                bestArmProbabilities=bandit_result.best_arm_probabilities,
+                seed=bandit_result.seed,
+                updateMessage=bandit_result.bandit_update_message,
+                error="",
                 reweight=bandit_settings.reweight,
-                current_weights=bandit_settings.current_weights,
+                weightsWereUpdated=weights_were_updated,
+                samplesUsed=bandit_result.samples_used,
+                weightStandardError=bandit_result.weight_standard_error,
             )
+    else:
+        error_message = (
+            bandit_result.bandit_update_message
+            if bandit_result.bandit_update_message
+            else "unknown error in get_bandit_result"
+        )
+        return get_error_bandit_result(
+            single_variation_results=None,
+            update_message="not updated",
+            srm=1,
+            error=error_message,
+            reweight=bandit_settings.reweight,
+            current_weights=bandit_settings.current_weights,
+        )
     return get_error_bandit_result(
         single_variation_results=None,
         update_message="not updated",
@@ -760,8 +1245,21 @@ def process_experiment_results(
     data: Dict[str, Any]
 ) -> Tuple[List[ExperimentMetricAnalysis], Optional[BanditResult]]:
     d = process_data_dict(data)
+    results, bandit = process_experiment_metrics(d)
+    bandit_result = None
+    if d.bandit_settings:
+        bandit_result = get_bandit_results([bandit], [d.bandit_settings])[0]
+    return results, bandit_result
+
+
+# Analyses of every metric of an experiment, and the bandit of its decision
+# metric if it has rows. Bandit weights are left to `get_bandit_results` so
+# that the bandits of many experiments can be updated together
+def process_experiment_metrics(
+    d: DataForStatsEngine,
+) -> Tuple[List[ExperimentMetricAnalysis], Optional[Bandits]]:
     results: List[ExperimentMetricAnalysis] = []
-    bandit_result: Optional[BanditResult] = None
+    bandit: Optional[Bandits] = None
     for query_result in d.query_results:
         for i, metric in enumerate(query_result.metrics):
             if metric in d.metrics:
@@ -778,13 +1276,14 @@ def process_experiment_results(
                             metric == d.bandit_settings.decision_metric
                             and not d.analyses[0].dimension
                         ):
-                            if bandit_result is not None:
+                            if bandit is not None:
                                 raise ValueError("Bandit weights already computed")
-                            bandit_result = get_bandit_result(
-                                rows=rows,
-                                metric=metric_settings_bandit,
-                                settings=d.analyses[0],
-                                bandit_settings=d.bandit_settings,
+                            bandit = preprocess_bandits(
+                                rows,
+                                metric_settings_bandit,
+                                d.bandit_settings,
+                                d.analyses[0].alpha,
+                                "",
                             )
                         results.append(
                             process_single_metric(
@@ -801,33 +1300,90 @@ def process_experiment_results(
                                 analyses=d.analyses,
                             )
                         )
-    if d.bandit_settings and bandit_result is None:
-        bandit_result = get_error_bandit_result(
-            single_variation_results=None,
-            update_message="not updated",
-            error="no rows",
-            srm=1,
-            reweight=d.bandit_settings.reweight,
-            current_weights=d.bandit_settings.current_weights,
-        )
-    return results, bandit_result
+    apply_p_value_corrections(results, d.analyses)
+    return results, bandit
+
+
+# Adjust p-values and CIs across all metrics, variations and dimensions of
+# each frequentist analysis that requests a multiple-comparison correction
+def apply_p_value_corrections(
+    results: List[ExperimentMetricAnalysis],
+    analyses: List[AnalysisSettingsForStatsEngine],
+) -> None:
+    for a, analysis in enumerate(analyses):
+        if analysis.p_value_correction is None:
+            continue
+        # one family per baseline; the requested baseline's dimensions are
+        # also its entry in dimensionsByBaseline
+        families: Dict[int, List[FrequentistVariationResponse]] = {}
+        for metric_result in results:
+            result = metric_result.analyses[a]
+            by_baseline = (
+                list(enumerate(result.dimensionsByBaseline))
+                if result.dimensionsByBaseline is not None
+                else [(analysis.baseline_index, result.dimensions)]
+            )
+            for b, dimensions in by_baseline:
+                families.setdefault(b, []).extend(
+                    v
+                    for dim in dimensions
+                    for v in dim.variations
+                    if isinstance(v, FrequentistVariationResponse)
+                    and not v.errorMessage
+                )
+        for responses in families.values():
+            correct_family(responses, analysis)
+
+
+# Adjust the p-values and intervals of one family of comparisons in place
+def correct_family(
+    responses: List[FrequentistVariationResponse],
+    analysis: AnalysisSettingsForStatsEngine,
+) -> None:
+    if not responses:
+        return
+    p_values_adjusted = adjust_p_values(
+        np.array([v.pValue for v in responses]), analysis.p_value_correction
+    )
+    if p_values_adjusted is None:
+        return
+    ci_lower, ci_upper = adjusted_cis(
+        np.array([v.expected for v in responses]),
+        np.array([v.ci[0] for v in responses]),
+        np.array([v.ci[1] for v in responses]),
+        np.array([v.pValue for v in responses]),
+        p_values_adjusted,
+        np.array([np.nan if v.dof is None else v.dof for v in responses]),
+        analysis.alpha,
+    )
+    for v, p, lower, upper in zip(responses, p_values_adjusted, ci_lower, ci_upper):
+        v.pValueAdjusted = float(p)
+        # sequential intervals are not t intervals and are left unadjusted
+        if v.dof is not None:
+            v.ciAdjusted = (
+                float(lower) if np.isfinite(lower) else None,
+                float(upper) if np.isfinite(upper) else None,
+            )
 
 
 def process_multiple_experiment_results(
     data: List[Dict[str, Any]]
 ) -> List[MultipleExperimentMetricAnalysis]:
     results: List[MultipleExperimentMetricAnalysis] = []
+    # bandits are updated together once every experiment is analyzed
+    bandits: List[Tuple[int, Optional[Bandits], BanditSettingsForStatsEngine]] = []
     for exp_data in data:
         try:
             exp_data_proc = ExperimentDataForStatsEngine(**exp_data)
-            fixed_results, bandit_result = process_experiment_results(
-                exp_data_proc.data
-            )
+            d = process_data_dict(exp_data_proc.data)
+            fixed_results, bandit = process_experiment_metrics(d)
+            if d.bandit_settings:
+                bandits.append((len(results), bandit, d.bandit_settings))
             results.append(
                 MultipleExperimentMetricAnalysis(
                     id=exp_data_proc.id,
                     results=fixed_results,
-                    banditResult=bandit_result,
+                    banditResult=None,
                     error=None,
                     traceback=None,
                 )
@@ -842,4 +1398,25 @@ def process_multiple_experiment_results(
                     traceback=traceback.format_exc(),
                 )
             )
+    try:
+        bandit_results = get_bandit_results(
+            [b for _, b, _ in bandits], [settings for _, _, settings in bandits]
+        )
+        for (i, _, _), bandit_result in zip(bandits, bandit_results):
+            results[i].banditResult = bandit_result
+    except Exception:
+        # one bandit at a time, so that errors stay with their experiment;
+        # its metric results are kept and the error goes on the bandit result
+        for i, b, settings in bandits:
+            try:
+                results[i].banditResult = get_bandit_results([b], [settings])[0]
+            except Exception as e:
+                results[i].banditResult = get_error_bandit_result(
+                    single_variation_results=None,
+                    update_message="not updated",
+                    srm=1,
+                    error=str(e),
+                    reweight=settings.reweight,
+                    current_weights=settings.current_weights,
+                )
     return results
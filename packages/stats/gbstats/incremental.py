@@ -0,0 +1,252 @@
+import base64
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from gbstats.aggregate import INTEGER_COLS
+from gbstats.gbstats import SUM_COLS
+from gbstats.models.settings import ExperimentMetricQueryResponseRows
+from gbstats.sketch import merge_serialized_sketches
+
+# columns identifying a query row; bandit queries add the period
+KEY_COLS = ["dimension", "variation", "bandit_period"]
+
+# sums of per-unit values, folded in by addition
+ADDITIVE_COLS = SUM_COLS + ["quantile_n"]
+
+# quantiles are not additive; they are read off the merged sketch instead
+QUANTILE_COLS = ["quantile_nstar", "quantile", "quantile_lower", "quantile_upper"]
+
+# fixed for a group once set, e.g. the CUPED theta of a bandit period
+GROUP_COLS = ["theta"]
+
+# multi-metric query rows prefix every metric column with m{index}_
+_METRIC_PREFIX = re.compile(r"^(m\d+_)?(.*)$")
+
+_VERSION = 2
+
+
+def _split_column(column: str) -> Tuple[str, str]:
+    match = _METRIC_PREFIX.match(column)
+    assert match is not None
+    return match.group(1) or "", match.group(2)
+
+
+# [start, end) of the exposure window whose units a batch of rows covers, as
+# comparable JSON values such as ISO dates
+Window = Tuple[Any, Any]
+
+
+class IncrementalQueryState:
+    def __init__(self):
+        """Running sufficient statistics of experiment metric query rows, so
+        that results can be refreshed from the rows of a new period alone.
+
+        The posteriors of `EffectBayesianABTest` and the bandits, like every
+        other analysis, depend on the data only through these per
+        (dimension, variation) sums, so the sums of disjoint sets of units
+        add up to those of the full rows. Sums of per-unit values do not add
+        across periods for one unit, though: a unit with values x and y in
+        two periods contributes (x + y)^2, not x^2 + y^2, to the sum of
+        squares. Each update therefore covers the units first exposed in one
+        window, with their values to date. Windows may not overlap, and rows
+        for a window already in the state replace its earlier rows, which is
+        how later activity of returning units is folded in. Rows of a new
+        bandit period are new groups. Quantile metrics are supported through
+        their mergeable sketches.
+        """
+        self.key_cols: List[str] = []
+        self.group_index: Dict[Tuple[Any, ...], int] = {}
+        self.windows: List[Window] = []
+        self.sum_cols: List[str] = []
+        # sums[w, j, g] is column j of group g over the units of window w
+        self.sums = np.zeros((0, 0, 0))
+        # whether window w has rows for group g
+        self.present = np.zeros((0, 0), dtype=bool)
+        self.sketches: Dict[str, List[List[Optional[str]]]] = {}
+        self.group_values: Dict[str, List[Any]] = {}
+
+    @property
+    def num_groups(self) -> int:
+        return len(self.group_index)
+
+    def _add_columns(self, columns: List[str]) -> None:
+        for col in columns:
+            _, base = _split_column(col)
+            if col in self.key_cols or col in self.sum_cols:
+                continue
+            if col in self.sketches or col in self.group_values:
+                continue
+            if base in ADDITIVE_COLS:
+                self.sum_cols.append(col)
+                self.sums = np.concatenate(
+                    [self.sums, np.zeros((len(self.windows), 1, self.sums.shape[2]))],
+                    axis=1,
+                )
+            elif base == "quantile_sketch":
+                self.sketches[col] = [[None] * self.num_groups for _ in self.windows]
+            elif base in GROUP_COLS:
+                self.group_values[col] = [None] * self.num_groups
+            elif base not in QUANTILE_COLS:
+                raise ValueError(f"Column {col} cannot be updated incrementally.")
+
+    def _window_index(self, window: Window) -> int:
+        start, end = window
+        if not start < end:
+            raise ValueError(f"Window {window} is empty.")
+        for w, (other_start, other_end) in enumerate(self.windows):
+            if (start, end) == (other_start, other_end):
+                return w
+            if start < other_end and other_start < end:
+                raise ValueError(
+                    f"Window {window} overlaps window {self.windows[w]}; "
+                    "each unit must be counted in one window only."
+                )
+        self.windows.append((start, end))
+        self.sums = np.concatenate(
+            [self.sums, np.zeros((1, len(self.sum_cols), self.sums.shape[2]))]
+        )
+        self.present = np.concatenate(
+            [self.present, np.zeros((1, self.present.shape[1]), dtype=bool)]
+        )
+        for sketches in self.sketches.values():
+            sketches.append([None] * self.num_groups)
+        return len(self.windows) - 1
+
+    def update(self, rows: ExperimentMetricQueryResponseRows, window: Window) -> None:
+        """Fold in the query rows of the units first exposed in `window`,
+        replacing any earlier rows for the same window."""
+        if not rows:
+            return
+        columns = list(dict.fromkeys(col for row in rows for col in row))
+        key_cols = [col for col in KEY_COLS if col in columns]
+        if self.key_cols and key_cols != self.key_cols:
+            raise ValueError("Rows do not have the key columns of the state.")
+        split = [_split_column(col) for col in columns]
+        sketched = {prefix for prefix, base in split if base == "quantile_sketch"}
+        for prefix, base in split:
+            if base in QUANTILE_COLS and prefix not in sketched:
+                raise ValueError(
+                    "Quantile metrics can only be updated incrementally "
+                    "from quantile sketches."
+                )
+        w = self._window_index(window)
+        self.key_cols = key_cols
+        self._add_columns([col for col in columns if col not in key_cols])
+
+        index = np.empty(len(rows), dtype=np.int64)
+        for i, row in enumerate(rows):
+            key = tuple(row.get(col) for col in self.key_cols)
+            if key not in self.group_index:
+                self.group_index[key] = self.num_groups
+                for sketches in self.sketches.values():
+                    for window_sketches in sketches:
+                        window_sketches.append(None)
+                for values in self.group_values.values():
+                    values.append(None)
+            index[i] = self.group_index[key]
+        if self.num_groups > self.sums.shape[2]:
+            grown = np.zeros((len(self.windows), len(self.sum_cols), self.num_groups))
+            grown[:, :, : self.sums.shape[2]] = self.sums
+            self.sums = grown
+            present = np.zeros((len(self.windows), self.num_groups), dtype=bool)
+            present[:, : self.present.shape[1]] = self.present
+            self.present = present
+
+        # the window's rows replace whatever it held before
+        delta = np.array(
+            [[row.get(col) or 0 for col in self.sum_cols] for row in rows], dtype=float
+        ).reshape(len(rows), len(self.sum_cols))
+        window_sums = np.zeros((self.num_groups, len(self.sum_cols)))
+        np.add.at(window_sums, index, delta)
+        self.sums[w] = window_sums.T
+        self.present[w] = False
+        self.present[w, index] = True
+
+        for col, sketches in self.sketches.items():
+            window_sketches: List[Optional[str]] = [None] * self.num_groups
+            for i, row in zip(index, rows):
+                new = row.get(col)
+                if isinstance(new, str) and new:
+                    current = window_sketches[i]
+                    window_sketches[i] = (
+                        merge_serialized_sketches([current, new]) if current else new
+                    )
+            sketches[w] = window_sketches
+        for col, values in self.group_values.items():
+            for i, row in zip(index, rows):
+                if col not in row:
+                    continue
+                if values[i] is not None and values[i] != row[col]:
+                    raise ValueError(f"Column {col} differs from the stored value.")
+                values[i] = row[col]
+
+    def rows(self) -> ExperimentMetricQueryResponseRows:
+        """Cumulative query rows, ready for `process_experiment_results`."""
+        rows: ExperimentMetricQueryResponseRows = []
+        sums = self.sums.sum(axis=0)
+        present = self.present.any(axis=0)
+        for key, i in self.group_index.items():
+            if not present[i]:
+                continue
+            row: Dict = dict(zip(self.key_cols, key))
+            for j, col in enumerate(self.sum_cols):
+                value = sums[j, i]
+                row[col] = (
+                    int(value)
+                    if _split_column(col)[1] in INTEGER_COLS
+                    else float(value)
+                )
+            for col, sketches in self.sketches.items():
+                group_sketches = [g for g in (s[i] for s in sketches) if g]
+                if group_sketches:
+                    row[col] = (
+                        merge_serialized_sketches(group_sketches)
+                        if len(group_sketches) > 1
+                        else group_sketches[0]
+                    )
+            for col, values in self.group_values.items():
+                if values[i] is not None:
+                    row[col] = values[i]
+            rows.append(row)
+        return rows
+
+    def serialize(self) -> str:
+        header = {
+            "version": _VERSION,
+            "key_cols": self.key_cols,
+            "keys": [list(key) for key in self.group_index],
+            "windows": [list(window) for window in self.windows],
+            "sum_cols": self.sum_cols,
+            "present": self.present.tolist(),
+            "sketches": self.sketches,
+            "group_values": self.group_values,
+        }
+        sums = base64.b64encode(self.sums.astype("<f8").tobytes()).decode("ascii")
+        return json.dumps({**header, "sums": sums}, separators=(",", ":"))
+
+    @classmethod
+    def deserialize(cls, serialized: str) -> "IncrementalQueryState":
+        data = json.loads(serialized)
+        if data["version"] != _VERSION:
+            raise ValueError(
+                f"Unsupported incremental state version: {data['version']}"
+            )
+        state = cls()
+        state.key_cols = data["key_cols"]
+        state.group_index = {tuple(key): i for i, key in enumerate(data["keys"])}
+        state.windows = [(start, end) for start, end in data["windows"]]
+        state.sum_cols = data["sum_cols"]
+        state.sums = (
+            np.frombuffer(base64.b64decode(data["sums"]), dtype="<f8")
+            .reshape(len(state.windows), len(state.sum_cols), state.num_groups)
+            .copy()
+        )
+        state.present = np.array(data["present"], dtype=bool).reshape(
+            len(state.windows), state.num_groups
+        )
+        state.sketches = data["sketches"]
+        state.group_values = data["group_values"]
+        return state
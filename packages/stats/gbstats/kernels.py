@@ -0,0 +1,82 @@
+from functools import lru_cache
+from typing import Any, Union
+
+import numpy as np
+from scipy import special
+
+##############################################
+# Thin wrappers over scipy.special for the distribution functions used in
+# gbstats. scipy.stats distributions validate and broadcast their arguments
+# through the generic rv_continuous machinery on every call, which dominates
+# the cost of scalar calls. These wrappers compute the same values and accept
+# scalars or arrays alike; scalar arguments give a float.
+###############################################
+
+
+# arguments of the wrappers; results are floats for scalar arguments and
+# arrays otherwise, left untyped like the other array kernels
+FloatOrArray = Union[float, np.ndarray]
+
+
+# 0-d results (from scalar arguments) as a float, arrays unchanged
+def _scalar_or_array(result: Any) -> Any:
+    return float(result) if np.ndim(result) == 0 else result
+
+
+def norm_pdf(x: FloatOrArray, loc: FloatOrArray = 0.0, scale: FloatOrArray = 1.0):
+    z = (np.asarray(x) - loc) / scale
+    return _scalar_or_array(np.exp(-0.5 * z * z) / (np.sqrt(2 * np.pi) * scale))
+
+
+def norm_cdf(x: FloatOrArray, loc: FloatOrArray = 0.0, scale: FloatOrArray = 1.0):
+    return _scalar_or_array(special.ndtr((np.asarray(x) - loc) / scale))
+
+
+def norm_sf(x: FloatOrArray, loc: FloatOrArray = 0.0, scale: FloatOrArray = 1.0):
+    return _scalar_or_array(special.ndtr(-((np.asarray(x) - loc) / scale)))
+
+
+def norm_ppf(q: FloatOrArray, loc: FloatOrArray = 0.0, scale: FloatOrArray = 1.0):
+    return _scalar_or_array(special.ndtri(q) * scale + loc)
+
+
+def t_cdf(x: FloatOrArray, df: FloatOrArray):
+    return _scalar_or_array(special.stdtr(df, x))
+
+
+def t_ppf(q: FloatOrArray, df: FloatOrArray):
+    return _scalar_or_array(special.stdtrit(df, q))
+
+
+# E[max(Z + z, 0)] for standard normal Z, i.e. phi(z) + z * Phi(z). For
+# negative z the two terms cancel, so it is computed there from the scaled
+# complementary error function as phi(z) * (1 - |z| * Phi(z) / phi(z))
+def norm_partial_expectation(z):
+    z = np.asarray(z, dtype=float)
+    t = np.abs(z)
+    with np.errstate(over="ignore", invalid="ignore"):
+        mills_ratio = np.sqrt(np.pi / 2) * special.erfcx(t / np.sqrt(2))
+        lower_tail = norm_pdf(z) * (1 - t * mills_ratio)
+        upper_tail = norm_pdf(z) + z * special.ndtr(z)
+    return np.where(z >= 0, upper_tail, lower_tail)
+
+
+# chi2 is undefined without degrees of freedom and has no mass below 0
+def chi2_sf(x: FloatOrArray, df: FloatOrArray):
+    sf = special.chdtrc(df, np.maximum(x, 0))
+    return _scalar_or_array(sf if np.all(df > 0) else np.where(df > 0, sf, np.nan))
+
+
+def chi2_cdf(x: FloatOrArray, df: FloatOrArray):
+    cdf = special.chdtr(df, np.maximum(x, 0))
+    return _scalar_or_array(cdf if np.all(df > 0) else np.where(df > 0, cdf, np.nan))
+
+
+# normal quantile used for two-sided intervals; cached since alpha is reused
+@lru_cache(maxsize=None)
+def two_sided_z(alpha: float) -> float:
+    return float(special.ndtri(1 - alpha / 2))
+
+
+# 97.5% normal quantile used for the quantile metric bounds
+Z_975 = two_sided_z(0.05)
@@ -8,3 +8,6 @@ ZERO_NEGATIVE_VARIANCE_MESSAGE = "ZERO_NEGATIVE_VARIANCE"
 LOG_APPROXIMATION_INEXACT_MESSAGE = "LOG_APPROXIMATION_INEXACT"
 BASELINE_VARIATION_ZERO_MESSAGE = "ZERO_NEGATIVE_BASELINE_VARIATION"
 ZERO_SCALED_VARIATION_MESSAGE = "ZERO_SCALED_VARIATION_WEIGHT"
+SCALED_IMPACT_STATISTIC_MESSAGE = "For scaled impact the statistic must be of type ProportionStatistic, SampleMeanStatistic, or RegressionAdjustedStatistic."
+# the Bayesian engine has always reported it without the trailing period
+BAYESIAN_SCALED_IMPACT_STATISTIC_MESSAGE = SCALED_IMPACT_STATISTIC_MESSAGE[:-1]
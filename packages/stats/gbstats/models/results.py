@@ -26,6 +26,8 @@ class BanditResult:
     error: Optional[str]
     reweight: bool
     weightsWereUpdated: bool
+    samplesUsed: Optional[int] = None
+    weightStandardError: Optional[float] = None
 
 
 @dataclass
@@ -65,11 +67,26 @@ class BayesianVariationResponse(BaseVariationResponse):
     chanceToWin: float
     risk: Tuple[float, float]
     riskType: RiskType
+    # set when the analysis requests dimension shrinkage
+    expectedShrunk: Optional[float] = None
+    ciShrunk: Optional[Tuple[float, float]] = None
 
 
 @dataclass
 class FrequentistVariationResponse(BaseVariationResponse):
     pValue: float
+    # degrees of freedom of the t interval; None for sequential intervals
+    dof: Optional[float] = None
+    # set when the analysis requests a multiple-comparison correction;
+    # unbounded adjusted interval endpoints are None
+    pValueAdjusted: Optional[float] = None
+    ciAdjusted: Optional[Tuple[Optional[float], Optional[float]]] = None
+    # set when the analysis requests dimension shrinkage
+    expectedShrunk: Optional[float] = None
+    ciShrunk: Optional[Tuple[float, float]] = None
+    # set by sequential trajectories; when True the running intersection of
+    # intervals was empty and ci is the last non-empty intersection
+    ciIntersectionEmpty: Optional[bool] = None
 
 
 VariationResponse = Union[
@@ -82,6 +99,10 @@ class DimensionResponse:
     dimension: str
     srm: float
     variations: List[VariationResponse]
+    # Bayesian analyses only, in the order of `variations`; None for
+    # variations whose analysis failed
+    probabilityBest: Optional[List[Optional[float]]] = None
+    expectedLoss: Optional[List[Optional[float]]] = None
 
 
 @dataclass
@@ -89,6 +110,10 @@ class ExperimentMetricAnalysisResult:
     unknownVariations: List[str]
     multipleExposures: float
     dimensions: List[DimensionResponse]
+    # set when the analysis requests all baselines: entry b holds the
+    # dimensions with variation b as the baseline, in the order of the
+    # experiment's variations
+    dimensionsByBaseline: Optional[List[List[DimensionResponse]]] = None
 
 
 @dataclass
@@ -6,6 +6,8 @@ DifferenceType = Literal["relative", "absolute", "scaled"]
 StatsEngine = Literal["bayesian", "frequentist"]
 StatisticType = Literal["ratio", "mean", "mean_ra", "quantile_event", "quantile_unit"]
 MetricType = Literal["binomial", "count", "quantile"]
+PValueCorrection = Optional[Literal["benjamini-hochberg", "holm-bonferroni"]]
+DimensionShrinkage = Optional[Literal["method-of-moments", "reml"]]
 
 
 @dataclass
@@ -23,6 +25,11 @@ class AnalysisSettingsForStatsEngine:
     alpha: float = 0.05
     max_dimensions: int = 20
     traffic_percentage: float = 1
+    p_value_correction: PValueCorrection = None
+    dimension_shrinkage: DimensionShrinkage = None
+    # also return results with every variation as the baseline, so the
+    # baseline can be switched without rerunning the analysis
+    all_baselines: bool = False
 
 
 @dataclass
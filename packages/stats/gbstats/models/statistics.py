@@ -1,10 +1,18 @@
 from abc import ABC, abstractmethod
+from functools import cached_property
 from typing import Optional, Union, List
 
 import numpy as np
-import scipy.stats
 from pydantic.dataclasses import dataclass
-from gbstats.utils import variance_of_ratios
+
+from gbstats.kernels import Z_975
+from gbstats.sketch import QuantileSketch
+from gbstats.utils import (
+    quantile_bound_values,
+    quantile_nstar,
+    ratio_covariance,
+    ratio_variance,
+)
 
 
 @dataclass
@@ -114,24 +122,27 @@ class RatioStatistic(Statistic):
 
     @property
     def variance(self):
-        if self.d_statistic.mean == 0 or self.n <= 1:
-            return 0
-        return variance_of_ratios(
-            self.m_statistic.mean,
-            self.m_statistic.variance,
-            self.d_statistic.mean,
-            self.d_statistic.variance,
-            self.covariance,
+        return float(
+            ratio_variance(
+                self.m_statistic.mean,
+                self.m_statistic.variance,
+                self.d_statistic.mean,
+                self.d_statistic.variance,
+                self.covariance,
+                self.n,
+            )
         )
 
     @property
     def covariance(self):
-        if self.n <= 1:
-            return 0
-        return (
-            self.m_d_sum_of_products
-            - self.m_statistic.sum * self.d_statistic.sum / self.n
-        ) / (self.n - 1)
+        return float(
+            ratio_covariance(
+                self.m_d_sum_of_products,
+                self.m_statistic.sum,
+                self.d_statistic.sum,
+                self.n,
+            )
+        )
 
 
 @dataclass
@@ -232,7 +243,7 @@ class QuantileStatistic(Statistic):
 
     @property
     def _has_zero_variance(self) -> bool:
-        multiplier = scipy.stats.norm.ppf(1.0 - 0.5 * 0.05, loc=0, scale=1)
+        multiplier = Z_975
         quantile_above_one = self.n <= multiplier**2 * self.nu / (1.0 - self.nu)
         quantile_below_zero = self.n <= multiplier**2 * (1.0 - self.nu) / self.nu
         if quantile_above_one or quantile_below_zero:
@@ -252,7 +263,7 @@ class QuantileStatistic(Statistic):
         if self.n <= 1:
             return 0
         num = self.quantile_upper - self.quantile_lower
-        den = 2 * scipy.stats.norm.ppf(1.0 - 0.5 * 0.05, loc=0, scale=1)
+        den = 2 * Z_975
         return float((self.n_star / self.n) * (self.n - 1) * (num / den) ** 2)
 
     @property
@@ -312,6 +323,59 @@ class QuantileClusteredStatistic(QuantileStatistic):
         return num / den
 
 
+@dataclass
+class QuantileSketchStatistic(Statistic):
+    n: int  # number of events here
+    nu: float  # quantile level of interest
+    sketch: str  # serialized QuantileSketch of the values
+
+    # deserialized once; mean and variance both read it
+    @cached_property
+    def quantile_statistic(self) -> QuantileStatistic:
+        # same order statistic CI the warehouse computes, but read off the sketch
+        n_star = quantile_nstar(self.n)
+        lower, upper = quantile_bound_values(self.nu, 0.05, n_star)
+        quantiles = np.asarray(
+            QuantileSketch.deserialize(self.sketch).quantile([self.nu, lower, upper]),
+            dtype=float,
+        )
+        quantile_hat, quantile_lower, quantile_upper = (float(q) for q in quantiles)
+        return QuantileStatistic(
+            n=self.n,
+            n_star=n_star,
+            nu=self.nu,
+            quantile_hat=quantile_hat,
+            quantile_lower=quantile_lower,
+            quantile_upper=quantile_upper,
+        )
+
+    @property
+    def _has_zero_variance(self) -> bool:
+        return self.quantile_statistic._has_zero_variance
+
+    @property
+    def mean(self) -> float:
+        return self.quantile_statistic.mean
+
+    @property
+    def variance(self) -> float:
+        return self.quantile_statistic.variance
+
+    def __add__(self, other):
+        if not isinstance(other, QuantileSketchStatistic):
+            raise TypeError("Can add only another QuantileSketchStatistic instance")
+        if self.nu != other.nu:
+            raise ValueError("Cannot add quantile sketches for different quantiles")
+        return QuantileSketchStatistic(
+            n=self.n + other.n,
+            nu=self.nu,
+            sketch=(
+                QuantileSketch.deserialize(self.sketch)
+                + QuantileSketch.deserialize(other.sketch)
+            ).serialize(),
+        )
+
+
 TestStatistic = Union[
     ProportionStatistic,
     SampleMeanStatistic,
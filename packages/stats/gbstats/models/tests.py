@@ -1,14 +1,22 @@
+import dataclasses
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
+import numpy as np
 from pydantic.dataclasses import dataclass
 
+from gbstats.messages import (
+    NO_UNITS_IN_VARIATION_MESSAGE,
+    ZERO_SCALED_VARIATION_MESSAGE,
+)
 from gbstats.models.statistics import (
     RegressionAdjustedStatistic,
+    ScaledImpactStatistic,
     TestStatistic,
     compute_theta,
 )
 from gbstats.models.settings import DifferenceType
+from gbstats.utils import isinstance_union
 
 
 # Configs
@@ -69,3 +77,97 @@ class BaseABTest(ABC):
     @abstractmethod
     def compute_result(self) -> TestResult:
         pass
+
+
+# Batched inputs; plain dataclass since pydantic does not validate arrays
+@dataclasses.dataclass
+class ComparisonMoments:
+    mean_a: np.ndarray
+    unadjusted_mean_a: np.ndarray
+    variance_a: np.ndarray
+    n_a: np.ndarray
+    zero_variance_a: np.ndarray
+    mean_b: np.ndarray
+    unadjusted_mean_b: np.ndarray
+    variance_b: np.ndarray
+    n_b: np.ndarray
+    zero_variance_b: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.mean_a)
+
+    @classmethod
+    def from_tests(cls, tests: Sequence[BaseABTest]) -> "ComparisonMoments":
+        """Collect the moments of each test's baseline and variation, after
+        the test has resolved any regression adjustment for its pair."""
+        columns = {}
+        for suffix in ["a", "b"]:
+            stats = [getattr(test, f"stat_{suffix}") for test in tests]
+            columns.update(
+                {
+                    f"mean_{suffix}": [s.mean for s in stats],
+                    f"unadjusted_mean_{suffix}": [s.unadjusted_mean for s in stats],
+                    f"variance_{suffix}": [s.variance for s in stats],
+                    f"n_{suffix}": [s.n for s in stats],
+                    f"zero_variance_{suffix}": [s._has_zero_variance for s in stats],
+                }
+            )
+        return cls(
+            **{
+                k: np.array(v, dtype=bool if k.startswith("zero") else float)
+                for k, v in columns.items()
+            }
+        )
+
+
+# Batched inputs for scaled impact; plain dataclass for the same reason
+@dataclasses.dataclass
+class ScaledImpactInputs:
+    # 0 where the comparison has no total users
+    total_users: np.ndarray
+    # whether the baseline statistic supports scaled impact
+    scalable: np.ndarray
+    traffic_percentage: float
+    phase_length_days: float
+
+    @classmethod
+    def from_tests(cls, tests: Sequence[BaseABTest]) -> "ScaledImpactInputs":
+        """Collect the scaling inputs of each test; tests of one analysis
+        share their traffic percentage and phase length."""
+        return cls(
+            total_users=np.array(
+                [getattr(test, "total_users") or 0 for test in tests], dtype=float
+            ),
+            scalable=np.array(
+                [
+                    isinstance_union(test.stat_a, ScaledImpactStatistic)
+                    for test in tests
+                ],
+                dtype=bool,
+            ),
+            traffic_percentage=getattr(tests[0], "traffic_percentage") if tests else 1,
+            phase_length_days=getattr(tests[0], "phase_length_days") if tests else 1,
+        )
+
+    @property
+    def adjustment(self) -> np.ndarray:
+        # daily traffic that converts absolute effects into scaled impact
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.total_users / (self.traffic_percentage * self.phase_length_days)
+
+    def error_message(
+        self, error_message: List[Optional[str]], unscalable_message: str
+    ) -> List[Optional[str]]:
+        """Add scaling errors to cells without an earlier error, with the
+        same precedence as the scalar `scale_result` methods."""
+        messages = np.array(error_message, dtype=object)
+        open_cells = np.array([m is None for m in error_message], dtype=bool)
+        if self.phase_length_days == 0 or self.traffic_percentage == 0:
+            messages[open_cells] = ZERO_SCALED_VARIATION_MESSAGE
+            return messages.tolist()
+        messages[open_cells & ~self.scalable] = unscalable_message
+        messages[
+            open_cells & self.scalable & (self.total_users == 0)
+        ] = NO_UNITS_IN_VARIATION_MESSAGE
+        return messages.tolist()
@@ -2,8 +2,8 @@ from typing import Optional, Tuple
 
 import numpy as np
 from pydantic.dataclasses import dataclass
-from scipy.stats import norm
 
+from gbstats.kernels import norm_cdf, two_sided_z
 from gbstats.models.tests import TestResult
 from gbstats.models.statistics import (
     TestStatistic,
@@ -72,7 +72,7 @@ class MidExperimentPower:
         self.traffic_percentage = config.traffic_percentage
         self.phase_length_days = config.phase_length_days
         self.alpha = config.alpha
-        self.z_star = norm.ppf(1 - self.alpha / 2)
+        self.z_star = two_sided_z(self.alpha)
         self.target_power = power_config.target_power
         self.m_prime = power_config.m_prime
         self.v_prime = power_config.v_prime
@@ -233,7 +233,7 @@ class MidExperimentPower:
             n_total = n_current * (1 + scaling_factor)
             halfwidth = sequential_interval_halfwidth(s2, n_total, rho, alpha)
         else:
-            z_star = float(norm.ppf(1 - alpha / 2))
+            z_star = two_sided_z(alpha)
             v = MidExperimentPower.final_posterior_variance(
                 sigma_2_posterior, sigmahat_2_delta, scaling_factor
             )
@@ -250,8 +250,8 @@ class MidExperimentPower:
         den = np.sqrt(v_prime)
         num_pos = num_1 - num_2 - num_3
         num_neg = -num_1 - num_2 - num_3
-        power_pos = float(1 - norm.cdf(num_pos / den))
-        power_neg = float(norm.cdf(num_neg / den))
+        power_pos = float(1 - norm_cdf(num_pos / den))
+        power_neg = float(norm_cdf(num_neg / den))
         return power_pos + power_neg
         # return power_pos
 
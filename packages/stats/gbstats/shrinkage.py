@@ -0,0 +1,116 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from gbstats.kernels import two_sided_z
+from gbstats.models.settings import DimensionShrinkage
+
+# REML fixed-point iterations stop once tau^2 moves less than this
+REML_TOLERANCE = 1e-10
+REML_MAX_ITERATIONS = 100
+
+##############################################
+# Empirical-Bayes shrinkage of effects estimated independently in each
+# dimension slice. Every function takes arrays of shape
+# (dimensions, variations) and treats each variation as a separate
+# random-effects model y_d ~ N(mu, v_d + tau^2) over the slices d in which
+# it is valid, so all variations are handled in one vectorized pass.
+###############################################
+
+
+# variations without valid slices have no weight and get NaN
+def _weighted_mean(y: np.ndarray, w: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sum(w * y, axis=0) / np.sum(w, axis=0)
+
+
+# DerSimonian-Laird method of moments estimate of tau^2
+def between_dimension_variance_moments(
+    effects: np.ndarray, variances: np.ndarray, valid: np.ndarray
+) -> np.ndarray:
+    y = np.where(valid, effects, 0)
+    w = np.where(valid, 1 / np.where(valid, variances, 1), 0)
+    sum_w = np.sum(w, axis=0)
+    q = np.sum(w * (y - _weighted_mean(y, w)) ** 2, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c = sum_w - np.sum(w**2, axis=0) / sum_w
+        tau2 = (q - (np.sum(valid, axis=0) - 1)) / c
+    return np.where(c > 0, np.maximum(tau2, 0), 0)
+
+
+# Restricted maximum likelihood estimate of tau^2 by the fixed-point
+# iteration of the REML score equation, started from the moments estimate
+def between_dimension_variance_reml(
+    effects: np.ndarray, variances: np.ndarray, valid: np.ndarray
+) -> np.ndarray:
+    y = np.where(valid, effects, 0)
+    v = np.where(valid, variances, 1)
+    tau2 = between_dimension_variance_moments(effects, variances, valid)
+    fitted = np.any(valid, axis=0)
+    for _ in range(REML_MAX_ITERATIONS):
+        w = np.where(valid, 1 / (v + tau2), 0)
+        residual = np.where(valid, (y - _weighted_mean(y, w)) ** 2 - v, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = np.sum(w**2 * residual, axis=0) / np.sum(w**2, axis=0)
+            new_tau2 = np.maximum(score + 1 / np.sum(w, axis=0), 0)
+        new_tau2 = np.where(fitted, new_tau2, 0)
+        converged = np.all(np.abs(new_tau2 - tau2) < REML_TOLERANCE)
+        tau2 = new_tau2
+        if converged:
+            break
+    return tau2
+
+
+def shrink_effects(
+    effects: np.ndarray,
+    variances: np.ndarray,
+    method: DimensionShrinkage,
+    valid: Optional[np.ndarray] = None,
+    alpha: float = 0.05,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Shrink slice effects towards the precision-weighted mean effect.
+
+    With the between-dimension variance tau^2 estimated by `method`, each
+    slice is shrunk by B_d = v_d / (v_d + tau^2), so small, noisy slices move
+    most. The variance of the shrunk effect, v_d (1 - B_d) + B_d^2 / sum(w),
+    includes the uncertainty in the pooled mean, and intervals are normal at
+    level `alpha`. Variations with fewer than two valid slices are not
+    shrunk and, like invalid slices, are returned as NaN.
+
+    Args:
+        effects (np.ndarray): effects, shape (dimensions, variations)
+        variances (np.ndarray): sampling variances of the effects
+        method (DimensionShrinkage): "method-of-moments" or "reml"
+        valid (np.ndarray): slices to use; defaults to positive variances
+        alpha (float): level of the shrunk intervals
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: shrunk effects and
+            interval lower and upper bounds
+    """
+    effects = np.atleast_2d(np.asarray(effects, dtype=float))
+    variances = np.atleast_2d(np.asarray(variances, dtype=float))
+    # normalized once, so the arrays below never see None
+    mask = np.ones(variances.shape, dtype=bool) if valid is None else valid
+    mask = np.atleast_2d(np.asarray(mask, dtype=bool)) & (variances > 0)
+    mask = mask & (np.sum(mask, axis=0) >= 2)
+    if method == "method-of-moments":
+        tau2 = between_dimension_variance_moments(effects, variances, mask)
+    elif method == "reml":
+        tau2 = between_dimension_variance_reml(effects, variances, mask)
+    else:
+        raise ValueError(f"Unknown dimension shrinkage: {method}")
+
+    y = np.where(mask, effects, 0)
+    v = np.where(mask, variances, 1)
+    w = np.where(mask, 1 / (v + tau2), 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu = _weighted_mean(y, w)
+        shrinkage = v / (v + tau2)
+        variance = v * (1 - shrinkage) + shrinkage**2 / np.sum(w, axis=0)
+    shrunk = mu + (1 - shrinkage) * (y - mu)
+    width = two_sided_z(alpha) * np.sqrt(variance)
+    return (
+        np.where(mask, shrunk, np.nan),
+        np.where(mask, shrunk - width, np.nan),
+        np.where(mask, shrunk + width, np.nan),
+    )
@@ -0,0 +1,145 @@
+import base64
+import struct
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+# number of centroids is roughly compression / 2
+DEFAULT_COMPRESSION = 200
+
+# version byte, compression, min, max, number of centroids
+_HEADER = struct.Struct("<Bdddi")
+_VERSION = 1
+
+
+class QuantileSketch:
+    def __init__(
+        self,
+        means: Optional[np.ndarray] = None,
+        weights: Optional[np.ndarray] = None,
+        compression: float = DEFAULT_COMPRESSION,
+        min_value: float = np.inf,
+        max_value: float = -np.inf,
+    ):
+        """Merging t-digest used to summarize a distribution so that quantiles
+        can be estimated after sketches from different dimensions, shards or
+        time periods have been combined.
+
+        Centroids are kept sorted by mean and compressed with the arcsine
+        scale function, so centroids in the tails stay small and extreme
+        quantiles (e.g. p95, p99) remain accurate.
+
+        Args:
+            means (np.ndarray): centroid means
+            weights (np.ndarray): centroid weights (number of values summarized)
+            compression (float): accuracy parameter; larger is more accurate
+            min_value (float): smallest value seen by the sketch
+            max_value (float): largest value seen by the sketch
+        """
+        self.means = np.zeros(0) if means is None else np.asarray(means, dtype=float)
+        self.weights = (
+            np.zeros(0) if weights is None else np.asarray(weights, dtype=float)
+        )
+        self.compression = compression
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @classmethod
+    def from_values(
+        cls, values: Union[np.ndarray, Iterable[float]], compression=DEFAULT_COMPRESSION
+    ) -> "QuantileSketch":
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return cls(compression=compression)
+        sketch = cls(
+            means=values,
+            weights=np.ones(values.shape),
+            compression=compression,
+            min_value=float(values.min()),
+            max_value=float(values.max()),
+        )
+        sketch._compress()
+        return sketch
+
+    @property
+    def n(self) -> float:
+        return float(self.weights.sum())
+
+    def _compress(self) -> None:
+        if self.means.size == 0:
+            return
+        order = np.argsort(self.means, kind="mergesort")
+        means = self.means[order]
+        weights = self.weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        # k1 scale function; each unit of k holds at most one centroid
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        bins = np.floor(k - k[0]).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        merged = QuantileSketch(
+            means=np.concatenate((self.means, other.means)),
+            weights=np.concatenate((self.weights, other.weights)),
+            compression=max(self.compression, other.compression),
+            min_value=min(self.min_value, other.min_value),
+            max_value=max(self.max_value, other.max_value),
+        )
+        merged._compress()
+        return merged
+
+    def __add__(self, other):
+        if not isinstance(other, QuantileSketch):
+            raise TypeError("Can add only another QuantileSketch instance")
+        return self.merge(other)
+
+    def quantile(self, q):
+        """Estimate the quantile(s) at level(s) `q` by interpolating between
+        centroid centers, anchored at the observed minimum and maximum."""
+        if self.means.size == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        total = self.n
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate(([0], centers, [total]))
+        values = np.concatenate(([self.min_value], self.means, [self.max_value]))
+        result = np.interp(np.asarray(q, dtype=float) * total, positions, values)
+        return float(result) if np.ndim(result) == 0 else result
+
+    def serialize(self) -> str:
+        header = _HEADER.pack(
+            _VERSION,
+            self.compression,
+            self.min_value,
+            self.max_value,
+            self.means.size,
+        )
+        body = self.means.astype("<f8").tobytes() + self.weights.astype("<f8").tobytes()
+        return base64.b64encode(header + body).decode("ascii")
+
+    @classmethod
+    def deserialize(cls, serialized: str) -> "QuantileSketch":
+        raw = base64.b64decode(serialized)
+        version, compression, min_value, max_value, size = _HEADER.unpack_from(raw)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported quantile sketch version: {version}")
+        arrays = np.frombuffer(raw, dtype="<f8", offset=_HEADER.size, count=2 * size)
+        return cls(
+            means=arrays[:size].copy(),
+            weights=arrays[size:].copy(),
+            compression=compression,
+            min_value=min_value,
+            max_value=max_value,
+        )
+
+
+# Combine serialized sketches (e.g. from dimensions, shards or days) into one
+def merge_serialized_sketches(serialized: Iterable[str]) -> str:
+    merged = QuantileSketch()
+    for s in serialized:
+        if s:
+            merged = merged.merge(QuantileSketch.deserialize(s))
+    return merged.serialize()
@@ -1,11 +1,11 @@
 import importlib.metadata
-from typing import List
+from typing import List, Tuple
 
 import packaging.version
 import numpy as np
 from scipy.stats import truncnorm
-from scipy.stats.distributions import chi2  # type: ignore
-from scipy.stats import norm  # type: ignore
+
+from gbstats.kernels import chi2_sf, norm_partial_expectation, norm_ppf, two_sided_z
 
 
 def check_gbstats_compatibility(nb_version: str) -> None:
@@ -25,6 +25,16 @@ def truncated_normal_mean(mu, sigma, a, b) -> float:
     return float(mn)
 
 
+# Expected losses of choosing control (E[max(X, 0)]) and treatment
+# (E[max(-X, 0)]) for a normal effect X ~ N(mu, sigma); accepts arrays
+def normal_risk(mu, sigma) -> Tuple[np.ndarray, np.ndarray]:
+    z = np.asarray(mu) / np.asarray(sigma)
+    return (
+        sigma * norm_partial_expectation(z),
+        sigma * norm_partial_expectation(-z),
+    )
+
+
 # given numerator random variable M (mean = mean_m, var = var_m),
 # denominator random variable D (mean = mean_d, var = var_d),
 # and covariance cov_m_d, what is the variance of M / D?
@@ -36,6 +46,56 @@ def variance_of_ratios(mean_m, var_m, mean_d, var_d, cov_m_d) -> float:
     )
 
 
+# Delta-method kernels for ratio metrics. They take scalars or arrays of any
+# shape (e.g. variations x dimensions) and return 0 in the cells that the
+# scalar statistics guard against: empty denominators and n <= 1.
+def ratio_mean(m_sum, d_sum):
+    d_sum = np.asarray(d_sum)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(d_sum == 0, 0, m_sum / d_sum)
+
+
+def ratio_covariance(m_d_sum_of_products, m_sum, d_sum, n):
+    n = np.asarray(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = (m_d_sum_of_products - m_sum * d_sum / n) / (n - 1)
+    return np.where(n <= 1, 0, covariance)
+
+
+def ratio_variance(mean_m, var_m, mean_d, var_d, cov_m_d, n):
+    mean_d = np.asarray(mean_d)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = variance_of_ratios(mean_m, var_m, mean_d, var_d, cov_m_d)
+    return np.where((mean_d == 0) | (np.asarray(n) <= 1), 0, variance)
+
+
+# variance of the relative effect (mean_b - mean_a) / mean_a of two
+# independent sample means
+def relative_effect_variance(mean_a, var_a, n_a, mean_b, var_b, n_b):
+    return variance_of_ratios(mean_b, var_b / n_b, mean_a, var_a / n_a, 0)
+
+
+# grid of sample sizes used by the warehouse when computing quantile bounds;
+# must be kept in sync with N_STAR_VALUES in the back-end SqlIntegration
+QUANTILE_N_STAR_VALUES = [100 * 2**i for i in range(20)]
+
+
+# largest nstar on the grid that is smaller than the quantile sample size
+def quantile_nstar(n: float) -> int:
+    smaller = [nstar for nstar in QUANTILE_N_STAR_VALUES if nstar < n]
+    return max(smaller) if smaller else min(QUANTILE_N_STAR_VALUES)
+
+
+# quantile levels whose sample quantiles form the order statistic CI
+def quantile_bound_values(nu: float, alpha: float, nstar: float) -> List[float]:
+    multiplier = two_sided_z(alpha)
+    binomial_se = np.sqrt(nu * (1 - nu) / nstar)
+    return [
+        float(max(nu - multiplier * binomial_se, 0.00000001)),
+        float(min(nu + multiplier * binomial_se, 0.99999999)),
+    ]
+
+
 # Run a chi-squared test to make sure the observed traffic split matches the expected one
 def check_srm(users: List[int], weights: List[float]) -> float:
     # Convert count of users into ratios
@@ -51,13 +111,13 @@ def check_srm(users: List[int], weights: List[float]) -> float:
         e = weights[i] / total_weight * total_observed
         x = x + ((o - e) ** 2) / e
 
-    return chi2.sf(x, len(users) - 1)  # type: ignore
+    return chi2_sf(x, len(users) - 1)
 
 
 def gaussian_credible_interval(
     mean_diff: float, std_diff: float, alpha: float
 ) -> List[float]:
-    ci = norm.ppf([alpha / 2, 1 - alpha / 2], mean_diff, std_diff)
+    ci = norm_ppf(np.array([alpha / 2, 1 - alpha / 2]), mean_diff, std_diff)
     return ci.tolist()
 
 
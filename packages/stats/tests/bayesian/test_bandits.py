@@ -0,0 +1,313 @@
+import dataclasses
+from unittest import TestCase, main as unittest_main
+from unittest.mock import patch
+
+import numpy as np
+from scipy import integrate
+from scipy.stats import chisquare, norm
+
+from gbstats.bayesian.bandits import (
+    SAMPLE_CHUNK_SIZE,
+    BanditConfig,
+    BanditsRatio,
+    BanditsSimple,
+    bandit_rng,
+    compute_bandit_results,
+    sample_bandit_counts,
+)
+from gbstats.models.settings import BanditWeightsSinglePeriod
+from gbstats.models.statistics import RatioStatistic, SampleMeanStatistic
+
+STATS = [
+    SampleMeanStatistic(n=1000, sum=1000 * mean, sum_squares=1000 * (mean**2 + 4))
+    for mean in [1.0, 1.1, 1.05, 0.9]
+]
+HISTORICAL_PERIODS = [
+    BanditWeightsSinglePeriod(date="", weights=[0.25] * 4, total_users=0),
+    BanditWeightsSinglePeriod(date="", weights=[0.25] * 4, total_users=4000),
+]
+
+
+def get_bandit(stats=STATS, **config) -> BanditsSimple:
+    return BanditsSimple(
+        stats,
+        HISTORICAL_PERIODS,
+        [0.25] * len(stats),
+        BanditConfig(**{"bandit_weights_seed": 10, **config}),
+    )
+
+
+# P(arm i is best) for independent normal posteriors by quadrature
+def best_arm_probabilities(mean, sd):
+    return [
+        integrate.quad(
+            lambda x: norm.pdf(x, mean[i], sd[i])
+            * np.prod(
+                [norm.cdf(x, mean[j], sd[j]) for j in range(len(mean)) if j != i]
+            ),
+            -np.inf,
+            np.inf,
+        )[0]
+        for i in range(len(mean))
+    ]
+
+
+class TestThompsonSampling(TestCase):
+    def test_deterministic_for_seed(self):
+        self.assertEqual(get_bandit().compute_result(), get_bandit().compute_result())
+        self.assertNotEqual(
+            get_bandit().compute_result().best_arm_probabilities,
+            get_bandit(bandit_weights_seed=11).compute_result().best_arm_probabilities,
+        )
+
+    def test_best_arm_probabilities(self):
+        bandit = get_bandit()
+        result = bandit.compute_result()
+        np.testing.assert_allclose(
+            result.best_arm_probabilities,
+            best_arm_probabilities(
+                bandit.posterior_mean, np.sqrt(bandit.posterior_variance)
+            ),
+            atol=0.015,
+        )
+        self.assertAlmostEqual(sum(result.bandit_weights), 1)
+
+    def test_sample_counts(self):
+        bandit = get_bandit()
+        best_counts, top_two_counts = bandit.sample_counts(np.random.default_rng(1))
+        self.assertEqual(top_two_counts.sum(), 2 * best_counts.sum())
+        self.assertEqual(best_counts.sum() % SAMPLE_CHUNK_SIZE, 0)
+
+    def test_fixed_sample_size(self):
+        for top_two in [False, True]:
+            result = get_bandit(top_two=top_two).compute_result()
+            self.assertEqual(result.samples_used, 10000)
+
+    def test_adaptive_sample_size(self):
+        for top_two in [False, True]:
+            adaptive = dict(top_two=top_two, weight_tolerance=0.002)
+            result = get_bandit(**adaptive, max_samples=100000).compute_result()
+            self.assertLess(result.weight_standard_error, 0.002)
+            self.assertLess(result.samples_used, 100000)
+            # fewer draws are needed once the chunk before did not suffice
+            fewer = get_bandit(
+                **adaptive, max_samples=result.samples_used - SAMPLE_CHUNK_SIZE
+            ).compute_result()
+            self.assertGreaterEqual(fewer.weight_standard_error, 0.002)
+
+    def test_dominant_arm_stops_early(self):
+        stats = STATS[:3] + [
+            SampleMeanStatistic(n=1000, sum=3000, sum_squares=1000 * (9 + 4))
+        ]
+        result = get_bandit(
+            stats, top_two=False, weight_tolerance=0.002
+        ).compute_result()
+        self.assertEqual(result.samples_used, SAMPLE_CHUNK_SIZE)
+        self.assertEqual(result.best_arm_probabilities, [0, 0, 0, 1])
+
+    def test_max_samples(self):
+        result = get_bandit(weight_tolerance=1e-6, max_samples=2500).compute_result()
+        self.assertEqual(result.samples_used, 2500)
+        self.assertGreater(result.weight_standard_error, 1e-6)
+
+
+class TestBanditPosterior(TestCase):
+    def test_computed_once(self):
+        bandit = get_bandit()
+        with patch.object(
+            BanditsSimple, "compute_posterior", wraps=bandit.compute_posterior
+        ) as compute_posterior:
+            bandit.compute_result()
+            bandit.compute_srm()
+            self.assertIs(bandit.posterior_mean, bandit.posterior.posterior_mean)
+        compute_posterior.assert_called_once()
+
+    def test_posterior(self):
+        posterior = get_bandit().posterior
+        np.testing.assert_array_equal(posterior.variation_counts, [1000] * 4)
+        np.testing.assert_allclose(posterior.variation_means, [1.0, 1.1, 1.05, 0.9])
+        np.testing.assert_allclose(
+            posterior.posterior_variance, 1 / posterior.posterior_precision
+        )
+        self.assertEqual(posterior.addback, 0)
+
+    def test_immutable(self):
+        posterior = get_bandit().posterior
+        with self.assertRaises(ValueError):
+            posterior.posterior_mean[0] = 0
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            posterior.addback = 1  # type: ignore
+
+
+class TestBanditsRatio(TestCase):
+    def test_zero_denominator_variance(self):
+        stats = [
+            RatioStatistic(
+                n=100,
+                m_statistic=SampleMeanStatistic(n=100, sum=m, sum_squares=2 * m),
+                d_statistic=SampleMeanStatistic(n=100, sum=d, sum_squares=2 * d),
+                m_d_sum_of_products=m,
+            )
+            for m, d in [(50, 90), (40, 0)]
+        ]
+        bandit = BanditsRatio(
+            stats, [], [0.5, 0.5], BanditConfig(bandit_weights_seed=10)
+        )
+        variances = bandit.compute_variation_variances(np.array([100, 100]))
+        # a zero denominator mean is guarded like the other ratio kernels
+        self.assertEqual(variances[1], 0)
+        self.assertTrue(np.all(np.isfinite(variances)))
+        self.assertGreater(variances[0], 0)
+
+
+class TestPeriodCounts(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        weights = rng.dirichlet(np.ones(4), 500)
+        totals = np.concatenate([[0], np.cumsum(rng.integers(1, 8, 499))])
+        self.periods = [
+            BanditWeightsSinglePeriod(date="", weights=w.tolist(), total_users=int(t))
+            for w, t in zip(weights, totals)
+        ]
+
+    def test_counts_expected(self):
+        bandit = BanditsSimple(STATS, self.periods, [0.25] * 4, BanditConfig())
+        cumulative = [p.total_users for p in self.periods] + [4000]
+        expected = np.zeros(4)
+        for i, period in enumerate(self.periods):
+            count = cumulative[1] if i == 0 else cumulative[i + 1] - cumulative[i]
+            expected += count * np.array(period.weights)
+        np.testing.assert_allclose(bandit.counts_expected, expected)
+        self.assertAlmostEqual(bandit.counts_expected.sum(), 4000)
+
+    def test_srm(self):
+        bandit = get_bandit()
+        np.testing.assert_array_equal(bandit.period_counts, [4000, 0])
+        np.testing.assert_allclose(bandit.counts_expected, [1000] * 4)
+        self.assertEqual(bandit.compute_srm(), 1)
+        stats = STATS[:3] + [SampleMeanStatistic(n=1200, sum=1080, sum_squares=5772)]
+        cumulative = [0, 4200]
+        bandit = BanditsSimple(
+            stats,
+            [
+                BanditWeightsSinglePeriod(date="", weights=[0.25] * 4, total_users=c)
+                for c in cumulative
+            ],
+            [0.25] * 4,
+            BanditConfig(),
+        )
+        self.assertAlmostEqual(
+            bandit.compute_srm(), chisquare([1000, 1000, 1000, 1200]).pvalue
+        )
+
+    def test_no_periods(self):
+        bandit = BanditsSimple(STATS, [], [0.25] * 4, BanditConfig())
+        np.testing.assert_array_equal(bandit.counts_expected, [0] * 4)
+
+
+class TestTopTwoCounts(TestCase):
+    def setUp(self):
+        self.y = np.array([[0.3, 0.1, 0.5, 0.2], [0.9, 0.4, 0.1, 0.3], [1, 2, 3, 4]])
+
+    def test_top_two_counts(self):
+        np.testing.assert_array_equal(
+            BanditsSimple.top_two_counts(self.y), [2, 1, 2, 1]
+        )
+        np.testing.assert_array_equal(
+            BanditsSimple.top_two_weights(self.y), [1 / 3, 1 / 6, 1 / 3, 1 / 6]
+        )
+
+    def test_top_two_counts_inverse(self):
+        np.testing.assert_array_equal(
+            BanditsSimple.top_two_counts(self.y, inverse=True), [1, 2, 1, 2]
+        )
+
+    def test_matches_sort(self):
+        y = np.random.default_rng(3).standard_normal((500, 7))
+        for inverse in [False, True]:
+            order = np.argsort(y, axis=1)
+            top_two = order[:, :2] if inverse else order[:, -2:]
+            np.testing.assert_array_equal(
+                BanditsSimple.top_two_counts(y, inverse),
+                np.bincount(top_two.ravel(), minlength=7),
+            )
+
+    def test_two_arms(self):
+        y = np.array([[1.0, 2.0], [3.0, 0.0]])
+        for inverse in [False, True]:
+            np.testing.assert_array_equal(
+                BanditsSimple.top_two_counts(y, inverse), [2, 2]
+            )
+
+
+class TestExactMode(TestCase):
+    def test_best_arm_probabilities(self):
+        bandit = get_bandit(exact=True)
+        np.testing.assert_allclose(
+            bandit.compute_result().best_arm_probabilities,
+            best_arm_probabilities(
+                bandit.posterior_mean, np.sqrt(bandit.posterior_variance)
+            ),
+            atol=1e-6,
+        )
+
+    def test_matches_sampling(self):
+        for inverse in [False, True]:
+            for top_two in [False, True]:
+                exact = get_bandit(exact=True, inverse=inverse, top_two=top_two)
+                sampled = get_bandit(inverse=inverse, top_two=top_two)
+                exact_result = exact.compute_result()
+                self.assertAlmostEqual(sum(exact_result.bandit_weights), 1)
+                np.testing.assert_allclose(
+                    exact_result.best_arm_probabilities,
+                    sampled.compute_result().best_arm_probabilities,
+                    atol=0.015,
+                )
+                np.testing.assert_allclose(
+                    exact_result.bandit_weights,
+                    sampled.compute_result().bandit_weights,
+                    atol=0.015,
+                )
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.bandits = []
+        for i, k in enumerate([2, 4, 3, 6, 1, 5]):
+            stats = [
+                SampleMeanStatistic(n=n, sum=n * m, sum_squares=n * (m**2 + 4))
+                for n, m in zip(rng.integers(200, 2000, k), rng.normal(1, 0.05, k))
+            ]
+            config = BanditConfig(
+                bandit_weights_seed=i + 1,
+                inverse=bool(i % 2),
+                top_two=i % 3 != 0,
+                exact=i == 3,
+                weight_tolerance=[0.002, None][i % 2],
+                max_samples=[100000, 2500][i % 2],
+            )
+            self.bandits.append(BanditsSimple(stats, [], [1 / k] * k, config))
+
+    def test_matches_single_bandits(self):
+        self.assertEqual(
+            compute_bandit_results(self.bandits),
+            [b.compute_result() for b in self.bandits],
+        )
+
+    def test_sample_counts(self):
+        seeds = [b.bandit_weights_seed for b in self.bandits]
+        counts = sample_bandit_counts(self.bandits, [bandit_rng(s) for s in seeds])
+        for b, seed, (best_counts, top_two_counts) in zip(self.bandits, seeds, counts):
+            expected_best, expected_top_two = b.sample_counts(bandit_rng(seed))
+            np.testing.assert_array_equal(best_counts, expected_best)
+            np.testing.assert_array_equal(top_two_counts, expected_top_two)
+
+    def test_independent_of_other_bandits(self):
+        results = compute_bandit_results(self.bandits)
+        self.assertEqual(compute_bandit_results(self.bandits[1:3]), results[1:3])
+        self.assertEqual(compute_bandit_results([]), [])
+
+
+if __name__ == "__main__":
+    unittest_main()
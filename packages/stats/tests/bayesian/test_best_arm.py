@@ -0,0 +1,111 @@
+from unittest import TestCase, main as unittest_main
+from unittest.mock import patch
+
+import numpy as np
+from scipy.stats import norm
+
+from gbstats.bayesian import best_arm
+from gbstats.bayesian.best_arm import probability_best, rank_probabilities
+from gbstats.devtools.benchmarks import probability_best_monte_carlo
+
+MEAN = np.array([[0.1, 0.12, -0.05], [0.01, 0.002, 0.5], [1e-3, 2e-3, -1]])
+STDDEV = np.array([[0.05, 0.2, 0.01], [0.001, 0.003, 0.1], [1e-3, 1e-2, 5]])
+
+
+class TestProbabilityBest(TestCase):
+    def test_two_arms(self):
+        mean, stddev = np.array([[0.1], [-0.3]]), np.array([[0.2], [0.1]])
+        prob, loss = probability_best(mean, stddev)
+        z = mean[:, 0] / stddev[:, 0]
+        np.testing.assert_allclose(prob[:, 1], norm.cdf(z), atol=1e-9)
+        np.testing.assert_allclose(prob[:, 0], norm.cdf(-z), atol=1e-9)
+        # E[max(0, X)] for X ~ N(m, s^2)
+        expected_max = stddev[:, 0] * norm.pdf(z) + mean[:, 0] * norm.cdf(z)
+        np.testing.assert_allclose(loss[:, 0], expected_max, atol=1e-9)
+        np.testing.assert_allclose(loss[:, 1], expected_max - mean[:, 0], atol=1e-9)
+
+    def test_two_arms_skip_quadrature(self):
+        mean, stddev = np.array([[0.1], [-0.3]]), np.array([[0.2], [0.1]])
+        with patch.object(
+            best_arm,
+            "_independent_probability_best",
+            wraps=best_arm._independent_probability_best,
+        ) as quadrature:
+            closed_form = probability_best(mean, stddev, correlation=np.ones((2, 1)))
+            quadrature.assert_not_called()
+            prob, loss = best_arm._independent_probability_best(
+                mean, stddev, np.ones((2, 1), dtype=bool), 257
+            )
+        np.testing.assert_allclose(closed_form[0], prob, atol=1e-9)
+        np.testing.assert_allclose(closed_form[1][:, 0], loss, atol=1e-9)
+
+    def test_matches_monte_carlo(self):
+        for inverse in [False, True]:
+            prob, loss = probability_best(MEAN, STDDEV, inverse)
+            mc_prob, mc_loss = probability_best_monte_carlo(
+                -MEAN if inverse else MEAN, STDDEV, 200000, seed=1
+            )
+            np.testing.assert_allclose(prob.sum(axis=1), 1)
+            np.testing.assert_allclose(prob, mc_prob, atol=0.005)
+            np.testing.assert_allclose(loss, mc_loss, rtol=0.01, atol=0.005)
+
+    def test_correlated_effects_match_monte_carlo(self):
+        correlation = np.array([[0.7, 0.4, 0.9], [0.5, 0.5, 0.5], [0.2, 0.8, 0.6]])
+        prob, loss = probability_best(MEAN, STDDEV, correlation=correlation)
+        mc_prob, mc_loss = probability_best_monte_carlo(
+            MEAN, STDDEV, 200000, seed=1, correlation=correlation
+        )
+        np.testing.assert_allclose(prob.sum(axis=1), 1)
+        np.testing.assert_allclose(prob, mc_prob, atol=0.005)
+        np.testing.assert_allclose(loss, mc_loss, rtol=0.01, atol=0.005)
+        # treating the effects as independent is measurably off
+        independent, _ = probability_best(MEAN, STDDEV)
+        self.assertGreater(np.max(np.abs(independent - mc_prob)), 0.02)
+
+    def test_correlation_keeps_marginals(self):
+        mean, stddev = np.array([[0.1], [-0.3]]), np.array([[0.2], [0.1]])
+        prob, _ = probability_best(mean, stddev, correlation=np.full((2, 1), 0.8))
+        np.testing.assert_allclose(prob[:, 1], norm.cdf(mean / stddev)[:, 0])
+
+    def test_invalid_variations(self):
+        valid = np.array([[True, False, True]] * 3)
+        prob, loss = probability_best(MEAN, STDDEV, valid=valid)
+        self.assertTrue(np.all(np.isnan(prob[:, 2])))
+        self.assertTrue(np.all(np.isnan(loss[:, 2])))
+        expected_prob, expected_loss = probability_best(
+            MEAN[:, [0, 2]], STDDEV[:, [0, 2]]
+        )
+        np.testing.assert_allclose(prob[:, [0, 1, 3]], expected_prob)
+        np.testing.assert_allclose(loss[:, [0, 1, 3]], expected_loss)
+
+
+class TestRankProbabilities(TestCase):
+    def test_matches_monte_carlo(self):
+        # arms of a bandit share a metric, so their stddevs are of one scale
+        mean, stddev = MEAN[:2], STDDEV[:2]
+        rng = np.random.default_rng(2)
+        for inverse in [False, True]:
+            best, second = rank_probabilities(mean, stddev, inverse)
+            np.testing.assert_allclose(best.sum(axis=1), 1, atol=1e-3)
+            np.testing.assert_allclose(second.sum(axis=1), 1, atol=1e-3)
+            for g in range(mean.shape[0]):
+                draws = mean[g] + stddev[g] * rng.standard_normal((200000, 3))
+                order = np.argsort(draws if inverse else -draws, axis=1)
+                for rank, prob in enumerate([best[g], second[g]]):
+                    counts = np.bincount(order[:, rank], minlength=3)
+                    np.testing.assert_allclose(prob, counts / 200000, atol=0.005)
+
+    def test_padding(self):
+        valid = np.array([[True, False, True]] * 3)
+        best, second = rank_probabilities(MEAN, STDDEV, valid=valid)
+        np.testing.assert_array_equal(best[:, 1], 0)
+        np.testing.assert_array_equal(second[:, 1], 0)
+        expected_best, expected_second = rank_probabilities(
+            MEAN[:, [0, 2]], STDDEV[:, [0, 2]]
+        )
+        np.testing.assert_allclose(best[:, [0, 2]], expected_best)
+        np.testing.assert_allclose(second[:, [0, 2]], expected_second)
+
+
+if __name__ == "__main__":
+    unittest_main()
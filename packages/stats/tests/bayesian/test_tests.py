@@ -3,9 +3,10 @@ from functools import partial
 from unittest import TestCase, main as unittest_main
 
 import numpy as np
-from scipy.stats import norm
+from scipy.stats import norm, truncnorm
 
 from gbstats.bayesian.tests import (
+    BatchedEffectBayesianABTest,
     BayesianTestResult,
     GaussianPrior,
     EffectBayesianABTest,
@@ -15,10 +16,11 @@ from gbstats.bayesian.tests import (
 
 from gbstats.models.statistics import (
     ProportionStatistic,
+    RatioStatistic,
     SampleMeanStatistic,
     QuantileStatistic,
 )
-from gbstats.models.tests import Uplift
+from gbstats.models.tests import ComparisonMoments, ScaledImpactInputs, Uplift
 
 DECIMALS = 5
 round_ = partial(np.round, decimals=DECIMALS)
@@ -228,6 +230,36 @@ class TestEffectBayesianABTest(TestCase):
         np.testing.assert_almost_equal(b_flat.risk[1], risk_empirical_trt, decimal=3)
 
 
+class TestBaselineCorrelation(TestCase):
+    def test_matches_simulated_effects(self):
+        stat_a = SampleMeanStatistic(n=400, sum=4000, sum_squares=80000)
+        stats_b = [
+            SampleMeanStatistic(n=200, sum=2400, sum_squares=60000),
+            SampleMeanStatistic(n=1000, sum=9000, sum_squares=150000),
+        ]
+        rng = np.random.default_rng(3)
+
+        def sample_means(stat):
+            return stat.mean + np.sqrt(stat.variance / stat.n) * rng.standard_normal(
+                200000
+            )
+
+        for difference_type in ["absolute", "relative"]:
+            config = EffectBayesianConfig(difference_type=difference_type)
+            rho = [
+                EffectBayesianABTest(stat_a, stat_b, config).baseline_correlation
+                for stat_b in stats_b
+            ]
+            mean_a = sample_means(stat_a)
+            effects = [sample_means(stat_b) - mean_a for stat_b in stats_b]
+            if difference_type == "relative":
+                effects = [effect / mean_a for effect in effects]
+            # effects against one baseline are correlated only through it
+            np.testing.assert_almost_equal(
+                np.corrcoef(effects)[0, 1], rho[0] * rho[1], decimal=2
+            )
+
+
 class TestGaussianEffectRelativeAbsolutePriors(TestCase):
     def test_bayesian_effect_relative_effect(self):
         stat_c = SampleMeanStatistic(n=100, sum=1000, sum_squares=200000)
@@ -250,5 +282,126 @@ class TestGaussianEffectRelativeAbsolutePriors(TestCase):
         self.assertAlmostEqual(abs_res.chance_to_win, rel_res.chance_to_win, places=2)
 
 
+BATCH_STATS = [
+    (
+        SampleMeanStatistic(sum=1396.87, sum_squares=52377.9767, n=3407),
+        SampleMeanStatistic(sum=2422.7, sum_squares=134698.29, n=3461),
+    ),
+    (ProportionStatistic(sum=14, n=28), ProportionStatistic(sum=16, n=30)),
+    (ProportionStatistic(sum=0, n=28), ProportionStatistic(sum=16, n=30)),
+    (ProportionStatistic(sum=0, n=0), ProportionStatistic(sum=16, n=30)),
+    (
+        SampleMeanStatistic(sum=100, sum_squares=100, n=100),
+        SampleMeanStatistic(sum=100, sum_squares=100, n=100),
+    ),
+    (
+        SampleMeanStatistic(sum=-1396.87, sum_squares=52377.9767, n=3000),
+        SampleMeanStatistic(sum=2422.7, sum_squares=134698.29, n=3461),
+    ),
+    (
+        RatioStatistic(
+            n=100,
+            m_statistic=SampleMeanStatistic(sum=50, sum_squares=60, n=100),
+            d_statistic=SampleMeanStatistic(sum=90, sum_squares=100, n=100),
+            m_d_sum_of_products=55,
+        ),
+        RatioStatistic(
+            n=100,
+            m_statistic=SampleMeanStatistic(sum=55, sum_squares=65, n=100),
+            d_statistic=SampleMeanStatistic(sum=92, sum_squares=102, n=100),
+            m_d_sum_of_products=57,
+        ),
+    ),
+]
+
+
+class TestBatchedEffectBayesianABTest(TestCase):
+    def assert_matches_scalar(self, configs):
+        tests = [
+            EffectBayesianABTest(a, b, config)
+            for (a, b), config in zip(BATCH_STATS, configs)
+        ]
+        batched = BatchedEffectBayesianABTest(
+            ComparisonMoments.from_tests(tests),
+            configs[0],
+            ScaledImpactInputs.from_tests(tests),
+        )
+        for expected, result in zip(
+            [test.compute_result() for test in tests],
+            batched.compute_result().to_results(),
+        ):
+            self.assertDictEqual(
+                round_results_dict(asdict(result)), round_results_dict(asdict(expected))
+            )
+
+    def test_priors(self):
+        for difference_type in ["relative", "absolute"]:
+            for prior_type in ["relative", "absolute"]:
+                for proper in [False, True]:
+                    for inverse in [False, True]:
+                        config = EffectBayesianConfig(
+                            difference_type=difference_type,
+                            prior_type=prior_type,
+                            inverse=inverse,
+                            prior_effect=GaussianPrior(
+                                mean=0.1, variance=0.5, proper=proper
+                            ),
+                        )
+                        self.assert_matches_scalar([config] * len(BATCH_STATS))
+
+    def test_scaled(self):
+        total_users = [6868, None, 58, 100, 3463, 6461, 200]
+        for phase_length_days in [3, 0]:
+            self.assert_matches_scalar(
+                [
+                    EffectBayesianConfig(
+                        difference_type="scaled",
+                        total_users=users,
+                        traffic_percentage=0.5,
+                        phase_length_days=phase_length_days,
+                    )
+                    for users in total_users
+                ]
+            )
+
+    def test_scaled_ratio_message(self):
+        config = EffectBayesianConfig(difference_type="scaled", total_users=1000)
+        result = EffectBayesianABTest(*BATCH_STATS[-1], config).compute_result()
+        # unchanged from the message the Bayesian engine has always returned
+        self.assertEqual(
+            result.error_message,
+            "For scaled impact the statistic must be of type ProportionStatistic, "
+            "SampleMeanStatistic, or RegressionAdjustedStatistic",
+        )
+
+    def test_scaled_requires_inputs(self):
+        tests = [EffectBayesianABTest(a, b) for a, b in BATCH_STATS]
+        with self.assertRaises(ValueError):
+            BatchedEffectBayesianABTest(
+                ComparisonMoments.from_tests(tests),
+                EffectBayesianConfig(difference_type="scaled"),
+            )
+
+
+class TestGetRisk(TestCase):
+    def test_matches_truncated_normal_means(self):
+        for mu, sigma in [(0.1, 0.05), (-0.1, 0.05), (0.0, 1.0), (0.001, 1.0)]:
+            prob_ctrl_is_better = norm.cdf(0, mu, sigma)
+            mn_neg = truncnorm.mean(-np.inf, -mu / sigma, loc=mu, scale=sigma)
+            mn_pos = truncnorm.mean(-mu / sigma, np.inf, loc=mu, scale=sigma)
+            np.testing.assert_allclose(
+                EffectBayesianABTest.get_risk(mu, sigma),
+                [(1 - prob_ctrl_is_better) * mn_pos, -prob_ctrl_is_better * mn_neg],
+                rtol=1e-9,
+            )
+
+    def test_extreme_ratios(self):
+        for mu, sigma in [(3, 0.1), (-3, 0.1), (1e6, 1), (-1e6, 1), (1e-12, 1)]:
+            risk = EffectBayesianABTest.get_risk(mu, sigma)
+            self.assertTrue(np.all(np.isfinite(risk)))
+            self.assertTrue(np.all(np.array(risk) >= 0))
+            self.assertAlmostEqual(risk[0] - risk[1], mu)
+
+
 if __name__ == "__main__":
     unittest_main()
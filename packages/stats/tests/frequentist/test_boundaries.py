@@ -0,0 +1,117 @@
+import os
+import tempfile
+from unittest import TestCase, main as unittest_main, skipIf
+from unittest.mock import patch
+
+import numpy as np
+from scipy.stats import norm
+
+from gbstats.frequentist import boundaries
+from gbstats.frequentist.boundaries import (
+    alpha_spent,
+    compute_boundary_table,
+    get_boundary_table,
+    stagewise_p_value,
+)
+
+FIVE_LOOKS = [0.2, 0.4, 0.6, 0.8, 1.0]
+
+
+class TestComputeBoundaryTable(TestCase):
+    def test_pocock(self):
+        # Lan-DeMets Pocock-type boundaries, two-sided alpha = 0.05
+        table = compute_boundary_table(0.05, "pocock", FIVE_LOOKS)
+        np.testing.assert_allclose(
+            table.critical_values, [2.438, 2.427, 2.410, 2.397, 2.386], atol=1e-3
+        )
+
+    def test_obrien_fleming(self):
+        # Lan-DeMets O'Brien-Fleming-type boundaries, two-sided alpha = 0.05
+        table = compute_boundary_table(0.05, "obrien-fleming", FIVE_LOOKS)
+        np.testing.assert_allclose(
+            table.critical_values, [4.877, 3.357, 2.680, 2.290, 2.031], atol=1e-3
+        )
+        self.assertAlmostEqual(table.cumulative_alpha[-1], 0.05)
+
+    def test_single_look(self):
+        for spending_function in ["obrien-fleming", "pocock"]:
+            table = compute_boundary_table(0.05, spending_function, [1.0])
+            self.assertAlmostEqual(table.critical_values[0], 1.959964, places=5)
+
+    def test_alpha_spent(self):
+        for spending_function in ["obrien-fleming", "pocock"]:
+            spent = alpha_spent(np.array(FIVE_LOOKS), 0.1, spending_function)
+            self.assertTrue(np.all(np.diff(spent) > 0))
+            self.assertAlmostEqual(spent[-1], 0.1)
+
+    def test_invalid_schedule(self):
+        with self.assertRaises(ValueError):
+            compute_boundary_table(0.05, "pocock", [0.5, 0.4, 1.0])
+        with self.assertRaises(ValueError):
+            compute_boundary_table(0.05, "pocock", [0.5, 0.9])
+
+
+class TestStagewisePValue(TestCase):
+    def test_first_look_is_z_test(self):
+        table = compute_boundary_table(0.05, "pocock", FIVE_LOOKS)
+        self.assertAlmostEqual(stagewise_p_value(table, 0, -2.1), 2 * norm.sf(2.1))
+
+    def test_boundary_p_value_is_alpha_spent(self):
+        table = compute_boundary_table(0.05, "obrien-fleming", FIVE_LOOKS)
+        for k, c in enumerate(table.critical_values):
+            self.assertAlmostEqual(
+                stagewise_p_value(table, k, c), table.cumulative_alpha[k], places=5
+            )
+        self.assertGreater(stagewise_p_value(table, 2, 1.0), 0.05)
+
+    def test_matches_simulated_null(self):
+        table = compute_boundary_table(0.05, "pocock", FIVE_LOOKS)
+        rng = np.random.default_rng(36)
+        steps = rng.standard_normal((200000, 5)) * np.sqrt(
+            np.diff(FIVE_LOOKS, prepend=0)
+        )
+        z = np.cumsum(steps, axis=1) / np.sqrt(FIVE_LOOKS)
+        crossed = np.abs(z) >= table.critical_values
+        earlier = crossed[:, :-1].any(axis=1)
+        # paths at least as extreme as stopping at the last look with |z| = 2
+        simulated = np.mean(earlier | (np.abs(z[:, -1]) >= 2))
+        self.assertAlmostEqual(stagewise_p_value(table, 4, 2.0), simulated, places=2)
+
+
+class TestGetBoundaryTable(TestCase):
+    def setUp(self):
+        boundaries._BOUNDARY_TABLES.clear()
+
+    def tearDown(self):
+        boundaries._BOUNDARY_TABLES.clear()
+
+    def test_disk_and_memory_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            table = get_boundary_table(0.05, "pocock", FIVE_LOOKS, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            with patch.object(boundaries, "compute_boundary_table") as compute:
+                # memory
+                self.assertIs(
+                    get_boundary_table(0.05, "pocock", FIVE_LOOKS, cache_dir), table
+                )
+                # disk
+                boundaries._BOUNDARY_TABLES.clear()
+                self.assertEqual(
+                    get_boundary_table(0.05, "pocock", FIVE_LOOKS, cache_dir), table
+                )
+                compute.assert_not_called()
+
+    def test_no_disk_cache(self):
+        table = get_boundary_table(0.05, "obrien-fleming", [0.5, 1.0], None)
+        self.assertEqual(table.information_fractions, [0.5, 1.0])
+
+    @skipIf("GBSTATS_CACHE_DIR" in os.environ, "disk cache configured")
+    def test_disk_cache_is_opt_in(self):
+        self.assertIsNone(boundaries.BOUNDARY_CACHE_DIR)
+        with patch("os.makedirs") as makedirs:
+            get_boundary_table(0.05, "obrien-fleming", [0.25, 1.0])
+        makedirs.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest_main()
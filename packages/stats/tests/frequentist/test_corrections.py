@@ -0,0 +1,84 @@
+from unittest import TestCase, main as unittest_main
+
+import numpy as np
+from scipy.stats import t
+
+from gbstats.frequentist.corrections import (
+    adjust_p_values,
+    adjust_p_values_benjamini_hochberg,
+    adjust_p_values_holm_bonferroni,
+    adjusted_cis,
+)
+
+
+P_VALUES = np.array([0.01, 0.04, 0.03, 0.005])
+
+
+class TestAdjustPValues(TestCase):
+    def test_holm_bonferroni(self):
+        np.testing.assert_allclose(
+            adjust_p_values_holm_bonferroni(P_VALUES), [0.03, 0.06, 0.06, 0.02]
+        )
+
+    def test_benjamini_hochberg(self):
+        np.testing.assert_allclose(
+            adjust_p_values_benjamini_hochberg(P_VALUES), [0.02, 0.04, 0.04, 0.02]
+        )
+
+    def test_capped_at_one(self):
+        p_values = np.array([0.5, 0.9, 0.6])
+        self.assertTrue(np.all(adjust_p_values_holm_bonferroni(p_values) == 1))
+        np.testing.assert_allclose(
+            adjust_p_values_benjamini_hochberg(p_values), [0.9, 0.9, 0.9]
+        )
+
+    def test_dispatch(self):
+        np.testing.assert_array_equal(
+            adjust_p_values(P_VALUES, "holm-bonferroni"),
+            adjust_p_values_holm_bonferroni(P_VALUES),
+        )
+        self.assertIsNone(adjust_p_values(P_VALUES, None))
+
+
+class TestAdjustedCIs(TestCase):
+    def test_adjusted_cis(self):
+        dof = np.array([20.0, np.inf, 20.0, 20.0, 20.0])
+        p_values = np.array([0.05, 0.05, 0.5, 0.01, 0.04])
+        p_values_adjusted = np.array([0.1, 0.2, 1.0, 0.01, 0.08])
+        sides = np.array([2, 2, 2, 2, 1])
+        width = t.ppf(1 - 0.05 / sides, dof) * 0.5
+        lower, upper = adjusted_cis(
+            np.ones(5),
+            1 - width,
+            np.where(sides == 2, 1 + width, np.inf),
+            p_values,
+            p_values_adjusted,
+            dof,
+        )
+        level = 0.05 * p_values / p_values_adjusted
+        adjusted_width = t.ppf(1 - level / sides, dof) * 0.5
+        np.testing.assert_allclose(
+            lower, [*(1 - adjusted_width[:2]), -np.inf, *(1 - adjusted_width[3:])]
+        )
+        np.testing.assert_allclose(
+            upper, [*(1 + adjusted_width[:2]), np.inf, 1 + adjusted_width[3], np.inf]
+        )
+
+    def test_adjusted_ci_excludes_zero_with_adjusted_p_value(self):
+        # the adjusted interval touches 0 exactly when the adjusted p-value
+        # equals alpha
+        p_value = 2 * t.sf(1.2 / 0.5, 20)
+        width = t.ppf(0.975, 20) * 0.5
+        lower, _ = adjusted_cis(
+            np.array([1.2]),
+            np.array([1.2 - width]),
+            np.array([1.2 + width]),
+            np.array([p_value]),
+            np.array([0.05]),
+            np.array([20.0]),
+        )
+        self.assertAlmostEqual(lower[0], 0)
+
+
+if __name__ == "__main__":
+    unittest_main()
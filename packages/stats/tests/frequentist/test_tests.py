@@ -3,21 +3,32 @@ from functools import partial
 from unittest import TestCase, main as unittest_main
 
 import numpy as np
+from scipy.stats import norm
 
 from gbstats.messages import ZERO_NEGATIVE_VARIANCE_MESSAGE
 from gbstats.frequentist.tests import (
+    BatchedOneSidedTreatmentGreaterTTest,
+    BatchedOneSidedTreatmentLesserTTest,
+    BatchedSequentialTwoSidedTTest,
+    BatchedTwoSidedTTest,
     FrequentistConfig,
     FrequentistTestResult,
+    GroupSequentialConfig,
+    GroupSequentialTwoSidedTTest,
+    OneSidedTreatmentGreaterTTest,
+    OneSidedTreatmentLesserTTest,
     SequentialConfig,
     SequentialTwoSidedTTest,
     TwoSidedTTest,
+    always_valid_trajectory,
 )
 from gbstats.models.statistics import (
     ProportionStatistic,
+    RatioStatistic,
     RegressionAdjustedStatistic,
     SampleMeanStatistic,
 )
-from gbstats.models.tests import Uplift
+from gbstats.models.tests import ComparisonMoments, ScaledImpactInputs, Uplift
 
 DECIMALS = 5
 round_ = partial(np.round, decimals=DECIMALS)
@@ -100,6 +111,43 @@ class TestTwoSidedTTest(TestCase):
         self.assertEqual(default_output, result_output)
 
 
+class TestGroupSequentialTTest(TestCase):
+    def setUp(self):
+        self.stat_a = SampleMeanStatistic(sum=1396.87, sum_squares=52377.9767, n=3407)
+        self.stat_b = SampleMeanStatistic(sum=2422.7, sum_squares=134698.29, n=3461)
+
+    def test_single_look_is_z_test(self):
+        test = GroupSequentialTwoSidedTTest(
+            self.stat_a, self.stat_b, GroupSequentialConfig(spending_function="pocock")
+        )
+        result = test.compute_result()
+        z = test.critical_value
+        self.assertAlmostEqual(result.p_value, 2 * norm.sf(abs(z)))
+        width = norm.ppf(0.975) * np.sqrt(test.variance)
+        np.testing.assert_allclose(
+            result.ci, [test.point_estimate - width, test.point_estimate + width]
+        )
+
+    def test_looks(self):
+        results = [
+            GroupSequentialTwoSidedTTest(
+                self.stat_a,
+                self.stat_b,
+                GroupSequentialConfig(
+                    information_fractions=(0.25, 0.5, 1.0), look_index=look_index
+                ),
+            )
+            for look_index in range(3)
+        ]
+        boundaries = [test.boundary for test in results]
+        self.assertTrue(boundaries[0] > boundaries[1] > boundaries[2])
+        for test in results:
+            result = test.compute_result()
+            self.assertEqual(
+                result.p_value < test.alpha, abs(test.critical_value) > test.boundary
+            )
+
+
 class TestSequentialTTest(TestCase):
     def test_sequential_test_runs(self):
         stat_a = SampleMeanStatistic(sum=1396.87, sum_squares=52377.9767, n=3000)
@@ -200,5 +248,183 @@ class TestSequentialTTest(TestCase):
         )
 
 
+BATCH_STATS = [
+    (
+        SampleMeanStatistic(sum=1396.87, sum_squares=52377.9767, n=3407),
+        SampleMeanStatistic(sum=2422.7, sum_squares=134698.29, n=3461),
+    ),
+    (ProportionStatistic(sum=14, n=28), ProportionStatistic(sum=16, n=30)),
+    (ProportionStatistic(sum=0, n=28), ProportionStatistic(sum=16, n=30)),
+    (
+        SampleMeanStatistic(sum=1396.87, sum_squares=52377.9767, n=2),
+        SampleMeanStatistic(sum=2422.7, sum_squares=134698.29, n=3461),
+    ),
+    (
+        SampleMeanStatistic(sum=-1396.87, sum_squares=52377.9767, n=3000),
+        SampleMeanStatistic(sum=2422.7, sum_squares=134698.29, n=3461),
+    ),
+]
+
+
+class TestBatchedTTest(TestCase):
+    def assert_matches_scalar(self, batched_class, scalar_class, config):
+        tests = [scalar_class(a, b, config) for a, b in BATCH_STATS]
+        batched = batched_class(ComparisonMoments.from_tests(tests), config)
+        for expected, result in zip(
+            [test.compute_result() for test in tests],
+            batched.compute_result().to_results(),
+        ):
+            self.assertEqual(asdict(result), asdict(expected))
+
+    def test_two_sided(self):
+        for difference_type in ["relative", "absolute"]:
+            self.assert_matches_scalar(
+                BatchedTwoSidedTTest,
+                TwoSidedTTest,
+                FrequentistConfig(difference_type=difference_type),
+            )
+
+    def test_one_sided(self):
+        config = FrequentistConfig(alpha=0.1, test_value=0.05)
+        self.assert_matches_scalar(
+            BatchedOneSidedTreatmentGreaterTTest, OneSidedTreatmentGreaterTTest, config
+        )
+        self.assert_matches_scalar(
+            BatchedOneSidedTreatmentLesserTTest, OneSidedTreatmentLesserTTest, config
+        )
+
+    def test_sequential(self):
+        for difference_type in ["relative", "absolute"]:
+            self.assert_matches_scalar(
+                BatchedSequentialTwoSidedTTest,
+                SequentialTwoSidedTTest,
+                SequentialConfig(
+                    difference_type=difference_type, sequential_tuning_parameter=1000
+                ),
+            )
+
+    def test_scaled(self):
+        stats = BATCH_STATS + [
+            (
+                RatioStatistic(
+                    n=100,
+                    m_statistic=SampleMeanStatistic(sum=50, sum_squares=60, n=100),
+                    d_statistic=SampleMeanStatistic(sum=90, sum_squares=100, n=100),
+                    m_d_sum_of_products=55,
+                ),
+                RatioStatistic(
+                    n=100,
+                    m_statistic=SampleMeanStatistic(sum=55, sum_squares=65, n=100),
+                    d_statistic=SampleMeanStatistic(sum=92, sum_squares=102, n=100),
+                    m_d_sum_of_products=57,
+                ),
+            )
+        ]
+        total_users = [6868, None, 58, 3463, 6461, 200]
+        for phase_length_days in [3, 0]:
+            for batched_class, scalar_class, config_class in [
+                (BatchedTwoSidedTTest, TwoSidedTTest, FrequentistConfig),
+                (
+                    BatchedSequentialTwoSidedTTest,
+                    SequentialTwoSidedTTest,
+                    SequentialConfig,
+                ),
+            ]:
+                tests = [
+                    scalar_class(
+                        a,
+                        b,
+                        config_class(
+                            difference_type="scaled",
+                            total_users=users,
+                            traffic_percentage=0.5,
+                            phase_length_days=phase_length_days,
+                        ),
+                    )
+                    for (a, b), users in zip(stats, total_users)
+                ]
+                batched = batched_class(
+                    ComparisonMoments.from_tests(tests),
+                    config_class(difference_type="scaled"),
+                    ScaledImpactInputs.from_tests(tests),
+                )
+                for expected, result in zip(
+                    [test.compute_result() for test in tests],
+                    batched.compute_result().to_results(),
+                ):
+                    self.assertEqual(asdict(result), asdict(expected))
+
+    def test_scaled_requires_inputs(self):
+        tests = [TwoSidedTTest(a, b) for a, b in BATCH_STATS]
+        with self.assertRaises(ValueError):
+            BatchedTwoSidedTTest(
+                ComparisonMoments.from_tests(tests),
+                FrequentistConfig(difference_type="scaled"),
+            )
+
+    def test_error_masks(self):
+        tests = [TwoSidedTTest(a, b) for a, b in BATCH_STATS]
+        result = BatchedTwoSidedTTest(
+            ComparisonMoments.from_tests(tests)
+        ).compute_result()
+        self.assertEqual(
+            result.error_message,
+            [
+                None,
+                None,
+                "ZERO_NEGATIVE_BASELINE_VARIATION",
+                "ZERO_NEGATIVE_VARIANCE",
+                None,
+            ],
+        )
+        self.assertEqual(result.p_value[2], 1)
+        self.assertEqual(result.ci_lower[3], 0)
+
+
+class TestAlwaysValidTrajectory(TestCase):
+    def test_running_min_and_intersection(self):
+        p_value, ci_lower, ci_upper, empty = always_valid_trajectory(
+            np.array([[0.5, 0.2], [0.3, 1.0], [0.4, 0.1]]),
+            np.array([[-1.0, -2.0], [-0.5, 0.0], [-0.8, -1.0]]),
+            np.array([[1.0, 2.0], [0.8, 0.0], [1.2, 1.0]]),
+            np.array([[True, True], [True, False], [True, True]]),
+        )
+        np.testing.assert_array_equal(p_value, [[0.5, 0.2], [0.3, 0.2], [0.3, 0.1]])
+        np.testing.assert_array_equal(
+            ci_lower, [[-1.0, -2.0], [-0.5, -2.0], [-0.5, -1.0]]
+        )
+        np.testing.assert_array_equal(ci_upper, [[1.0, 2.0], [0.8, 2.0], [0.8, 1.0]])
+        self.assertFalse(empty.any())
+
+    def test_invalid_first_look(self):
+        p_value, ci_lower, ci_upper, empty = always_valid_trajectory(
+            np.array([[1.0], [0.4]]),
+            np.array([[0.0], [-1.0]]),
+            np.array([[0.0], [1.0]]),
+            np.array([[False], [True]]),
+        )
+        np.testing.assert_array_equal(p_value, [[1.0], [0.4]])
+        np.testing.assert_array_equal(ci_lower, [[-np.inf], [-1.0]])
+        np.testing.assert_array_equal(ci_upper, [[np.inf], [1.0]])
+        self.assertFalse(empty.any())
+
+    def test_empty_intersection(self):
+        p_value, ci_lower, ci_upper, empty = always_valid_trajectory(
+            np.array([[0.5, 0.5], [0.01, 0.4], [0.3, 0.3]]),
+            np.array([[-1.0, -1.0], [2.0, -0.5], [-0.5, 0.5]]),
+            np.array([[1.0, 1.0], [3.0, 0.5], [0.5, 1.5]]),
+            np.full((3, 2), True),
+        )
+        np.testing.assert_array_equal(p_value, [[0.5, 0.5], [0.01, 0.4], [0.01, 0.3]])
+        np.testing.assert_array_equal(
+            empty, [[False, False], [True, False], [True, False]]
+        )
+        # the last non-empty intersection is kept once it becomes empty
+        np.testing.assert_array_equal(
+            ci_lower, [[-1.0, -1.0], [-1.0, -0.5], [-1.0, 0.5]]
+        )
+        np.testing.assert_array_equal(ci_upper, [[1.0, 1.0], [1.0, 0.5], [1.0, 0.5]])
+
+
 if __name__ == "__main__":
     unittest_main()
@@ -0,0 +1,383 @@
+import os
+import tempfile
+from unittest import TestCase, main as unittest_main
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from gbstats.aggregate import (
+    ChunkedAggregator,
+    aggregate_delimited_file,
+    aggregate_grouping_sets,
+    aggregate_quantile_events,
+    aggregate_quantile_units,
+    aggregate_units,
+    analyze_grouping_sets,
+    grouped_quantiles,
+)
+from gbstats.gbstats import process_experiment_results, process_single_metric
+from gbstats.models.settings import (
+    AnalysisSettingsForStatsEngine,
+    MetricSettingsForStatsEngine,
+)
+from gbstats.utils import quantile_bound_values, quantile_nstar
+
+RNG = np.random.default_rng(27)
+N = 5000
+VARIATION = RNG.choice(["0", "1", "2"], size=N)
+DIMENSION = RNG.choice(["chrome", "safari"], size=N)
+NUMERATOR = RNG.poisson(3, size=N).astype(float)
+DENOMINATOR = RNG.poisson(5, size=N).astype(float) + 1
+COVARIATE = NUMERATOR + RNG.normal(size=N)
+
+RATIO_METRIC = MetricSettingsForStatsEngine(
+    id="ratio_metric",
+    name="ratio_metric",
+    statistic_type="ratio",
+    main_metric_type="count",
+    denominator_metric_type="count",
+)
+
+ANALYSIS = AnalysisSettingsForStatsEngine(
+    var_names=["zero", "one", "two"],
+    var_ids=["0", "1", "2"],
+    weights=[1 / 3] * 3,
+    stats_engine="frequentist",
+)
+
+
+class TestAggregateUnits(TestCase):
+    def test_matches_groupby(self):
+        rows = aggregate_units(
+            VARIATION,
+            NUMERATOR,
+            denominator=DENOMINATOR,
+            covariate=COVARIATE,
+            dimension=DIMENSION,
+        )
+        self.assertEqual(len(rows), 6)
+        df = pd.DataFrame(
+            {
+                "dimension": DIMENSION,
+                "variation": VARIATION,
+                "m": NUMERATOR,
+                "d": DENOMINATOR,
+                "c": COVARIATE,
+            }
+        )
+        for row in rows:
+            group = df[
+                (df.dimension == row["dimension"]) & (df.variation == row["variation"])
+            ]
+            self.assertEqual(row["users"], len(group))
+            self.assertEqual(row["count"], len(group))
+            self.assertAlmostEqual(row["main_sum"], group.m.sum())
+            self.assertAlmostEqual(row["main_sum_squares"], (group.m**2).sum())
+            self.assertAlmostEqual(row["denominator_sum"], group.d.sum())
+            self.assertAlmostEqual(
+                row["main_denominator_sum_product"], (group.m * group.d).sum()
+            )
+            self.assertAlmostEqual(row["covariate_sum_squares"], (group.c**2).sum())
+            self.assertAlmostEqual(
+                row["main_covariate_sum_product"], (group.m * group.c).sum()
+            )
+
+    def test_optional_columns(self):
+        values = np.array([1.0, np.nan, 3.0])
+        rows = aggregate_units(np.array(["0", "1", "1"]), values)
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "dimension": "",
+                    "variation": "0",
+                    "users": 1,
+                    "count": 1,
+                    "main_sum": 1.0,
+                    "main_sum_squares": 1.0,
+                },
+                {
+                    "dimension": "",
+                    "variation": "1",
+                    "users": 2,
+                    "count": 2,
+                    "main_sum": 3.0,
+                    "main_sum_squares": 9.0,
+                },
+            ],
+        )
+
+    def test_process_single_metric(self):
+        rows = aggregate_units(VARIATION, NUMERATOR, denominator=DENOMINATOR)
+        result = process_single_metric(rows, RATIO_METRIC, [ANALYSIS])
+        variations = result.analyses[0].dimensions[0].variations
+        for i, v in enumerate(variations):
+            in_variation = VARIATION == str(i)
+            self.assertEqual(v.users, in_variation.sum())
+            self.assertAlmostEqual(
+                v.cr, NUMERATOR[in_variation].sum() / DENOMINATOR[in_variation].sum()
+            )
+
+
+class TestChunkedAggregator(TestCase):
+    def test_update_matches_aggregate_units(self):
+        aggregator = ChunkedAggregator(denominator=True)
+        for chunk in np.array_split(np.arange(N), 7):
+            report = aggregator.update(
+                VARIATION[chunk],
+                NUMERATOR[chunk],
+                denominator=DENOMINATOR[chunk],
+                dimension=DIMENSION[chunk],
+            )
+            self.assertEqual(report.rows, len(chunk))
+        expected = aggregate_units(
+            VARIATION, NUMERATOR, denominator=DENOMINATOR, dimension=DIMENSION
+        )
+        rows = aggregator.rows()
+        self.assertEqual(len(rows), len(expected))
+        for row, expected_row in zip(rows, expected):
+            self.assertEqual(row.keys(), expected_row.keys())
+            for k, v in expected_row.items():
+                if isinstance(v, float):
+                    self.assertAlmostEqual(row[k], v)
+                else:
+                    self.assertEqual(row[k], v)
+        self.assertEqual(len(aggregator.reports), 7)
+        self.assertEqual(aggregator.reports[-1].groups, 6)
+
+    def test_mismatched_columns(self):
+        aggregator = ChunkedAggregator()
+        with self.assertRaises(ValueError):
+            aggregator.update(VARIATION, NUMERATOR, denominator=DENOMINATOR)
+
+    def test_duplicate_units(self):
+        aggregator = ChunkedAggregator()
+        aggregator.update(VARIATION[:10], NUMERATOR[:10], unit=np.arange(10))
+        # a unit repeated in a later chunk
+        with self.assertRaises(ValueError):
+            aggregator.update(VARIATION[:10], NUMERATOR[:10], unit=np.arange(9, 19))
+        # and within one chunk
+        with self.assertRaises(ValueError):
+            ChunkedAggregator().update(
+                VARIATION[:3], NUMERATOR[:3], unit=np.array([0, 1, 0])
+            )
+
+    def test_aggregate_delimited_file_units(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "export.csv")
+            pd.DataFrame(
+                {
+                    "unit": np.arange(N) % (N - 1),
+                    "variation": VARIATION,
+                    "value": NUMERATOR,
+                }
+            ).to_csv(path, index=False)
+            with self.assertRaises(ValueError):
+                aggregate_delimited_file(
+                    path,
+                    variation_column="variation",
+                    numerator_column="value",
+                    unit_column="unit",
+                    chunk_size=1000,
+                )
+
+    def test_measure_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "export.csv")
+            pd.DataFrame({"variation": VARIATION, "value": NUMERATOR}).to_csv(
+                path, index=False
+            )
+            kwargs = dict(
+                path=path,
+                variation_column="variation",
+                numerator_column="value",
+                chunk_size=1000,
+            )
+            measured = aggregate_delimited_file(**kwargs, measure_memory=True)
+            unmeasured = aggregate_delimited_file(**kwargs)
+        for report in measured.reports:
+            self.assertIsNotNone(report.peak_chunk_bytes)
+            self.assertGreater(report.peak_chunk_bytes, 0)
+        for report in unmeasured.reports:
+            self.assertIsNone(report.peak_chunk_bytes)
+
+    def test_aggregate_delimited_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "export.tsv")
+            pd.DataFrame(
+                {"variation": VARIATION, "value": NUMERATOR, "browser": DIMENSION}
+            ).to_csv(path, sep="\t", index=False)
+            reports = []
+            aggregator = aggregate_delimited_file(
+                path,
+                variation_column="variation",
+                numerator_column="value",
+                dimension_column="browser",
+                chunk_size=1000,
+                sep="\t",
+                on_chunk=reports.append,
+            )
+        self.assertEqual(len(reports), 5)
+        self.assertEqual(sum(r.rows for r in reports), N)
+        self.assertGreater(reports[-1].max_estimated_chunk_bytes, 0)
+
+        query_rows = aggregator.query_rows()
+        self.assertIn("m0_main_sum", query_rows[0])
+        results, _ = process_experiment_results(
+            {
+                "metrics": {
+                    "count_metric": {
+                        "id": "count_metric",
+                        "name": "count_metric",
+                        "statistic_type": "mean",
+                        "main_metric_type": "count",
+                    }
+                },
+                "analyses": [
+                    {
+                        "var_names": ["zero", "one", "two"],
+                        "var_ids": ["0", "1", "2"],
+                        "weights": [1 / 3] * 3,
+                    }
+                ],
+                "query_results": [{"rows": query_rows, "metrics": ["count_metric"]}],
+            }
+        )
+        dimensions = results[0].analyses[0].dimensions
+        self.assertEqual(sorted(d.dimension for d in dimensions), ["chrome", "safari"])
+        chrome = [d for d in dimensions if d.dimension == "chrome"][0]
+        in_group = (DIMENSION == "chrome") & (VARIATION == "1")
+        self.assertAlmostEqual(chrome.variations[1].cr, NUMERATOR[in_group].mean())
+
+
+if __name__ == "__main__":
+    unittest_main()
+
+
+class TestAggregateQuantiles(TestCase):
+    def test_quantile_units(self):
+        values = RNG.exponential(size=N)
+        values[:10] = np.nan
+        rows = aggregate_quantile_units(VARIATION, values, 0.9, dimension=DIMENSION)
+        self.assertEqual(len(rows), 6)
+        for row in rows:
+            in_group = (DIMENSION == row["dimension"]) & (VARIATION == row["variation"])
+            group_values = values[in_group & ~np.isnan(values)]
+            self.assertEqual(row["users"], in_group.sum())
+            self.assertEqual(row["quantile_n"], len(group_values))
+            nstar = quantile_nstar(len(group_values))
+            self.assertEqual(row["quantile_nstar"], nstar)
+            lower, upper = quantile_bound_values(0.9, 0.05, nstar)
+            np.testing.assert_allclose(
+                [row["quantile"], row["quantile_lower"], row["quantile_upper"]],
+                np.quantile(group_values, [0.9, lower, upper]),
+            )
+
+    def test_grouped_quantiles(self):
+        n_groups = 300
+        codes = RNG.integers(0, n_groups, size=N)
+        codes[codes == 7] = 8
+        values = RNG.exponential(size=N)
+        levels = RNG.uniform(size=(n_groups, 3))
+        argsort = np.argsort
+        with patch("numpy.argsort", wraps=argsort) as sort:
+            quantiles = grouped_quantiles(values, codes, levels)
+        # only the 16 bit group keys are sorted (a radix sort), never values
+        self.assertEqual(sort.call_count, 1)
+        for call in sort.call_args_list:
+            self.assertLessEqual(call.args[0].dtype.itemsize, 2)
+        np.testing.assert_array_equal(quantiles[7], 0)
+        for group in [0, 8, n_groups - 1]:
+            np.testing.assert_allclose(
+                quantiles[group], np.quantile(values[codes == group], levels[group])
+            )
+
+    def test_quantile_events(self):
+        n_events = 20000
+        unit = RNG.integers(0, N, size=n_events)
+        values = RNG.exponential(size=n_events)
+        rows = aggregate_quantile_events(VARIATION[unit], unit, values, 0.5)
+        self.assertEqual(len(rows), 3)
+        df = pd.DataFrame({"variation": VARIATION[unit], "unit": unit, "x": values})
+        for row in rows:
+            group = df[df.variation == row["variation"]]
+            self.assertEqual(row["quantile_n"], len(group))
+            self.assertAlmostEqual(row["quantile"], group.x.median())
+            per_unit = group.groupby("unit").agg(
+                n_below=("x", lambda x: (x <= row["quantile"]).sum()),
+                n=("x", "count"),
+            )
+            self.assertEqual(row["users"], len(per_unit))
+            self.assertAlmostEqual(row["main_sum"], per_unit.n_below.sum())
+            self.assertAlmostEqual(
+                row["main_sum_squares"], (per_unit.n_below**2).sum()
+            )
+            self.assertAlmostEqual(row["denominator_sum"], len(group))
+            self.assertAlmostEqual(
+                row["main_denominator_sum_product"],
+                (per_unit.n_below * per_unit.n).sum(),
+            )
+
+        metric = MetricSettingsForStatsEngine(
+            id="quantile_event",
+            name="quantile_event",
+            statistic_type="quantile_event",
+            main_metric_type="quantile",
+            quantile_value=0.5,
+        )
+        result = process_single_metric(rows, metric, [ANALYSIS])
+        variations = result.analyses[0].dimensions[0].variations
+        self.assertIsNone(variations[1].errorMessage)
+        self.assertGreater(variations[1].uplift.stddev, 0)
+
+
+class TestAggregateGroupingSets(TestCase):
+    def assert_rows_equal(self, rows, expected):
+        self.assertEqual(len(rows), len(expected))
+        for row, expected_row in zip(rows, expected):
+            self.assertEqual(row.keys(), expected_row.keys())
+            for k, v in expected_row.items():
+                if isinstance(v, float):
+                    self.assertAlmostEqual(row[k], v)
+                else:
+                    self.assertEqual(row[k], v)
+
+    def test_grouping_sets(self):
+        country = RNG.choice(["us", "fr", "de", "jp"], size=N)
+        slices = aggregate_grouping_sets(
+            VARIATION,
+            NUMERATOR,
+            {"browser": DIMENSION, "country": country},
+            covariate=COVARIATE,
+            pairs=True,
+        )
+        self.assertEqual(
+            list(slices.keys()),
+            [(), ("browser",), ("country",), ("browser", "country")],
+        )
+        self.assert_rows_equal(
+            slices[()], aggregate_units(VARIATION, NUMERATOR, covariate=COVARIATE)
+        )
+        self.assert_rows_equal(
+            slices[("country",)],
+            aggregate_units(
+                VARIATION, NUMERATOR, covariate=COVARIATE, dimension=country
+            ),
+        )
+        self.assert_rows_equal(
+            slices[("browser", "country")],
+            aggregate_units(
+                VARIATION,
+                NUMERATOR,
+                covariate=COVARIATE,
+                dimension=np.char.add(np.char.add(DIMENSION, ", "), country),
+            ),
+        )
+
+        metric = MetricSettingsForStatsEngine(
+            id="count", name="count", statistic_type="mean", main_metric_type="count"
+        )
+        results = analyze_grouping_sets(slices, metric, [ANALYSIS])
+        dimensions = results[("browser",)].analyses[0].dimensions
+        self.assertEqual(sorted(d.dimension for d in dimensions), ["chrome", "safari"])
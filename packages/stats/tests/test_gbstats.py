@@ -1,6 +1,7 @@
 import dataclasses
 from functools import partial
 from unittest import TestCase, main as unittest_main
+from unittest.mock import patch
 from typing import Dict, Union
 import copy
 import numpy as np
@@ -13,16 +14,29 @@ from gbstats.gbstats import (
     detect_unknown_variations,
     diff_for_daily_time_series,
     reduce_dimensionality,
+    has_quantile_sketches,
     analyze_metric_df,
     get_metric_df,
     format_results,
     variation_statistic_from_metric_row,
     get_bandit_result,
+    get_bandit_results,
     create_bandit_statistics,
     preprocess_bandits,
+    process_analysis,
+    process_sequential_trajectory,
+    analyze_metric_df_all_pairs,
+    slice_pairwise_results,
+    process_single_metric,
+    apply_p_value_corrections,
+    process_experiment_results,
+    process_multiple_experiment_results,
 )
-from gbstats.bayesian.bandits import BanditsSimple
+from gbstats.frequentist.corrections import adjust_p_values_holm_bonferroni
+from gbstats.bayesian.bandits import BanditsSimple, compute_bandit_results
+from gbstats.shrinkage import shrink_effects
 
+from gbstats.models.results import FrequentistVariationResponse
 from gbstats.models.settings import BanditWeightsSinglePeriod
 from gbstats.models.statistics import (
     RegressionAdjustedStatistic,
@@ -31,6 +45,7 @@ from gbstats.models.statistics import (
 )
 
 from gbstats.gbstats import get_var_id_map
+from gbstats.sketch import QuantileSketch
 
 DECIMALS = 9
 round_ = partial(np.round, decimals=DECIMALS)
@@ -301,6 +316,44 @@ RA_STATISTICS_DF = pd.DataFrame(
     ]
 )
 
+QUANTILE_METRIC = MetricSettingsForStatsEngine(
+    id="quantile_metric",
+    name="quantile_metric",
+    inverse=False,
+    statistic_type="quantile_unit",
+    main_metric_type="quantile",
+    quantile_value=0.9,
+)
+
+QUANTILE_SKETCH_VALUES = {
+    (dim, var): np.random.default_rng(i).exponential(
+        scale=1 + var_i, size=2000 * (dim_i + 1)
+    )
+    for i, (dim_i, dim, var_i, var) in enumerate(
+        [
+            (d, dim, v, var)
+            for d, dim in enumerate(["one", "two", "three"])
+            for v, var in enumerate(["zero", "one"])
+        ]
+    )
+}
+
+QUANTILE_SKETCH_STATISTICS_DF = pd.DataFrame(
+    [
+        {
+            "dimension": dim,
+            "variation": var,
+            "users": len(values),
+            "count": len(values),
+            "main_sum": values.sum(),
+            "main_sum_squares": (values**2).sum(),
+            "quantile_n": len(values),
+            "quantile_sketch": QuantileSketch.from_values(values).serialize(),
+        }
+        for (dim, var), values in QUANTILE_SKETCH_VALUES.items()
+    ]
+)
+
 DEFAULT_ANALYSIS = AnalysisSettingsForStatsEngine(
     var_names=["zero", "one"],
     var_ids=["0", "1"],
@@ -549,6 +602,38 @@ class TestReduceDimensionality(TestCase):
             reduced.at[0, "baseline_main_denominator_sum_product"], -900 * 2
         )
 
+    def test_reduce_dimensionality_quantile_sketch(self):
+        analysis = dataclasses.replace(
+            DEFAULT_ANALYSIS, var_ids=["zero", "one"], max_dimensions=2
+        )
+        result = process_analysis(
+            rows=QUANTILE_SKETCH_STATISTICS_DF,
+            var_id_map=get_var_id_map(analysis.var_ids),
+            metric=QUANTILE_METRIC,
+            analysis=analysis,
+        )
+        self.assertEqual(len(result.index), 2)
+        self.assertEqual(result.at[1, "dimension"], "(other)")
+        other_values = np.concatenate(
+            [QUANTILE_SKETCH_VALUES[(d, "one")] for d in ["one", "two"]]
+        )
+        self.assertEqual(result.at[1, "v1_quantile_n"], len(other_values))
+        self.assertAlmostEqual(
+            result.at[1, "v1_mean"], np.quantile(other_values, 0.9), delta=0.05
+        )
+
+    def test_reduce_dimensionality_missing_quantile_sketch(self):
+        analysis = dataclasses.replace(
+            DEFAULT_ANALYSIS, var_ids=["zero", "one"], max_dimensions=2
+        )
+        rows = QUANTILE_SKETCH_STATISTICS_DF.copy()
+        rows.loc[rows["dimension"] == "one", "quantile_sketch"] = None
+        self.assertFalse(has_quantile_sketches(rows))
+        # sketch-less rows cannot be merged; process_analysis drops "(other)"
+        df = get_metric_df(rows, get_var_id_map(analysis.var_ids), analysis.var_names)
+        with self.assertRaises(ValueError):
+            reduce_dimensionality(df, max=2)
+
 
 class TestAnalyzeMetricDfBayesian(TestCase):
     # New usage (no mean/stddev correction)
@@ -599,6 +684,44 @@ class TestAnalyzeMetricDfBayesian(TestCase):
         self.assertEqual(round_(result.at[0, "v1_prob_beat_baseline"]), 1 - 0.071834168)
         self.assertEqual(result.at[0, "v1_p_value"], None)
 
+    def test_probability_best(self):
+        rows = MULTI_DIMENSION_STATISTICS_DF
+        df = get_metric_df(rows, {"zero": 0, "one": 1}, ["zero", "one"])
+        for inverse in [False, True]:
+            result = analyze_metric_df(
+                df.copy(),
+                metric=dataclasses.replace(COUNT_METRIC, inverse=inverse),
+                analysis=DEFAULT_ANALYSIS,
+            )
+            # with two arms, being best is beating the baseline
+            for _, row in result.iterrows():
+                self.assertAlmostEqual(
+                    row["v1_prob_best"], row["v1_prob_beat_baseline"], places=6
+                )
+                self.assertAlmostEqual(
+                    row["baseline_prob_best"] + row["v1_prob_best"], 1
+                )
+            dimensions = format_results(result, 1)
+            self.assertEqual(
+                dimensions[0].probabilityBest,
+                [result.at[0, "v1_prob_best"], result.at[0, "baseline_prob_best"]],
+            )
+            self.assertEqual(len(dimensions[0].expectedLoss), 2)
+
+        frequentist = analyze_metric_df(
+            df.copy(),
+            metric=COUNT_METRIC,
+            analysis=dataclasses.replace(DEFAULT_ANALYSIS, stats_engine="frequentist"),
+        )
+        self.assertIsNone(format_results(frequentist, 0)[0].probabilityBest)
+
+    def test_probability_best_failed_variation(self):
+        df = get_metric_df(ONE_USER_DF, {"zero": 0, "one": 1}, ["zero", "one"])
+        result = analyze_metric_df(df, metric=COUNT_METRIC, analysis=DEFAULT_ANALYSIS)
+        dimension = format_results(result)[0]
+        self.assertEqual(dimension.probabilityBest, [1, None])
+        self.assertIsNone(dimension.expectedLoss[1])
+
     def test_get_metric_df_zero_val(self):
         rows = ONE_USER_DF
         df = get_metric_df(rows, {"zero": 0, "one": 1}, ["zero", "one"])
@@ -810,6 +933,344 @@ class TestAnalyzeMetricDfSequential(TestCase):
         self.assertTrue(result.at[0, "v1_ci"][0] > result_bad_tuning.at[0, "v1_ci"][0])
 
 
+class TestProcessSequentialTrajectory(TestCase):
+    def test_trajectory_matches_per_date_sequential(self):
+        rows = MULTI_DIMENSION_STATISTICS_DF.copy()
+        rows["dimension"] = rows["dimension"].replace(
+            ["one", "two"], ["2022-01-01", "2022-01-02"]
+        )
+        analysis = dataclasses.replace(DEFAULT_ANALYSIS, var_ids=["zero", "one"])
+        sequential_analysis = dataclasses.replace(
+            analysis,
+            stats_engine="frequentist",
+            sequential_testing_enabled=True,
+        )
+        # dates are sorted before the trajectory is computed
+        result = process_sequential_trajectory(
+            rows.iloc[::-1].to_dict("records"), COUNT_METRIC, analysis
+        )
+        per_date = analyze_metric_df(
+            get_metric_df(rows, {"zero": 0, "one": 1}, ["zero", "one"]),
+            metric=COUNT_METRIC,
+            analysis=sequential_analysis,
+        )
+
+        self.assertEqual([r.dimension for r in result], ["2022-01-01", "2022-01-02"])
+        first, second = result[0].variations[1], result[1].variations[1]
+        self.assertEqual(first.pValue, per_date.at[0, "v1_p_value"])
+        self.assertEqual(list(first.ci), per_date.at[0, "v1_ci"])
+        self.assertEqual(
+            second.pValue,
+            min(per_date.at[0, "v1_p_value"], per_date.at[1, "v1_p_value"]),
+        )
+        self.assertEqual(
+            list(second.ci),
+            [
+                max(per_date.at[0, "v1_ci"][0], per_date.at[1, "v1_ci"][0]),
+                min(per_date.at[0, "v1_ci"][1], per_date.at[1, "v1_ci"][1]),
+            ],
+        )
+        self.assertFalse(second.ciIntersectionEmpty)
+
+    def test_trajectory_empty(self):
+        self.assertEqual(
+            process_sequential_trajectory([], COUNT_METRIC, DEFAULT_ANALYSIS), []
+        )
+
+
+class TestApplyPValueCorrections(TestCase):
+    def test_corrections_across_metrics_and_dimensions(self):
+        analyses = [
+            dataclasses.replace(
+                DEFAULT_ANALYSIS,
+                var_ids=["zero", "one"],
+                stats_engine="frequentist",
+                dimension="exp:country",
+                p_value_correction="holm-bonferroni",
+            ),
+            dataclasses.replace(
+                DEFAULT_ANALYSIS, var_ids=["zero", "one"], stats_engine="frequentist"
+            ),
+        ]
+        results = [
+            process_single_metric(
+                MULTI_DIMENSION_STATISTICS_DF.to_dict("records"),
+                COUNT_METRIC,
+                analyses,
+            ),
+            process_single_metric(
+                RATIO_STATISTICS_DF.to_dict("records"), RATIO_METRIC, analyses
+            ),
+        ]
+        apply_p_value_corrections(results, analyses)
+
+        corrected = [
+            v
+            for r in results
+            for d in r.analyses[0].dimensions
+            for v in d.variations[1:]
+        ]
+        self.assertEqual(len(corrected), 3)
+        np.testing.assert_allclose(
+            [v.pValueAdjusted for v in corrected],
+            adjust_p_values_holm_bonferroni([v.pValue for v in corrected]),
+        )
+        for v in corrected:
+            self.assertGreaterEqual(v.pValueAdjusted, v.pValue)
+            if v.ciAdjusted[0] is not None:
+                self.assertLessEqual(v.ciAdjusted[0], v.ci[0])
+                self.assertGreaterEqual(v.ciAdjusted[1], v.ci[1])
+
+        for r in results:
+            for d in r.analyses[1].dimensions:
+                self.assertIsNone(d.variations[1].pValueAdjusted)
+                self.assertIsNone(d.variations[1].ciAdjusted)
+
+    def test_sequential_intervals_are_not_adjusted(self):
+        analyses = [
+            dataclasses.replace(
+                DEFAULT_ANALYSIS,
+                var_ids=["zero", "one"],
+                stats_engine="frequentist",
+                dimension="exp:country",
+                sequential_testing_enabled=True,
+                p_value_correction="benjamini-hochberg",
+            )
+        ]
+        results = [
+            process_single_metric(
+                MULTI_DIMENSION_STATISTICS_DF.to_dict("records"),
+                COUNT_METRIC,
+                analyses,
+            )
+        ]
+        apply_p_value_corrections(results, analyses)
+        for d in results[0].analyses[0].dimensions:
+            self.assertIsNotNone(d.variations[1].pValueAdjusted)
+            self.assertIsNone(d.variations[1].dof)
+            self.assertIsNone(d.variations[1].ciAdjusted)
+
+
+class TestAnalyzeMetricDfAllPairs(TestCase):
+    def setUp(self):
+        third = MULTI_DIMENSION_STATISTICS_DF[
+            MULTI_DIMENSION_STATISTICS_DF["variation"] == "one"
+        ].copy()
+        third["variation"] = "two"
+        third["main_sum"] = third["main_sum"] * 1.1
+        third["main_sum_squares"] = third["main_sum_squares"] * 1.2
+        self.rows = pd.concat([MULTI_DIMENSION_STATISTICS_DF, third])
+        # built here since other tests modify RA_STATISTICS_DF in place
+        self.ra_rows = pd.DataFrame(
+            [
+                {
+                    "dimension": "All",
+                    "variation": variation,
+                    "main_sum": main_sum,
+                    "main_sum_squares": 555 + main_sum,
+                    "covariate_sum": covariate_sum,
+                    "covariate_sum_squares": 405,
+                    "main_covariate_sum_product": product,
+                    "users": 3000,
+                    "count": 3000,
+                }
+                for variation, main_sum, covariate_sum, product in [
+                    ("zero", 300, 210, -20),
+                    ("one", 222, 120, -10),
+                    ("two", 250, 150, 5),
+                ]
+            ]
+        )
+        self.var_names = ["zero", "one", "two"]
+        self.analysis = dataclasses.replace(
+            DEFAULT_ANALYSIS,
+            var_names=self.var_names,
+            var_ids=self.var_names,
+            weights=[0.2, 0.3, 0.5],
+        )
+
+    def assert_slices_match_reruns(self, rows, metric, analysis):
+        pairs = analyze_metric_df_all_pairs(
+            get_metric_df(rows, get_var_id_map(self.var_names), self.var_names),
+            metric=metric,
+            analysis=analysis,
+        )
+        for baseline in range(3):
+            # a rerun puts the baseline variation first
+            order = [baseline] + [i for i in range(3) if i != baseline]
+            var_names = [self.var_names[i] for i in order]
+            rerun = analyze_metric_df(
+                get_metric_df(rows, get_var_id_map(var_names), var_names),
+                metric=metric,
+                analysis=dataclasses.replace(
+                    analysis,
+                    var_names=var_names,
+                    var_ids=var_names,
+                    weights=[analysis.weights[i] for i in order],
+                ),
+            )
+            sliced = slice_pairwise_results(pairs, baseline, metric, analysis)
+            pd.testing.assert_frame_equal(sliced, rerun, check_like=True)
+            self.assertEqual(
+                format_results(sliced, baseline), format_results(rerun, baseline)
+            )
+
+    def test_frequentist(self):
+        self.assert_slices_match_reruns(
+            self.rows,
+            COUNT_METRIC,
+            dataclasses.replace(self.analysis, stats_engine="frequentist"),
+        )
+
+    def test_bayesian(self):
+        self.assert_slices_match_reruns(self.rows, COUNT_METRIC, self.analysis)
+
+    def test_process_analysis_all_pairs(self):
+        analysis = dataclasses.replace(self.analysis, stats_engine="frequentist")
+        pairs = process_analysis(
+            self.rows, get_var_id_map(self.var_names), COUNT_METRIC, analysis, True
+        )
+        self.assertEqual(len(pairs.at[0, "pairwise"]), 6)
+        pd.testing.assert_frame_equal(
+            slice_pairwise_results(pairs, 0, COUNT_METRIC, analysis),
+            process_analysis(
+                self.rows, get_var_id_map(self.var_names), COUNT_METRIC, analysis
+            ),
+            check_like=True,
+        )
+
+    def test_process_single_metric_all_baselines(self):
+        weights = [0.2, 0.3, 0.5]
+
+        # settings as the back end builds them: the baseline variation first
+        def baseline_analysis(baseline, stats_engine, all_baselines=False):
+            order = [baseline] + [i for i in range(3) if i != baseline]
+            return dataclasses.replace(
+                self.analysis,
+                var_names=[self.var_names[i] for i in order],
+                var_ids=[self.var_names[i] for i in order],
+                weights=[weights[i] for i in order],
+                baseline_index=baseline,
+                stats_engine=stats_engine,
+                all_baselines=all_baselines,
+            )
+
+        rows = self.rows.to_dict("records")
+        for stats_engine in ["bayesian", "frequentist"]:
+            (result,) = process_single_metric(
+                rows, COUNT_METRIC, [baseline_analysis(1, stats_engine, True)]
+            ).analyses
+            reruns = [
+                process_single_metric(
+                    rows, COUNT_METRIC, [baseline_analysis(b, stats_engine)]
+                )
+                .analyses[0]
+                .dimensions
+                for b in range(3)
+            ]
+            self.assertEqual(len(result.dimensionsByBaseline), len(reruns))
+            for dimensions, rerun in zip(result.dimensionsByBaseline, reruns):
+                self.assert_dimensions_match(dimensions, rerun)
+            self.assert_dimensions_match(result.dimensions, reruns[1])
+
+    # sliced and rerun results sum in different orders, so compare rounded
+    def assert_dimensions_match(self, dimensions, expected):
+        def rounded(value):
+            if isinstance(value, float):
+                return round_(value)
+            if isinstance(value, dict):
+                return {k: rounded(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [rounded(v) for v in value]
+            return value
+
+        self.assertEqual(
+            rounded([dataclasses.asdict(d) for d in dimensions]),
+            rounded([dataclasses.asdict(d) for d in expected]),
+        )
+
+    def test_all_baselines_p_value_corrections(self):
+        analysis = dataclasses.replace(
+            self.analysis,
+            stats_engine="frequentist",
+            p_value_correction="holm-bonferroni",
+            all_baselines=True,
+        )
+        results = [
+            process_single_metric(
+                self.rows.to_dict("records"), COUNT_METRIC, [analysis]
+            )
+        ]
+        apply_p_value_corrections(results, [analysis])
+        (result,) = results[0].analyses
+        # the requested baseline's dimensions are corrected with its family
+        self.assertIs(result.dimensions[0], result.dimensionsByBaseline[0][0])
+        # each baseline is corrected as its own family of comparisons
+        for dimensions in result.dimensionsByBaseline:
+            responses = [
+                v
+                for d in dimensions
+                for v in d.variations
+                if isinstance(v, FrequentistVariationResponse)
+            ]
+            np.testing.assert_allclose(
+                [v.pValueAdjusted for v in responses],
+                adjust_p_values_holm_bonferroni([v.pValue for v in responses]),
+            )
+
+    def test_regression_adjustment(self):
+        self.assert_slices_match_reruns(
+            self.ra_rows,
+            RA_METRIC,
+            dataclasses.replace(self.analysis, stats_engine="frequentist"),
+        )
+
+
+class TestDimensionShrinkage(TestCase):
+    def test_process_analysis(self):
+        for stats_engine in ["bayesian", "frequentist"]:
+            for method in ["method-of-moments", "reml"]:
+                analysis = dataclasses.replace(
+                    DEFAULT_ANALYSIS,
+                    var_ids=["zero", "one"],
+                    stats_engine=stats_engine,
+                    dimension_shrinkage=method,
+                )
+                result = process_analysis(
+                    rows=MULTI_DIMENSION_STATISTICS_DF,
+                    var_id_map=get_var_id_map(analysis.var_ids),
+                    metric=COUNT_METRIC,
+                    analysis=analysis,
+                )
+                uplift = list(result["v1_uplift"])
+                shrunk, lower, upper = shrink_effects(
+                    np.array([[u["mean"]] for u in uplift]),
+                    np.array([[u["stddev"] ** 2] for u in uplift]),
+                    method,
+                )
+                dimensions = format_results(result)
+                for d in range(2):
+                    variation = dimensions[d].variations[1]
+                    self.assertEqual(variation.expectedShrunk, shrunk[d, 0])
+                    self.assertEqual(
+                        list(variation.ciShrunk), [lower[d, 0], upper[d, 0]]
+                    )
+                    # the unshrunk effect is still reported
+                    self.assertEqual(variation.expected, result.at[d, "v1_expected"])
+
+    def test_disabled(self):
+        analysis = dataclasses.replace(DEFAULT_ANALYSIS, var_ids=["zero", "one"])
+        result = process_analysis(
+            rows=MULTI_DIMENSION_STATISTICS_DF,
+            var_id_map=get_var_id_map(analysis.var_ids),
+            metric=COUNT_METRIC,
+            analysis=analysis,
+        )
+        for dimension in format_results(result):
+            self.assertIsNone(dimension.variations[1].expectedShrunk)
+            self.assertIsNone(dimension.variations[1].ciShrunk)
+
+
 class TestFormatResults(TestCase):
     def test_format_results_denominator(self):
         rows = RATIO_STATISTICS_DF
@@ -898,5 +1359,83 @@ class TestBandit(TestCase):
             assert 1 > 2, "wrong class"
 
 
+class TestBanditBatch(TestCase):
+    def setUp(self):
+        self.rows = [{**r, "dimension": ""} for r in QUERY_OUTPUT_BANDITS]
+
+    def experiment(self, id: str, seed: int, inverse: bool = False, bandit=True):
+        data = {
+            "metrics": {
+                "count_metric": {**dataclasses.asdict(COUNT_METRIC), "inverse": inverse}
+            },
+            "analyses": [{**dataclasses.asdict(DEFAULT_ANALYSIS), "dimension": ""}],
+            "query_results": [{"rows": self.rows, "metrics": ["count_metric"]}],
+        }
+        if bandit:
+            data["bandit_settings"] = {
+                **dataclasses.asdict(BANDIT_ANALYSIS),
+                "bandit_weights_seed": seed,
+            }
+        return {"id": id, "data": data}
+
+    def test_get_bandit_results(self):
+        metric = dataclasses.replace(COUNT_METRIC, inverse=True)
+        bandits = [
+            preprocess_bandits(self.rows, m, BANDIT_ANALYSIS, 0.05, "")
+            for m in [COUNT_METRIC, metric]
+        ]
+        results = get_bandit_results(bandits + [None], [BANDIT_ANALYSIS] * 3)
+        self.assertEqual(
+            results[:2],
+            [
+                get_bandit_result(self.rows, m, DEFAULT_ANALYSIS, BANDIT_ANALYSIS)
+                for m in [COUNT_METRIC, metric]
+            ],
+        )
+        self.assertEqual(results[0].updateMessage, "successfully updated")
+        self.assertNotEqual(results[0].updatedWeights, results[1].updatedWeights)
+        self.assertEqual(results[2].error, "no rows")
+
+    def test_process_multiple_experiment_results(self):
+        data = [
+            self.experiment("a", 1),
+            self.experiment("b", 2, inverse=True),
+            self.experiment("c", 3, bandit=False),
+            {"id": "d", "data": {}},
+        ]
+        results = process_multiple_experiment_results(data)
+        self.assertEqual([r.id for r in results], ["a", "b", "c", "d"])
+        for r, exp in zip(results[:3], data):
+            self.assertIsNone(r.error)
+            expected, bandit_result = process_experiment_results(exp["data"])
+            self.assertEqual(r.banditResult, bandit_result)
+            self.assertEqual(r.results, expected)
+        self.assertIsNotNone(results[0].banditResult)
+        self.assertIsNone(results[2].banditResult)
+        self.assertIsNotNone(results[3].error)
+
+    def test_failed_bandit_keeps_metric_results(self):
+        data = [self.experiment("a", 1), self.experiment("b", 2, inverse=True)]
+
+        # fails for the inverse bandit of experiment b only
+        def compute(bandits):
+            if any(b.inverse for b in bandits):
+                raise ValueError("bandit failed")
+            return compute_bandit_results(bandits)
+
+        with patch("gbstats.gbstats.compute_bandit_results", side_effect=compute):
+            results = process_multiple_experiment_results(data)
+        expected_a, bandit_result_a = process_experiment_results(data[0]["data"])
+        self.assertEqual(results[0].banditResult, bandit_result_a)
+        expected_b, _ = process_experiment_results(data[1]["data"])
+        self.assertIsNone(results[1].error)
+        self.assertEqual(results[1].results, expected_b)
+        self.assertEqual(results[1].banditResult.error, "bandit failed")
+        self.assertEqual(results[1].banditResult.updateMessage, "not updated")
+        self.assertEqual(
+            results[1].banditResult.updatedWeights, BANDIT_ANALYSIS.current_weights
+        )
+
+
 if __name__ == "__main__":
     unittest_main()
@@ -0,0 +1,203 @@
+from unittest import TestCase, main as unittest_main
+
+import numpy as np
+
+from gbstats.gbstats import process_single_metric
+from gbstats.incremental import IncrementalQueryState
+from gbstats.models.settings import (
+    AnalysisSettingsForStatsEngine,
+    MetricSettingsForStatsEngine,
+)
+from gbstats.sketch import QuantileSketch, merge_serialized_sketches
+
+METRIC = MetricSettingsForStatsEngine(
+    id="count_metric",
+    name="count_metric",
+    inverse=False,
+    statistic_type="mean",
+    main_metric_type="count",
+)
+
+ANALYSIS = AnalysisSettingsForStatsEngine(
+    var_names=["zero", "one"],
+    var_ids=["zero", "one"],
+    weights=[0.5, 0.5],
+)
+
+# rows for units first exposed on each of two days
+DAILY_ROWS = [
+    [
+        {
+            "dimension": dimension,
+            "variation": variation,
+            "main_sum": main_sum * scale,
+            "main_sum_squares": main_sum * scale * 3.5,
+            "users": users * scale,
+            "count": users * scale,
+        }
+        for dimension, variation, main_sum, users in [
+            ("one", "zero", 135.5, 50),
+            ("one", "one", 150.25, 60),
+            ("two", "zero", 370.75, 100),
+            ("two", "one", 385, 110),
+        ]
+    ]
+    for scale in [1, 2]
+]
+WINDOWS = [("2024-01-01", "2024-01-02"), ("2024-01-02", "2024-01-03")]
+
+
+def cumulative_rows(daily_rows):
+    totals = {}
+    for rows in daily_rows:
+        for row in rows:
+            key = (row["dimension"], row["variation"])
+            total = totals.setdefault(key, {"dimension": key[0], "variation": key[1]})
+            for col, value in row.items():
+                if col not in ["dimension", "variation"]:
+                    total[col] = total.get(col, 0) + value
+    return list(totals.values())
+
+
+class TestIncrementalQueryState(TestCase):
+    def test_matches_full_recomputation(self):
+        state = IncrementalQueryState()
+        for rows, window in zip(DAILY_ROWS, WINDOWS):
+            state = IncrementalQueryState.deserialize(state.serialize())
+            state.update(rows, window)
+        for stats_engine in ["bayesian", "frequentist"]:
+            analyses = [
+                AnalysisSettingsForStatsEngine(
+                    var_names=ANALYSIS.var_names,
+                    var_ids=ANALYSIS.var_ids,
+                    weights=ANALYSIS.weights,
+                    stats_engine=stats_engine,
+                )
+            ]
+            self.assertEqual(
+                process_single_metric(state.rows(), METRIC, analyses),
+                process_single_metric(cumulative_rows(DAILY_ROWS), METRIC, analyses),
+            )
+
+    def test_serialize(self):
+        state = IncrementalQueryState()
+        state.update(DAILY_ROWS[0], WINDOWS[0])
+        restored = IncrementalQueryState.deserialize(state.serialize())
+        self.assertEqual(restored.rows(), state.rows())
+        restored.update(DAILY_ROWS[1], WINDOWS[1])
+        self.assertEqual(restored.rows(), cumulative_rows(DAILY_ROWS))
+
+    def test_bandit_periods_are_groups(self):
+        periods = [
+            [{**row, "bandit_period": period, "theta": 0.5 + period} for row in rows]
+            for period, rows in enumerate(DAILY_ROWS)
+        ]
+        state = IncrementalQueryState()
+        for rows, window in zip(periods, WINDOWS):
+            state.update(rows, window)
+        self.assertEqual(state.rows(), periods[0] + periods[1])
+        with self.assertRaises(ValueError):
+            state.update([{**periods[0][0], "theta": 0.7}], WINDOWS[0])
+
+    def test_quantile_sketches(self):
+        rng = np.random.default_rng(3)
+        sketches = [
+            QuantileSketch.from_values(rng.exponential(size=500)).serialize()
+            for _ in range(2)
+        ]
+        state = IncrementalQueryState()
+        for sketch, window in zip(sketches, WINDOWS):
+            state.update(
+                [
+                    {
+                        "dimension": "All",
+                        "variation": "zero",
+                        "users": 500,
+                        "count": 500,
+                        "main_sum": 0,
+                        "main_sum_squares": 0,
+                        "quantile_n": 500,
+                        "quantile": 0.7,
+                        "quantile_sketch": sketch,
+                    }
+                ],
+                window,
+            )
+        (row,) = state.rows()
+        self.assertEqual(row["quantile_n"], 1000)
+        self.assertNotIn("quantile", row)
+        self.assertEqual(row["quantile_sketch"], merge_serialized_sketches(sketches))
+
+    def test_quantiles_require_sketches(self):
+        row = {"dimension": "All", "variation": "zero", "users": 5, "quantile": 0.7}
+        with self.assertRaises(ValueError):
+            IncrementalQueryState().update([row], WINDOWS[0])
+
+    def test_unknown_column(self):
+        row = {"dimension": "All", "variation": "zero", "users": 5, "p_value": 0.7}
+        with self.assertRaises(ValueError):
+            IncrementalQueryState().update([row], WINDOWS[0])
+
+    def test_returning_unit_matches_full_recomputation(self):
+        # per-unit values in each window, keyed by the window of first exposure
+        units = [
+            ("one", "zero", 0, [3.0, 4.0]),
+            ("one", "zero", 0, [1.0, 0.0]),
+            ("one", "one", 0, [2.0, 0.0]),
+            ("one", "one", 1, [0.0, 5.0]),
+            ("one", "zero", 1, [0.0, 2.5]),
+            ("one", "one", 1, [0.0, 1.5]),
+        ]
+
+        def unit_rows(units, periods):
+            totals = {}
+            for dimension, variation, _, values in units:
+                total = totals.setdefault(
+                    (dimension, variation),
+                    {
+                        "dimension": dimension,
+                        "variation": variation,
+                        "main_sum": 0.0,
+                        "main_sum_squares": 0.0,
+                        "users": 0,
+                        "count": 0,
+                    },
+                )
+                value = sum(values[:periods])
+                total["main_sum"] += value
+                total["main_sum_squares"] += value**2
+                total["users"] += 1
+                total["count"] += 1
+            return list(totals.values())
+
+        def cohort(window):
+            return [unit for unit in units if unit[2] == window]
+
+        state = IncrementalQueryState()
+        state.update(unit_rows(cohort(0), 1), WINDOWS[0])
+        # the first unit returns in the second window; its cohort is refreshed
+        state.update(unit_rows(cohort(1), 2), WINDOWS[1])
+        state.update(unit_rows(cohort(0), 2), WINDOWS[0])
+        analyses = [ANALYSIS]
+        self.assertEqual(
+            process_single_metric(state.rows(), METRIC, analyses),
+            process_single_metric(unit_rows(units, 2), METRIC, analyses),
+        )
+        # adding the returning unit's second-window values on top would
+        # understate its sum of squares: 3^2 + 4^2 < (3 + 4)^2
+        (row,) = [r for r in state.rows() if r["variation"] == "zero"]
+        self.assertEqual(row["main_sum_squares"], 7.0**2 + 1.0**2 + 2.5**2)
+
+    def test_overlapping_windows(self):
+        state = IncrementalQueryState()
+        state.update(DAILY_ROWS[0], ("2024-01-01", "2024-01-03"))
+        for window in [("2024-01-02", "2024-01-04"), ("2024-01-01", "2024-01-02")]:
+            with self.assertRaises(ValueError):
+                state.update(DAILY_ROWS[1], window)
+        with self.assertRaises(ValueError):
+            state.update(DAILY_ROWS[1], ("2024-01-04", "2024-01-04"))
+        self.assertEqual(state.rows(), DAILY_ROWS[0])
+
+
+if __name__ == "__main__":
+    unittest_main()
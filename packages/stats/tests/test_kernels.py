@@ -0,0 +1,76 @@
+from unittest import TestCase, main as unittest_main
+
+import numpy as np
+from scipy.stats import chi2, norm, t
+
+from gbstats import kernels
+from gbstats.utils import check_srm
+
+X = np.array([-3.5, -1.2, 0.0, 0.4, 2.7])
+Q = np.array([0.001, 0.025, 0.5, 0.9, 0.999])
+DF = np.array([1, 2.5, 30, 1000, np.inf])
+
+
+class TestKernels(TestCase):
+    def test_norm(self):
+        np.testing.assert_array_equal(
+            kernels.norm_cdf(X, 0.3, 1.7), norm.cdf(X, 0.3, 1.7)
+        )
+        np.testing.assert_array_equal(
+            kernels.norm_sf(X, 0.3, 1.7), norm.sf(X, 0.3, 1.7)
+        )
+        np.testing.assert_array_equal(
+            kernels.norm_ppf(Q, 0.3, 1.7), norm.ppf(Q, 0.3, 1.7)
+        )
+        self.assertEqual(kernels.norm_sf(0, 0.2, 0.1), norm.sf(0, 0.2, 0.1))
+
+    def test_norm_pdf(self):
+        np.testing.assert_allclose(
+            kernels.norm_pdf(X, 0.3, 1.7), norm.pdf(X, 0.3, 1.7), rtol=1e-14
+        )
+
+    def test_norm_partial_expectation(self):
+        z = np.array([-6.0, -1.5, 0.0, 0.4, 5.0])
+        np.testing.assert_allclose(
+            kernels.norm_partial_expectation(z),
+            norm.pdf(z) + z * norm.cdf(z),
+            rtol=1e-9,
+        )
+        # E[max(Z + z, 0)] - E[max(-Z - z, 0)] = z
+        np.testing.assert_allclose(
+            kernels.norm_partial_expectation(z) - kernels.norm_partial_expectation(-z),
+            z,
+        )
+        # lower tail is positive and continuous with its asymptote phi(z) / z^2
+        tail = kernels.norm_partial_expectation(np.array([-30.0, -40.0]))
+        self.assertAlmostEqual(tail[0] / (norm.pdf(30) / 900), 1, places=2)
+        self.assertEqual(tail[1], 0)
+
+    def test_t(self):
+        np.testing.assert_array_equal(kernels.t_cdf(X, DF), t.cdf(X, DF))
+        np.testing.assert_array_equal(kernels.t_ppf(Q, DF), t.ppf(Q, DF))
+        self.assertEqual(kernels.t_ppf(0.975, 12.3), t.ppf(0.975, 12.3))
+
+    def test_chi2(self):
+        x = np.abs(X) * 3
+        np.testing.assert_allclose(kernels.chi2_sf(x, 3), chi2.sf(x, 3))
+        np.testing.assert_allclose(kernels.chi2_cdf(x, 3), chi2.cdf(x, 3))
+        self.assertEqual(kernels.chi2_sf(-1, 2), 1)
+        self.assertEqual(kernels.chi2_cdf(-1, 2), 0)
+        self.assertTrue(np.isnan(kernels.chi2_sf(2.0, 0)))
+
+    def test_scalar_results_are_floats(self):
+        self.assertIs(type(kernels.norm_cdf(0.0, 0.3, 1.7)), float)
+        self.assertIs(type(kernels.t_ppf(0.975, 12.3)), float)
+        self.assertIs(type(kernels.chi2_sf(2.0, 0)), float)
+        self.assertIs(type(check_srm([100], [1.0])), float)
+        self.assertIsInstance(kernels.norm_cdf(0.0, X, 1.7), np.ndarray)
+        self.assertIsInstance(kernels.chi2_sf(np.array([2.0]), 0), np.ndarray)
+
+    def test_two_sided_z(self):
+        self.assertEqual(kernels.two_sided_z(0.05), norm.ppf(0.975))
+        self.assertEqual(kernels.Z_975, norm.ppf(0.975))
+
+
+if __name__ == "__main__":
+    unittest_main()
@@ -12,6 +12,12 @@ from gbstats.models.statistics import (
     SampleMeanStatistic,
     compute_theta,
 )
+from gbstats.utils import (
+    ratio_covariance,
+    ratio_mean,
+    ratio_variance,
+    relative_effect_variance,
+)
 
 N = 4
 METRIC_1 = np.array([0.3, 0.5, 0.9, 22])
@@ -83,6 +89,60 @@ class TestRatioStatistic(TestCase):
         self.assertEqual(stat.variance, 0)
 
 
+class TestRatioKernels(TestCase):
+    def test_grid_matches_ratio_statistic(self):
+        # variations x dimensions, with an empty denominator and n <= 1 cells
+        rng = np.random.default_rng(20)
+        n = rng.integers(2, 100, size=(3, 4))
+        n[0, 1] = 1
+        n[2, 3] = 0
+        m_sum = rng.uniform(0, 50, size=n.shape)
+        d_sum = rng.uniform(1, 50, size=n.shape)
+        d_sum[1, 2] = 0
+        m_sum_squares = m_sum**2 / np.maximum(n, 1) + rng.uniform(1, 5, n.shape)
+        d_sum_squares = d_sum**2 / np.maximum(n, 1) + rng.uniform(1, 5, n.shape)
+        products = m_sum * d_sum / np.maximum(n, 1) + rng.uniform(-1, 1, n.shape)
+        stats = [
+            [
+                RatioStatistic(
+                    n=n[i, j],
+                    m_statistic=SampleMeanStatistic(
+                        n=n[i, j], sum=m_sum[i, j], sum_squares=m_sum_squares[i, j]
+                    ),
+                    d_statistic=SampleMeanStatistic(
+                        n=n[i, j], sum=d_sum[i, j], sum_squares=d_sum_squares[i, j]
+                    ),
+                    m_d_sum_of_products=products[i, j],
+                )
+                for j in range(n.shape[1])
+            ]
+            for i in range(n.shape[0])
+        ]
+        m_mean = np.array([[s.m_statistic.mean for s in row] for row in stats])
+        d_mean = np.array([[s.d_statistic.mean for s in row] for row in stats])
+        m_var = np.array([[s.m_statistic.variance for s in row] for row in stats])
+        d_var = np.array([[s.d_statistic.variance for s in row] for row in stats])
+
+        covariance = ratio_covariance(products, m_sum, d_sum, n)
+        np.testing.assert_allclose(
+            covariance, [[s.covariance for s in row] for row in stats]
+        )
+        np.testing.assert_allclose(
+            ratio_variance(m_mean, m_var, d_mean, d_var, covariance, n),
+            [[s.variance for s in row] for row in stats],
+        )
+        np.testing.assert_allclose(
+            ratio_mean(m_sum, d_sum), [[s.mean for s in row] for row in stats]
+        )
+        self.assertEqual(ratio_variance(m_mean, m_var, d_mean, d_var, 0, n)[1, 2], 0)
+
+    def test_relative_effect_variance(self):
+        self.assertAlmostEqual(
+            relative_effect_variance(2.0, 4.0, 100, 3.0, 9.0, 50),
+            (9.0 / 50) / 4 + (4.0 / 100) * 9 / 16,
+        )
+
+
 class TestRegressionAdjustedStatistic(TestCase):
     def test_regression_adjusted_statistic(self):
         pre_stat = SampleMeanStatistic(
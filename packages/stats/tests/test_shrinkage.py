@@ -0,0 +1,114 @@
+from unittest import TestCase, main as unittest_main
+
+import numpy as np
+from scipy.optimize import minimize_scalar
+
+from gbstats.shrinkage import (
+    between_dimension_variance_moments,
+    between_dimension_variance_reml,
+    shrink_effects,
+)
+
+RNG = np.random.default_rng(20)
+VARIANCES = RNG.uniform(0.001, 0.05, (30, 2))
+EFFECTS = (
+    0.1 + RNG.normal(0, 0.1, (30, 2)) + RNG.normal(0, 1, (30, 2)) * np.sqrt(VARIANCES)
+)
+VALID = np.ones((30, 2), dtype=bool)
+
+
+def reml_by_optimization(y, v):
+    def negative_restricted_log_likelihood(tau2):
+        w = 1 / (v + tau2)
+        mu = np.sum(w * y) / np.sum(w)
+        return np.sum(np.log(v + tau2)) + np.log(np.sum(w)) + np.sum(w * (y - mu) ** 2)
+
+    return minimize_scalar(
+        negative_restricted_log_likelihood,
+        bounds=(0, 1),
+        method="bounded",
+        options={"xatol": 1e-12},
+    ).x
+
+
+class TestBetweenDimensionVariance(TestCase):
+    def test_moments(self):
+        for j in range(2):
+            y, v = EFFECTS[:, j], VARIANCES[:, j]
+            w = 1 / v
+            q = np.sum(w * (y - np.sum(w * y) / np.sum(w)) ** 2)
+            c = np.sum(w) - np.sum(w**2) / np.sum(w)
+            self.assertAlmostEqual(
+                between_dimension_variance_moments(EFFECTS, VARIANCES, VALID)[j],
+                max((q - (y.size - 1)) / c, 0),
+            )
+
+    def test_reml(self):
+        tau2 = between_dimension_variance_reml(EFFECTS, VARIANCES, VALID)
+        for j in range(2):
+            self.assertAlmostEqual(
+                tau2[j], reml_by_optimization(EFFECTS[:, j], VARIANCES[:, j]), places=7
+            )
+
+    def test_homogeneous_effects(self):
+        effects = np.array([[0.1], [0.1], [0.1]])
+        variances = np.array([[0.01], [0.02], [0.03]])
+        valid = np.ones((3, 1), dtype=bool)
+        self.assertEqual(
+            between_dimension_variance_moments(effects, variances, valid)[0], 0
+        )
+        self.assertEqual(
+            between_dimension_variance_reml(effects, variances, valid)[0], 0
+        )
+
+
+class TestShrinkEffects(TestCase):
+    def test_shrinks_noisy_slices_most(self):
+        for method, estimator in [
+            ("method-of-moments", between_dimension_variance_moments),
+            ("reml", between_dimension_variance_reml),
+        ]:
+            shrunk, lower, upper = shrink_effects(EFFECTS, VARIANCES, method)
+            tau2 = estimator(EFFECTS, VARIANCES, VALID)
+            w = 1 / (VARIANCES + tau2)
+            mu = np.sum(w * EFFECTS, axis=0) / np.sum(w, axis=0)
+            # each slice moves a fraction v / (v + tau^2) of the way to mu
+            np.testing.assert_allclose(
+                (EFFECTS - shrunk) / (EFFECTS - mu), VARIANCES / (VARIANCES + tau2)
+            )
+            # intervals are narrower than the raw ones and contain the effect
+            self.assertTrue(np.all(upper - lower < 2 * 1.96 * np.sqrt(VARIANCES)))
+            self.assertTrue(np.all((lower < shrunk) & (shrunk < upper)))
+
+    def test_no_heterogeneity_pools_slices(self):
+        effects = np.array([[0.1], [0.1], [0.1]])
+        variances = np.array([[0.01], [0.02], [0.03]])
+        shrunk, lower, upper = shrink_effects(effects, variances, "reml")
+        np.testing.assert_allclose(shrunk, 0.1)
+        pooled_variance = 1 / np.sum(1 / variances)
+        np.testing.assert_allclose(upper - shrunk, 1.959964 * np.sqrt(pooled_variance))
+
+    def test_invalid_slices(self):
+        valid = VALID.copy()
+        valid[0, 0] = False
+        valid[1:, 1] = False
+        shrunk, lower, upper = shrink_effects(
+            EFFECTS, VARIANCES, "method-of-moments", valid
+        )
+        # slices left out do not affect the others
+        expected, _, _ = shrink_effects(
+            EFFECTS[1:, :1], VARIANCES[1:, :1], "method-of-moments"
+        )
+        np.testing.assert_allclose(shrunk[1:, :1], expected)
+        self.assertTrue(np.isnan(shrunk[0, 0]))
+        # a single slice is not shrunk
+        self.assertTrue(np.all(np.isnan(shrunk[:, 1])))
+        self.assertTrue(np.all(np.isnan(lower[:, 1])))
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            shrink_effects(EFFECTS, VARIANCES, None)
+
+
+if __name__ == "__main__":
+    unittest_main()
@@ -0,0 +1,89 @@
+from unittest import TestCase, main as unittest_main
+
+import numpy as np
+
+from gbstats.models.statistics import QuantileSketchStatistic
+from gbstats.sketch import QuantileSketch, merge_serialized_sketches
+
+RNG = np.random.default_rng(20241019)
+VALUES = RNG.lognormal(mean=2, sigma=1, size=100000)
+LEVELS = [0.01, 0.25, 0.5, 0.9, 0.95, 0.99]
+
+
+class TestQuantileSketch(TestCase):
+    def assert_close_quantiles(self, sketch, values):
+        expected = np.quantile(values, LEVELS)
+        np.testing.assert_allclose(sketch.quantile(LEVELS), expected, rtol=0.01)
+
+    def test_quantiles(self):
+        sketch = QuantileSketch.from_values(VALUES)
+        self.assertEqual(sketch.n, len(VALUES))
+        self.assertLess(len(sketch.means), 200)
+        self.assert_close_quantiles(sketch, VALUES)
+        self.assertEqual(sketch.quantile(0), VALUES.min())
+        self.assertEqual(sketch.quantile(1), VALUES.max())
+
+    def test_small_sample_is_exact(self):
+        values = np.array([3.0, 1.0, 2.0, 5.0, 4.0])
+        sketch = QuantileSketch.from_values(values)
+        np.testing.assert_array_equal(sketch.means, np.sort(values))
+        self.assertEqual(sketch.quantile(0.5), 3.0)
+
+    def test_merge(self):
+        shards = np.array_split(VALUES, 7)
+        merged = QuantileSketch()
+        for shard in shards:
+            merged = merged + QuantileSketch.from_values(shard)
+        self.assertEqual(merged.n, len(VALUES))
+        self.assert_close_quantiles(merged, VALUES)
+
+    def test_serialize_round_trip(self):
+        sketch = QuantileSketch.from_values(VALUES)
+        restored = QuantileSketch.deserialize(sketch.serialize())
+        np.testing.assert_array_equal(restored.means, sketch.means)
+        np.testing.assert_array_equal(restored.weights, sketch.weights)
+        self.assertEqual(restored.min_value, sketch.min_value)
+        self.assertEqual(restored.max_value, sketch.max_value)
+        self.assertLess(len(sketch.serialize()), 5000)
+
+    def test_merge_serialized_sketches(self):
+        serialized = [
+            QuantileSketch.from_values(v).serialize()
+            for v in [VALUES[:10], VALUES[10:]]
+        ]
+        merged = QuantileSketch.deserialize(
+            merge_serialized_sketches(serialized + [""])
+        )
+        self.assertEqual(merged.n, len(VALUES))
+
+
+class TestQuantileSketchStatistic(TestCase):
+    def test_quantile_statistic(self):
+        stat = QuantileSketchStatistic(
+            n=len(VALUES), nu=0.9, sketch=QuantileSketch.from_values(VALUES).serialize()
+        )
+        quantile_stat = stat.quantile_statistic
+        self.assertEqual(quantile_stat.n_star, 51200)
+        self.assertAlmostEqual(stat.mean, np.quantile(VALUES, 0.9), delta=0.1)
+        self.assertLess(quantile_stat.quantile_lower, stat.mean)
+        self.assertGreater(quantile_stat.quantile_upper, stat.mean)
+        self.assertGreater(stat.variance, 0)
+
+    def test_add(self):
+        a = QuantileSketchStatistic(
+            n=50000,
+            nu=0.5,
+            sketch=QuantileSketch.from_values(VALUES[:50000]).serialize(),
+        )
+        b = QuantileSketchStatistic(
+            n=50000,
+            nu=0.5,
+            sketch=QuantileSketch.from_values(VALUES[50000:]).serialize(),
+        )
+        total = a + b
+        self.assertEqual(total.n, len(VALUES))
+        self.assertAlmostEqual(total.mean, np.median(VALUES), delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest_main()